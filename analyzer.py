@@ -1,13 +1,19 @@
 import argparse
-import json
-import matplotlib.pyplot as plt
 import os
-from typing import List, Tuple, Set
-import shutil
-from github.GithubException import UnknownObjectException, BadCredentialsException
+from typing import Iterable, Iterator, List, Tuple, TYPE_CHECKING
 
 from jira_parser import JiraParser
+from jira_parser.model import IssueSummary
 import utils
+from utils import instrumentation
+
+if TYPE_CHECKING:
+    from issue_statistics import IssueStatistics
+    from utils.reference_cache import ReferenceCache
+    from issue_statistics.incremental import AnalysisState
+
+SUMMARY_BATCH_SIZE = 500
+DEFAULT_REFERENCE_CACHE_SIZE = 200000
 
 
 def __parse_arguments():
@@ -16,24 +22,83 @@ def __parse_arguments():
     arg_parser.add_argument("-g", "--github", help="Target Jira project's GitHub repository")
     arg_parser.add_argument("-c", "--credentials", help="GitHub username and personal access token separated by comma. "
                                                         "Compulsory if GitHub repository is specified")
+    arg_parser.add_argument("-l", "--local-clone", help="Path to a local clone of the project's repository to read "
+                                                        "commits from with git instead of the GitHub API")
+    arg_parser.add_argument("--jira-server", help="URL of the Jira server. By default, Apache Jira is used")
+    arg_parser.add_argument("--github-api", help="URL of the GitHub REST API. By default, api.github.com is used")
+    arg_parser.add_argument("--fetch-engine", help="Fetch issues from Jira one request at a time with the Jira client "
+                                                   "or concurrently with asyncio (requires aiohttp)",
+                            choices=["sync", "async"], default="sync")
+    arg_parser.add_argument("--concurrency", help="Maximum number of requests in flight of the async fetch engine",
+                            type=int, default=16)
+    arg_parser.add_argument("--resume", help="Continue an interrupted fetch where it stopped, as recorded in "
+                                             "Projects/<project>/fetch_manifest.json", action="store_true")
+    arg_parser.add_argument("--slim-raw", help="Keep only the fields used by the parser inside "
+                                               "Projects/<project>/Issues_raw", action="store_true")
+    arg_parser.add_argument("-q", "--query", help="Analyze only the issues whose summary, description or comments "
+                                                  "match a full-text query, e.g. \"RegionServer AND (OOM OR "
+                                                  "\\\"out of memory\\\")\"")
+    arg_parser.add_argument("-s", "--save-summary", help="Persist the references of each issue inside "
+                                                         "Projects/<project>/Summary. Only the issues analyzed by "
+                                                         "the run are written, so use --full to write all of them",
+                            action="store_true")
+    arg_parser.add_argument("--full", help="Analyze every issue again instead of only the ones which changed since "
+                                           "the previous run", action="store_true")
+    arg_parser.add_argument("--no-reference-cache", help="Extract references from every text instead of reusing the "
+                                                         "ones cached in Projects/<project>/reference_cache.sqlite",
+                            action="store_true")
+    arg_parser.add_argument("--reference-cache-size", help="Maximum number of texts whose references are cached",
+                            type=int, default=DEFAULT_REFERENCE_CACHE_SIZE)
+    arg_parser.add_argument("--block-size", help="Size of the blocks the issues are combined in: a number of issue IDs "
+                                                 "or a number of days, depending on --bin-by", type=int, default=100)
+    arg_parser.add_argument("--bin-by", help="Combine issues in blocks by their IDs or by their dates of creation",
+                            choices=["id", "date"], default="id")
+    arg_parser.add_argument("--rolling-window", help="Number of blocks to compute the rolling means over",
+                            type=int, default=5)
+    arg_parser.add_argument("--export", help="Export the statistics inside Projects/<project>/Statistics",
+                            choices=["csv", "npz"])
+    arg_parser.add_argument("--plot-mode", help="Render plots one after another, in parallel worker processes or as "
+                                                "a single multi-panel figure", choices=["serial", "parallel", "single"],
+                            default="serial")
+    arg_parser.add_argument("--plot-workers", help="Number of worker processes in the parallel plot mode", type=int)
+    arg_parser.add_argument("--metrics", help="Print timings and counters of each stage at exit", action="store_true")
+    arg_parser.add_argument("--metrics-output", help="Export timings and counters at exit to a file: in Prometheus "
+                                                     "text format if it ends with .prom, in JSON otherwise")
     return arg_parser.parse_args()
 
 
-def __collect_issue_summary(project: str, issue: dict, save=True) -> \
-        Tuple[str, int, Set[str], Set[str], Set[str], Set[str], Set[str], Set[str], List[str], List[str]]:
+def __load_issues(project: str, issue_keys: List[str] = None) -> Iterator[dict]:
     """
-
+    Lazily load parsed issues stored inside Projects/<project>/Issues, one at a time.
+    :param project: Project to load issues for
+    :param issue_keys: Keys of the issues to load. By default, all parsed issues are loaded
+    :return: Generator of issues represented as dictionaries
+    """
+    directory = os.path.join("Projects", project, "Issues")
+    if not os.path.isdir(directory):
+        print("The folder does not exist. Make sure you fetched and parsed at least one issue.")
+        return
+    if issue_keys is not None:
+        for issue_key in issue_keys:
+            yield utils.load_json(os.path.join(directory, issue_key + ".json"))
+        return
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".json"):
+                yield utils.load_json(entry.path)
+
+
+def __collect_issue_summary(project: str, issue: dict, reference_cache: "ReferenceCache" = None,
+                            keep_references: bool = True) -> IssueSummary:
+    """
+    Extract all types of references from the issue.
     :param project: Related project
     :param issue: Issue represented as a dictionary
-    :param save: Whether to save the statistics on hard drive
-    :return:
+    :param reference_cache: Cache of the references extracted from texts, if any
+    :param keep_references: Whether the summary keeps the referenced values or only their number
+    :return: Summary describing the references of the issue
     """
-
-    # FIELD 1: issue key
-    issue_key = str(issue["issue_key"])
-
-    # FIELD 2: issue ID; used to increase the efficiency of sorting the data
-    issue_id = int(issue_key.split('-')[1])
+    extract_references = reference_cache.extract if reference_cache else utils.extract_references
 
     # Parse Description and Remote Links. Remote links are not different from any other type of URLs,
     # so we will just append them to the description of the issue in order to avoid code duplication.
@@ -41,18 +106,13 @@ def __collect_issue_summary(project: str, issue: dict, save=True) -> \
         [remote_link["url"] for remote_link in issue["remotelinks"]]
     )
 
-    # FIELD 3: unparsed URLs
-    # FIELD 4: revision IDs
-    # FIELD 5: URLs detected as mailing lists
-    # FIELD 6: URLs detected as PDF documents
-    # FIELD 7: URLs detected as archive files
-    # FIELD 8: Other issues
+    # Unparsed URLs, revision IDs, URLs detected as mailing lists, PDF documents and archive files, other issues
     urls, revisions, mailing_lists, pdf_documents, archives, other_issues = \
-        utils.extract_references(description_and_remote_links, project)
+        extract_references(description_and_remote_links, project)
 
     # Parse Comments
     for comment in issue["comments"]:
-        comment_details = utils.extract_references(comment["body"], project)
+        comment_details = extract_references(comment["body"], project)
         urls.update(comment_details[0])
         revisions.update(comment_details[1])
         mailing_lists.update(comment_details[2])
@@ -63,243 +123,265 @@ def __collect_issue_summary(project: str, issue: dict, save=True) -> \
     for other_issue in issue["issuelinks"]:
         other_issues.add(other_issue["issue_key"])
 
-    # FIELD 9: commits
-    # FIELD 10: pull requests
     commits = [commit["sha"] for commit in issue["commits"]]
     pull_requests = [str(pr["number"]) for pr in issue["pull_requests"]]
 
-    summary = (issue_key,
-               issue_id,
-               urls,
-               revisions,
-               mailing_lists,
-               pdf_documents,
-               archives,
-               other_issues,
-               commits,
-               pull_requests)
-
-    if save:
-        __save_references(project, summary)
-    return summary
+    # The issue ID increases the efficiency of sorting the data, the date of creation is used to combine issues in
+    # blocks by date
+    return IssueSummary(str(issue["issue_key"]), issue["created"],
+                        (urls, revisions, mailing_lists, pdf_documents, archives, other_issues, commits, pull_requests),
+                        keep_references)
 
 
-def __collect_issues_summary(project: str, save=True) -> List[
-    Tuple[str, int, Set[str], Set[str], Set[str], Set[str], Set[str], Set[str], List[str], List[str]]]:
+def __extract_summaries(project: str, issues: Iterable[dict], reference_cache: "ReferenceCache" = None,
+                        keep_references: bool = True) -> Iterator[IssueSummary]:
     """
-    For each Issue inside Projects/<project>/Issues, extract all types of references and return a data type containing
-    all the necessary data
+    For each issue, extract all types of references and yield a data type containing all the necessary data.
     :param project: Project to extract references from
-    :param save: Whether to save extracted references to JSON documents
-    :return: List of tuples containing data
+    :param issues: Iterable of issues represented as dictionaries
+    :param reference_cache: Cache of the references extracted from texts, if any
+    :param keep_references: Whether the summaries keep the referenced values or only their number
+    :return: Generator of summaries
     """
-    directory = os.path.join("Projects", project, "Issues")
-    if not os.path.isdir(directory):
-        print("The folder does not exist. Make sure you fetched and parsed at least one issue.")
-        return []
-    issues_dir = os.listdir(directory)
-    issues = []
+    for issue in issues:
+        with instrumentation.span("analyzer.extract_references", issue["issue_key"]):
+            summary = __collect_issue_summary(project, issue, reference_cache, keep_references)
+        yield summary
+
 
-    for filename in issues_dir:
-        path = os.path.join(directory, filename)
-        with open(path, 'r') as issue_file:
-            issue = json.load(issue_file)
-            summary = __collect_issue_summary(project, issue, save)
-            issues.append(summary)
-    return issues
+def __save_summaries(project: str, summaries: Iterable[IssueSummary],
+                     batch_size: int = SUMMARY_BATCH_SIZE) -> Iterator[IssueSummary]:
+    """
+    Pass summaries through unchanged while persisting them in batches of batch_size issues, so that at most one batch
+    is kept in memory at a time.
+    :param project: Project to write references for
+    :param summaries: Iterable of summaries describing the references of each issue
+    :param batch_size: Number of summaries to accumulate before writing them on hard drive
+    :return: Generator of the same summaries
+    """
+    batch = []
+    for summary in summaries:
+        batch.append(summary)
+        if len(batch) >= batch_size:
+            __save_references(project, batch)
+            batch = []
+        yield summary
+    if batch:
+        __save_references(project, batch)
 
 
 def __save_references(project: str,
-                      issue_summary: Tuple[
-                          str, int, Set[str], Set[str], Set[str], Set[str], Set[str], Set[str], List[str], List[str]
-                      ]) -> None:
+                      issue_summaries: List[IssueSummary]) -> None:
     """
-    Save references for an issue in JSON format.
+    Save references for a batch of issues in JSON format, one document per issue.
     :param project: Project to write references for
-    :param issue_summary: Data type describing necessary data
+    :param issue_summaries: List of summaries keeping their references
     :return: None
     """
     summary_dir = os.path.join("Projects", project, "Summary")
-    if not os.path.isdir(summary_dir):
-        os.mkdir(summary_dir)
-
-    issue_dict = {
-        "issue_key": issue_summary[0],
-        "issue_id": issue_summary[1],
-        "urls": list(issue_summary[2]),
-        "revisions": list(issue_summary[3]),
-        "mailing_lists": list(issue_summary[4]),
-        "pdf_documents": list(issue_summary[5]),
-        "archives": list(issue_summary[6]),
-        "other_issues": list(issue_summary[7]),
-        "commits": issue_summary[8],
-        "pull_requests": issue_summary[9]
-    }
-    path = os.path.join(summary_dir, issue_summary[0] + ".json")
-    utils.save_as_json(issue_dict, path)
-
-
-def __generate_statistics(project: str) -> List[Tuple[int, int, int, int, int, int, int, int, int, int]]:
+    utils.create_dir_if_necessary(summary_dir)
+
+    for issue_summary in issue_summaries:
+        path = os.path.join(summary_dir, issue_summary.issue_key + ".json")
+        utils.save_as_json(issue_summary.to_dict(), path)
+
+
+def __count_references(issue_summary: IssueSummary) -> Tuple[int, str, int, int, int, int, int, int, int, int, int]:
+    """
+    Reduce the summary of an issue to the row of its reference counts.
+    :param issue_summary: Summary describing the references of an issue
+    :return: Tuple of the issue ID, date of creation, total number of references and the number of references of each
+    type in the order defined by issue_statistics.COLUMNS
+    """
+    urls, revisions, mailing_lists, pdf_documents, archives, other_issues, commits, pull_requests = \
+        issue_summary.counts
+    return (issue_summary.issue_id, issue_summary.created, sum(issue_summary.counts), revisions, mailing_lists,
+            pdf_documents, archives, other_issues, urls, commits, pull_requests)
+
+
+def __generate_statistics(summaries: Iterable[IssueSummary]) -> "IssueStatistics":
+    """
+    Based on the references for each issue, generate the frequency of each type of references. Summaries are folded
+    into per-issue reference counts as they arrive, so only a handful of integers per issue is kept in memory.
+    :param summaries: Iterable of summaries describing the references of each issue
+    :return: Statistics holding one row per issue and one column per type of references
     """
-    Based on the references for each issue, generate the frequency of each type of references and split the data
-    into blocks of 100 issues for a broader analysis of the data.
-    :param project: Project to parse references from
-    :return: List of tuples representing generated statistics with the following fields:
-        1. Current block description (e.g. 100 means block 1-100, 400 means block 301-400)
-        2. Total number of references in block
-        3. Number of revisions
-        4. Number of mailing lists
-        5. Number of PDF documents URLs
-        6. Number of archive files URLs
-        7. Number of other issues
-        8. Number of uncategorized URLs
-        9. Number of commits
-        10. Number of pull requests
+    from issue_statistics import IssueStatistics
+    return IssueStatistics.from_rows(__count_references(summary) for summary in summaries)
+
+
+def compute_statistics(project: str, issue_keys: List[str] = None, save_summary: bool = False,
+                       reference_cache: "ReferenceCache" = None) -> "IssueStatistics":
     """
-    issues = []
-    summary_directory = os.path.join("Projects", project, "Summary")
-
-    for filename in os.listdir(summary_directory):
-        path = os.path.join(summary_directory, filename)
-        with open(path, 'r') as file:
-            data = json.load(file)
-            issues.append(
-                (str(data["issue_key"]),
-                 int(data["issue_id"]),
-                 list(data["urls"]),
-                 list(data["revisions"]),
-                 list(data["mailing_lists"]),
-                 list(data["pdf_documents"]),
-                 list(data["archives"]),
-                 list(data["other_issues"]),
-                 data["commits"],
-                 data["pull_requests"])
-            )
-    issues = sorted(issues, key=lambda x: x[1])
-
-    # Since the number of references in each issue can be very little, it makes sense to combine them in blocks of 100
-    # in order to have a better overview of the development of the project.
-    blocks = []
-    block_size = 100
-    block_idx = 0
-    while True:
-        start_idx = block_idx * block_size
-        block = issues[start_idx:start_idx + block_size]
-        if len(block) == 0:
-            break
-        blocks.append(block)
-        block_idx += 1
-
-    # Now it's time to collect statistics
-    block_idx = 1
-    statistics = []
-    for block in blocks:
-        total = 0
-        revisions = 0
-        mailing_lists = 0
-        pdf_documents = 0
-        archives = 0
-        other_issues = 0
-        other_urls = 0
-        commits = 0
-        pull_requests = 0
-        for issue in block:
-            revisions += len(issue[3])
-            mailing_lists += len(issue[4])
-            pdf_documents += len(issue[5])
-            archives += len(issue[6])
-            other_issues += len(issue[7])
-            other_urls += len(issue[2])
-            commits += len(issue[8])
-            pull_requests += len(issue[9])
-            for i in range(2, 10):
-                total += len(issue[i])
-        statistics.append(
-            (block_idx * 100, total, revisions, mailing_lists, pdf_documents, archives, other_issues, other_urls,
-             commits, pull_requests))
-        block_idx += 1
-    return statistics
-
-
-def __make_plot(project: str, plots_dir: str,
-                statistics: List[Tuple[int, int, int, int, int, int, int, int, int]], blocks: List[int],
-                param_idx: int, param_title: str) -> None:
+    Extract the references of the parsed issues of the project and count them, going through every issue.
+    :param project: Project to analyze
+    :param issue_keys: Keys of the issues to analyze. By default, all parsed issues are analyzed
+    :param save_summary: Whether to persist the references of each issue inside Projects/<project>/Summary
+    :param reference_cache: Cache of the references extracted from texts, if any
+    :return: Statistics holding one row per issue and one column per type of references
     """
-    Make a plot for the statistics provided.
-    :param project: Project name
-    :param plots_dir: Directory where to save the plot
-    :param statistics: List of tuples representing generated statistics with the following fields:
-        1. Total number of references in block
-        2. Number of revisions
-        3. Number of mailing lists
-        4. Number of PDF documents URLs
-        5. Number of archive files URLs
-        6. Number of other issues
-        7. Number of uncategorized URLs
-        8. Number of commits
-        9. Number of pull requests
-        10. Number of pull requests
-    :param blocks: List of 100-based values representing blocks (100 = block 1, 300 = block 3, etc.)
-    :param param_idx: Index of the parameter to make the plot for
-    :param param_title: Name of the parameter to make the plot for
-    :return: None
+    summaries = __extract_summaries(project, __load_issues(project, issue_keys), reference_cache, save_summary)
+    if save_summary:
+        summaries = __save_summaries(project, summaries)
+    return __generate_statistics(summaries)
+
+
+def fetch_project(parser: JiraParser, fetch_engine: str = "sync", concurrency: int = 16,
+                  resume: bool = False) -> int:
     """
-    x = blocks
-    y = [param[param_idx] for param in statistics]
-    plt.plot(x, y)
-    plt.xlabel("Issue IDs")
-    plt.ylabel("Frequency of {}".format(param_title))
-    plt.title("Changes in frequency of {} through the evolution of the project {}".format(param_title, project))
-    path = os.path.join(plots_dir, param_title + ".png")
-    if os.path.isfile(path):
-        os.remove(path)
-    plt.savefig(path, bbox_inches='tight')
-    plt.close()
-
-
-def __make_plots(project: str, statistics: List[Tuple[int, int, int, int, int, int, int, int, int, int]]) -> None:
+    Fetch the issues of the project of the parser and parse them. Issues are parsed as soon as they are fetched, so
+    that they never have to be held in memory all at once.
+    :param parser: Parser of the project
+    :param fetch_engine: Engine to fetch issues with (see jira_parser.FETCH_ENGINES)
+    :param concurrency: Maximum number of requests in flight of the async fetch engine
+    :param resume: Whether to continue an interrupted fetch where it stopped
+    :return: Number of parsed issues
     """
-    Make plots for the statistics provided.
-    :param project: Project name
-    :param statistics: List of tuples representing generated statistics with the following fields:
-        1. Total number of references in block
-        2. Number of revisions
-        3. Number of mailing lists
-        4. Number of PDF documents URLs
-        5. Number of archive files URLs
-        6. Number of other issues
-        7. Number of uncategorized URLs
-        8. Number of commits
-        9. Number of pull requests
-    :return: None
+    issues_raw = parser.iter_fetch_issues_raw(engine=fetch_engine, concurrency=concurrency, resume=resume)
+    if resume:
+        # Issues fetched before the interruption are only found in the cache
+        with instrumentation.span("analyzer.fetch"):
+            for _ in issues_raw:
+                pass
+        issues_raw = None
+
+    from jira_parser.search_index import SearchIndex
+    search_index = SearchIndex(parser.project)
+    parsed = 0
+    with instrumentation.span("analyzer.parse"):
+        for issue in parser.iter_parse_issues(issues_raw):
+            search_index.update(issue)
+            parsed += 1
+    with instrumentation.span("analyzer.index"):
+        # Issues parsed before, e.g. by report generation, are indexed as well
+        search_index.refresh()
+    search_index.close()
+    return parsed
+
+
+def __report_reference_cache(project: str, reference_cache: "ReferenceCache") -> None:
+    instrumentation.count("references.cache_hits", reference_cache.hits)
+    instrumentation.count("references.cache_misses", reference_cache.misses)
+    if reference_cache.hits + reference_cache.misses:
+        print("{}: references of {} of {} texts taken from the reference cache ({:.1%})".format(
+            project, reference_cache.hits, reference_cache.hits + reference_cache.misses, reference_cache.hit_rate))
+
+
+def __update_analysis_state(project: str, save_summary: bool, issue_keys: List[str] = None,
+                            reference_cache: "ReferenceCache" = None) -> "AnalysisState":
+    """
+    Extract the references of the issues which changed since the previous analysis and update their counts and the
+    sums of the blocks they fall into.
+    :param project: Project to analyze
+    :param save_summary: Whether to persist the references of the changed issues inside Projects/<project>/Summary
+    :param issue_keys: Keys of the issues to check. By default, all parsed issues are checked
+    :param reference_cache: Cache of the references extracted from texts, if any
+    :return: Updated state of the analysis
+    """
+    from issue_statistics.incremental import AnalysisState
+
+    state = AnalysisState(project)
+    summaries = __extract_summaries(project, state.changed_issues(issue_keys), reference_cache, save_summary)
+    if save_summary:
+        summaries = __save_summaries(project, summaries)
+    changed = 0
+    for summary in summaries:
+        state.update(summary.issue_key, __count_references(summary))
+        changed += 1
+    deleted = state.remove_deleted(issue_keys)
+    if save_summary:
+        for issue_key in deleted:
+            path = os.path.join("Projects", project, "Summary", issue_key + ".json")
+            if os.path.isfile(path):
+                os.remove(path)
+    state.commit()
+    instrumentation.count("analyzer.issues_changed", changed)
+    print("{}: {} issues changed and {} were deleted since the previous analysis".format(project, changed,
+                                                                                       len(deleted)))
+    return state
+
+
+def analyze_project(project: str, save_summary: bool = False, block_size: int = 100, bin_by: str = "id",
+                    rolling_window: int = 5, export: str = None, plot_mode: str = "serial",
+                    plot_workers: int = None, issue_keys: List[str] = None, full: bool = False,
+                    reference_cache_size: int = DEFAULT_REFERENCE_CACHE_SIZE) -> int:
+    """
+    Extract the references of the parsed issues of the project, compute their statistics and plot them. Unless full
+    is set, only the issues which changed since the previous run are analyzed (see issue_statistics.incremental).
+    :param project: Project to analyze
+    :param save_summary: Whether to persist the references of each analyzed issue inside Projects/<project>/Summary
+    :param block_size: Size of the blocks the issues are combined in
+    :param bin_by: Whether to combine issues in blocks by their IDs or by their dates of creation
+    :param rolling_window: Number of blocks to compute the rolling means over
+    :param export: Format to export the statistics in, if any
+    :param plot_mode: Mode of rendering the plots (see issue_statistics.plots.make_plots)
+    :param plot_workers: Number of worker processes in the parallel plot mode
+    :param issue_keys: Keys of the issues to analyze. By default, all parsed issues are analyzed
+    :param full: Whether to analyze every issue again
+    :param reference_cache_size: Maximum number of texts whose references are cached inside
+    Projects/<project>/reference_cache.sqlite. If 0, references are always extracted from the texts
+    :return: Number of rendered plots
     """
-    blocks = [param[0] for param in statistics]
-    types = [
-        (1, "Total references"),
-        (2, "Revisions"),
-        (3, "Mailing Lists"),
-        (4, "PDF documents"),
-        (5, "Archives"),
-        (6, "Other issues"),
-        (7, "Other URLs"),
-        (8, "Commits"),
-        (9, "Pull requests")
-    ]
-
-    plots_dir = os.path.join("Projects", project, "Plots")
-    shutil.rmtree(plots_dir, ignore_errors=True)
-    os.mkdir(plots_dir)
-
-    for t in types:
-        __make_plot(project, plots_dir, statistics, blocks, t[0], t[1])
+    import issue_statistics
+    from issue_statistics import plots
+
+    reference_cache = None
+    if reference_cache_size:
+        from utils.reference_cache import ReferenceCache
+        utils.create_dir_if_necessary(os.path.join("Projects", project))
+        reference_cache = ReferenceCache(os.path.join("Projects", project, "reference_cache.sqlite"),
+                                         reference_cache_size)
+
+    statistics = None
+    if full:
+        with instrumentation.span("analyzer.statistics"):
+            statistics = compute_statistics(project, issue_keys, save_summary, reference_cache)
+            blocks = statistics.bin(block_size, bin_by)
+    else:
+        state = __update_analysis_state(project, save_summary, issue_keys, reference_cache)
+        with instrumentation.span("analyzer.statistics"):
+            if issue_keys is not None or export:
+                statistics = state.statistics(issue_keys)
+            if issue_keys is not None:
+                blocks = statistics.bin(block_size, bin_by)
+            else:
+                # The sums of the blocks are up to date already, so the issues are not gone through again
+                blocks = state.binned(block_size, bin_by)
+        state.close()
+    if reference_cache:
+        reference_cache.close()
+        __report_reference_cache(project, reference_cache)
+    if export:
+        export_dir = issue_statistics.export(project, statistics, blocks, export, rolling_window)
+        print("{}: statistics are exported to {}".format(project, export_dir))
+    with instrumentation.span("analyzer.plots"):
+        rendered = plots.make_plots(project, blocks, rolling_window, plot_mode, plot_workers)
+    instrumentation.count("analyzer.plots_rendered", len(rendered))
+    print("{}: rendered {} plots".format(project, len(rendered)))
+    return len(rendered)
 
 
 if __name__ == "__main__":
     args = __parse_arguments()
     project = args.project
+    if args.block_size < 1:
+        print("The block size should be a positive number. Aborting...")
+        exit(-1)
+    if args.concurrency < 1:
+        print("The concurrency should be a positive number. Aborting...")
+        exit(-1)
+    if args.reference_cache_size < 1:
+        print("The size of the reference cache should be a positive number. Aborting...")
+        exit(-1)
+    if args.metrics or args.metrics_output:
+        instrumentation.enable(args.metrics, args.metrics_output)
+
+    if args.local_clone and not os.path.isdir(args.local_clone):
+        print("The local clone {} does not exist. Aborting...".format(args.local_clone))
+        exit(-1)
 
     github_repository, github_credentials = None, None
-    if args.github:
+    if args.github and not args.local_clone:
         github_repository = args.github
         if not args.credentials:
             print("You should specify GitHub credentials as well. For example:\n"
@@ -309,18 +391,40 @@ if __name__ == "__main__":
         else:
             github_credentials = utils.define_github_credentials(args.credentials)
 
-    try:
-        parser = JiraParser(project, github_repository, github_credentials)
-        parser.fetch_issues_raw()  # This is the assumption that the issues are not fetched.
-
-        # While parsing issues, the program may fail to access GitHub repository or to use credentials provided.
-        parser.parse_issues()
-    except UnknownObjectException:
-        print("Invalid GitHub repository. Aborting...")
-        exit(-1)
-    except BadCredentialsException:
-        print("Invalid GitHub credentials. Aborting...")
-        exit(-1)
-    summary = __collect_issues_summary(project)
-    statistics = __generate_statistics(project)
-    __make_plots(project, statistics)
+    # GitHub, Jira, NumPy and Matplotlib take a while to import, so they are only loaded once the arguments are known
+    # to be valid, and GitHub only if the issues are looked up in a GitHub repository.
+    def fetch() -> None:
+        parser = JiraParser(project, github_repository, github_credentials, args.jira_server, args.github_api,
+                            args.slim_raw, args.local_clone)
+        fetch_project(parser, args.fetch_engine, args.concurrency, args.resume)
+
+    if github_repository:
+        from github.GithubException import UnknownObjectException, BadCredentialsException
+        try:
+            # While parsing issues, the program may fail to access GitHub repository or to use credentials provided.
+            fetch()
+        except UnknownObjectException:
+            print("Invalid GitHub repository. Aborting...")
+            exit(-1)
+        except BadCredentialsException:
+            print("Invalid GitHub credentials. Aborting...")
+            exit(-1)
+    else:
+        fetch()
+    issue_keys = None
+    if args.query:
+        from jira_parser.search_index import SearchIndex, SearchError
+        try:
+            search_index = SearchIndex(project)
+            search_index.refresh()
+            issue_keys = search_index.search(args.query)
+            search_index.close()
+        except SearchError as error:
+            print("{}. Aborting...".format(error))
+            exit(-1)
+        print("{}: {} issues match the query".format(project, len(issue_keys)))
+        if not issue_keys:
+            exit(0)
+    analyze_project(project, args.save_summary, args.block_size, args.bin_by, args.rolling_window, args.export,
+                    args.plot_mode, args.plot_workers, issue_keys, args.full,
+                    0 if args.no_reference_cache else args.reference_cache_size)
@@ -0,0 +1,207 @@
+import argparse
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Tuple
+
+import utils
+from utils import instrumentation
+
+
+def __parse_arguments() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description="Fetch and analyze several projects concurrently")
+    arg_parser.add_argument("-m", "--manifest", help="JSON file listing the projects to analyze, e.g. "
+                                                     "[{\"project\": \"TAJO\", \"github\": \"apache/tajo\"}, "
+                                                     "{\"project\": \"KAFKA\", \"clone\": \"/srv/kafka\"}]",
+                            required=True)
+    arg_parser.add_argument("-c", "--credentials", help="GitHub username and personal access token separated by comma. "
+                                                        "Compulsory if any project has a GitHub repository")
+    arg_parser.add_argument("--fetch-workers", help="Maximum number of projects fetched at the same time", type=int,
+                            default=4)
+    arg_parser.add_argument("--analysis-workers", help="Maximum number of projects analyzed at the same time, each in "
+                                                       "its own process. By default, the number of CPUs",
+                            type=int, default=os.cpu_count())
+    arg_parser.add_argument("--jira-server", help="URL of the Jira server of the projects without a \"jira_server\" "
+                                                  "in the manifest. By default, Apache Jira is used")
+    arg_parser.add_argument("--github-api", help="URL of the GitHub REST API. By default, api.github.com is used")
+    arg_parser.add_argument("--fetch-engine", help="Fetch issues from Jira one request at a time with the Jira client "
+                                                   "or concurrently with asyncio (requires aiohttp)",
+                            choices=["sync", "async"], default="sync")
+    arg_parser.add_argument("--concurrency", help="Maximum number of requests in flight of the async fetch engine "
+                                                  "for each project", type=int, default=16)
+    arg_parser.add_argument("--resume", help="Continue interrupted fetches where they stopped", action="store_true")
+    arg_parser.add_argument("--slim-raw", help="Keep only the fields used by the parser inside "
+                                               "Projects/<project>/Issues_raw", action="store_true")
+    arg_parser.add_argument("-s", "--save-summary", help="Persist the references of each issue inside "
+                                                         "Projects/<project>/Summary", action="store_true")
+    arg_parser.add_argument("--full", help="Analyze every issue again instead of only the ones which changed since "
+                                           "the previous run", action="store_true")
+    arg_parser.add_argument("--block-size", help="Size of the blocks the issues are combined in: a number of issue IDs "
+                                                 "or a number of days, depending on --bin-by", type=int, default=100)
+    arg_parser.add_argument("--bin-by", help="Combine issues in blocks by their IDs or by their dates of creation",
+                            choices=["id", "date"], default="id")
+    arg_parser.add_argument("--rolling-window", help="Number of blocks to compute the rolling means over",
+                            type=int, default=5)
+    arg_parser.add_argument("--export", help="Export the statistics inside Projects/<project>/Statistics",
+                            choices=["csv", "npz"])
+    arg_parser.add_argument("-o", "--output", help="File to write the status and timings of each project to in JSON",
+                            default="batch_report.json")
+    arg_parser.add_argument("--metrics", help="Print timings and counters of the fetches at exit",
+                            action="store_true")
+    arg_parser.add_argument("--metrics-output", help="Export timings and counters of the fetches at exit to a file: "
+                                                     "in Prometheus text format if it ends with .prom, in JSON "
+                                                     "otherwise")
+    return arg_parser.parse_args()
+
+
+def __load_manifest(path: str) -> Optional[List[dict]]:
+    """
+    Load and validate the manifest. Returns None if the manifest is invalid.
+    :param path: Path to the manifest
+    :return: List of projects, each with the keys "project", "github", "clone" and "jira_server"
+    """
+    if not os.path.isfile(path):
+        print("The manifest {} does not exist.".format(path))
+        return None
+    entries = utils.load_json(path)
+    if not isinstance(entries, list) or not entries:
+        print("The manifest should be a non-empty list of projects.")
+        return None
+    projects = []
+    seen = set()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"project": entry}
+        if not isinstance(entry, dict) or not entry.get("project"):
+            print("Invalid manifest entry: {}. Each entry should have a \"project\".".format(entry))
+            return None
+        if entry["project"] in seen:
+            print("Project {} is listed twice.".format(entry["project"]))
+            return None
+        if entry.get("clone") and not os.path.isdir(entry["clone"]):
+            print("{}: the local clone {} does not exist.".format(entry["project"], entry["clone"]))
+            return None
+        seen.add(entry["project"])
+        projects.append({"project": entry["project"], "github": entry.get("github"), "clone": entry.get("clone"),
+                         "jira_server": entry.get("jira_server")})
+    return projects
+
+
+def __fetch(entry: dict, args: argparse.Namespace, github_credentials: Optional[Tuple[str, str]]) -> Tuple[int, float]:
+    """
+    Fetch and parse the issues of a project. Runs in a thread of the fetch pool.
+    :return: Tuple of the number of parsed issues and the time spent in seconds
+    """
+    import analyzer
+    from jira_parser import JiraParser
+    start = time.perf_counter()
+    with instrumentation.span("batch.fetch", entry["project"]):
+        parser = JiraParser(entry["project"], entry["github"], github_credentials,
+                            entry["jira_server"] or args.jira_server, args.github_api, args.slim_raw, entry["clone"])
+        issues = analyzer.fetch_project(parser, args.fetch_engine, args.concurrency, args.resume)
+    return issues, time.perf_counter() - start
+
+
+def __analyze(project: str, save_summary: bool, block_size: int, bin_by: str, rolling_window: int,
+              export: Optional[str], full: bool) -> Tuple[int, float]:
+    """
+    Analyze the parsed issues of a project. Runs in a process of the analysis pool.
+    :return: Tuple of the number of rendered plots and the time spent in seconds
+    """
+    import analyzer
+    start = time.perf_counter()
+    plots = analyzer.analyze_project(project, save_summary, block_size, bin_by, rolling_window, export,
+                                     full=full)
+    return plots, time.perf_counter() - start
+
+
+def __error(future: Future) -> str:
+    exception = future.exception()
+    return "".join(traceback.format_exception_only(type(exception), exception)).strip()
+
+
+def __print_report(results: List[dict]) -> None:
+    print("{:<16}{:>18}{:>10}{:>12}{:>8}{:>12}".format("project", "status", "issues", "fetch", "plots", "analysis"))
+    for result in results:
+        print("{:<16}{:>18}{:>10}{:>11.1f}s{:>8}{:>11.1f}s".format(
+            result["project"], result["status"], result["issues"] if result["issues"] is not None else "-",
+            result["fetch_seconds"] or 0.0, result["plots"] if result["plots"] is not None else "-",
+            result["analysis_seconds"] or 0.0))
+    for result in results:
+        if result["error"]:
+            print("{}: {}".format(result["project"], result["error"]))
+
+
+if __name__ == "__main__":
+    args = __parse_arguments()
+    if args.fetch_workers < 1 or args.analysis_workers < 1:
+        print("The number of workers should be a positive number. Aborting...")
+        exit(-1)
+    if args.block_size < 1:
+        print("The block size should be a positive number. Aborting...")
+        exit(-1)
+    if args.concurrency < 1:
+        print("The concurrency should be a positive number. Aborting...")
+        exit(-1)
+    projects = __load_manifest(args.manifest)
+    if not projects:
+        print("Aborting...")
+        exit(-1)
+    github_credentials = None
+    if any(entry["github"] and not entry["clone"] for entry in projects):
+        if not args.credentials:
+            print("You should specify GitHub credentials for the projects with a GitHub repository. For example:\n"
+                  "--credentials \"github_username,personal access token\"")
+            exit(-1)
+        github_credentials = utils.define_github_credentials(args.credentials)
+    if args.metrics or args.metrics_output:
+        instrumentation.enable(args.metrics, args.metrics_output)
+
+    results: Dict[str, dict] = {
+        entry["project"]: {"project": entry["project"], "status": "pending", "issues": None, "fetch_seconds": None,
+                           "plots": None, "analysis_seconds": None, "error": None}
+        for entry in projects
+    }
+    start = time.perf_counter()
+    # Fetching waits on Jira and GitHub, so it runs in threads, while the analysis is CPU-bound and runs in processes.
+    # Processes are spawned rather than forked, since forking while the fetch threads hold locks may deadlock them.
+    with ThreadPoolExecutor(max_workers=args.fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=args.analysis_workers,
+                                mp_context=multiprocessing.get_context("spawn")) as analysis_pool:
+        pending: Dict[Future, Tuple[str, str]] = dict()
+        for entry in projects:
+            future = fetch_pool.submit(__fetch, entry, args, github_credentials)
+            pending[future] = ("fetch", entry["project"])
+            results[entry["project"]]["status"] = "fetching"
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, project = pending.pop(future)
+                result = results[project]
+                if future.exception() is not None:
+                    result["status"] = stage + "_failed"
+                    result["error"] = __error(future)
+                    print("{}: {} failed".format(project, stage))
+                elif stage == "fetch":
+                    result["issues"], result["fetch_seconds"] = future.result()
+                    result["status"] = "analyzing"
+                    print("{}: fetched {} issues in {:.1f}s".format(project, result["issues"],
+                                                                     result["fetch_seconds"]))
+                    analysis = analysis_pool.submit(__analyze, project, args.save_summary, args.block_size,
+                                                    args.bin_by, args.rolling_window, args.export, args.full)
+                    pending[analysis] = ("analysis", project)
+                else:
+                    result["plots"], result["analysis_seconds"] = future.result()
+                    result["status"] = "done"
+                    print("{}: analyzed in {:.1f}s".format(project, result["analysis_seconds"]))
+
+    report = {"seconds": time.perf_counter() - start, "projects": list(results.values())}
+    utils.save_as_json(report, args.output)
+    __print_report(report["projects"])
+    print("{} of {} projects analyzed in {:.1f}s. The report is written to {}".format(
+        sum(result["status"] == "done" for result in report["projects"]), len(projects), report["seconds"],
+        args.output))
+    if any(result["status"] != "done" for result in report["projects"]):
+        exit(-1)
@@ -0,0 +1,131 @@
+import argparse
+import datetime
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Optional
+
+import utils
+
+REPOSITORY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def __parse_arguments() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description="Benchmark the pipeline on a synthetic corpus, offline")
+    arg_parser.add_argument("-n", "--issues", help="Number of synthetic issues", type=int, default=1000)
+    arg_parser.add_argument("-s", "--stages", help="Stages to run, separated by comma. By default, all stages are run")
+    arg_parser.add_argument("-o", "--output", help="Where to write the results in JSON format",
+                            default="benchmark_results.json")
+    arg_parser.add_argument("--compare", help="Results of a previous run to compare with")
+    arg_parser.add_argument("--seed", help="Seed of the synthetic corpus", type=int, default=0)
+    arg_parser.add_argument("--comments", help="Average number of comments per issue", type=int, default=8)
+    arg_parser.add_argument("--code-heavy", help="Put large code blocks and logs into issues", action="store_true")
+    arg_parser.add_argument("--long-urls", help="Make URLs long", action="store_true")
+    arg_parser.add_argument("--github", help="Look up GitHub commits and pull requests while preparing issues",
+                            action="store_true")
+    arg_parser.add_argument("--latency", help="Delay of each response of the local Jira and GitHub stand-in server in "
+                                              "seconds", type=float, default=0.0)
+    arg_parser.add_argument("--concurrency", help="Maximum number of requests in flight of the async fetch engine",
+                            type=int, default=16)
+    arg_parser.add_argument("--report-issues", help="Number of issues to describe in reports", type=int, default=100)
+    arg_parser.add_argument("--chunk-size", help="Number of synthetic issues generated at a time", type=int,
+                            default=1000)
+    arg_parser.add_argument("--repeat", help="Number of runs of each stage; the fastest one is kept", type=int,
+                            default=1)
+    arg_parser.add_argument("--no-memory", help="Do not track peak memory of the stages", action="store_true")
+    arg_parser.add_argument("--startup-budget", help="Maximum start-up time of the command line tools in seconds. "
+                                                     "The benchmark fails if it is exceeded", type=float, default=0.5)
+    arg_parser.add_argument("--check", help="Only run the stages with a budget (startup), so that regressions of "
+                                            "start-up time are caught quickly",
+                            action="store_true")
+    arg_parser.add_argument("--keep", help="Keep the working directory with the synthetic project",
+                            action="store_true")
+    return arg_parser.parse_args()
+
+
+def __current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPOSITORY_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def __print_results(results: dict, baseline: dict = None) -> None:
+    print("{:<24}{:>12}{:>10}{:>14}{:>14}{}".format("stage", "seconds", "items", "items/s", "peak MiB",
+                                                     "   vs baseline" if baseline else ""))
+    for stage, result in results["stages"].items():
+        peak = result.get("peak_memory_bytes")
+        line = "{:<24}{:>12.3f}{:>10}{:>14.1f}{:>14}".format(
+            stage, result["seconds"], result["items"], result["items_per_second"] or 0,
+            "{:.1f}".format(peak / 2 ** 20) if peak is not None else "-")
+        if baseline and stage in baseline["stages"] and result["seconds"]:
+            line += "{:>13.2f}x".format(baseline["stages"][stage]["seconds"] / result["seconds"])
+        print(line)
+
+
+if __name__ == "__main__":
+    args = __parse_arguments()
+    stages = utils.split_and_strip(args.stages, ',') if args.stages else None
+
+    # The pipeline works relatively to the current directory, so the repository has to stay importable after the
+    # working directory is changed.
+    sys.path.insert(0, REPOSITORY_DIR)
+    import benchmarks
+    from benchmarks.synthetic import SyntheticCorpus
+
+    stages = stages or (benchmarks.BUDGET_STAGES if args.check else benchmarks.STAGES)
+    invalid_stages = [stage for stage in stages if stage not in benchmarks.STAGES]
+    if invalid_stages:
+        print("Invalid stages: {}. Stages are: {}".format(", ".join(invalid_stages), ", ".join(benchmarks.STAGES)))
+        exit(-1)
+    stages = [stage for stage in benchmarks.STAGES if stage in stages]
+
+    output = os.path.abspath(args.output)
+    baseline = utils.load_json(args.compare) if args.compare else None
+    corpus = SyntheticCorpus(issues=args.issues, seed=args.seed, comments=args.comments, code_heavy=args.code_heavy,
+                             long_urls=args.long_urls)
+    options = {
+        "chunk_size": args.chunk_size,
+        "report_issues": min(args.report_issues, args.issues),
+        "github": args.github,
+        "latency": args.latency,
+        "concurrency": args.concurrency,
+        "repeat": max(1, args.repeat),
+        "memory": not args.no_memory
+    }
+    results = {
+        "commit": __current_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": dict(vars(args), stages=stages),
+        "stages": {}
+    }
+
+    working_dir = tempfile.mkdtemp(prefix="genreport-benchmark-")
+    os.chdir(working_dir)
+    try:
+        if "parse_issues" not in stages and benchmarks.STORE_STAGES.intersection(stages):
+            print("Preparing a synthetic project of {} issues in {}".format(args.issues, working_dir))
+            benchmarks.populate_store(corpus, args.chunk_size)
+        for stage in stages:
+            print("Running {}...".format(stage))
+            results["stages"][stage] = benchmarks.run_stage(stage, corpus, options)
+    finally:
+        os.chdir(REPOSITORY_DIR)
+        if not args.keep:
+            shutil.rmtree(working_dir, ignore_errors=True)
+
+    utils.save_as_json(results, output)
+    __print_results(results, baseline)
+    print("Results are written to {}".format(output))
+
+    startup = results["stages"].get("startup")
+    if startup and startup["seconds"] / startup["items"] > args.startup_budget:
+        print("Start-up of the command line tools takes {:.3f}s on average, which exceeds the budget of {}s".format(
+            startup["seconds"] / startup["items"], args.startup_budget))
+        exit(1)
@@ -0,0 +1,271 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import utils
+from .synthetic import SyntheticCorpus, BOTS
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["fetch_issues", "fetch_issues_async", "fetch_github", "extract_references", "escape_with_listings",
+          "prepare_json_object", "parse_issues", "stream_issues", "analyze", "github_lookup", "describe_issue",
+          "describe_issue_cached", "startup"]
+# Stages whose results are checked against the budgets of benchmark.py
+BUDGET_STAGES = ["startup"]
+# Stages that read parsed issues from Projects/<project>/Issues
+STORE_STAGES = {"analyze", "github_lookup", "describe_issue", "describe_issue_cached"}
+
+
+class Stopwatch:
+    def __init__(self, trace_memory: bool = False):
+        """
+        Accumulates the time spent and the number of items processed inside measured blocks only, so that the
+        generation of the synthetic corpus is not accounted for. If trace_memory is set, the peak of memory allocated
+        inside the blocks is tracked as well (tracemalloc has to be started by the caller).
+        :param trace_memory: Whether to track peak memory
+        """
+        self.trace_memory = trace_memory
+        self.seconds = 0.0
+        self.items = 0
+        self.peak_memory = 0
+
+    @contextlib.contextmanager
+    def measure(self, items: int = 1):
+        baseline = 0
+        if self.trace_memory:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        self.seconds += time.perf_counter() - start
+        self.items += items
+        if self.trace_memory:
+            self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1] - baseline)
+
+
+def __issue_texts(issue: dict) -> List[str]:
+    fields = issue["fields"]
+    texts = [fields["summary"], fields["description"] or ""]
+    texts += [comment["body"] for comment in fields["comment"]["comments"]]
+    texts += [link["object"]["url"] for link in issue["remotelinks"]]
+    return texts
+
+
+def __offline_fetcher(corpus: SyntheticCorpus):
+    """
+    Create a GitHubFetcher which serves commits and pull requests from Projects/<project>/{Commits,PullRequests}
+    without ever connecting to GitHub.
+    """
+    from github_fetcher import GitHubFetcher
+    fetcher = GitHubFetcher.__new__(GitHubFetcher)
+    fetcher.project = corpus.project
+    fetcher.github, fetcher.repo = None, None
+    fetcher.savedir_commits = os.path.join("Projects", corpus.project, "Commits")
+    fetcher.savedir_pull_requests = os.path.join("Projects", corpus.project, "PullRequests")
+    return fetcher
+
+
+def write_github_data(corpus: SyntheticCorpus) -> None:
+    """
+    Write GitHub commits and pull requests of the corpus into Projects/<project> of the current directory.
+    """
+    fetcher = __offline_fetcher(corpus)
+    for directory, data in [(fetcher.savedir_commits, corpus.commits()),
+                            (fetcher.savedir_pull_requests, corpus.pull_requests())]:
+        utils.create_dir_if_necessary(directory)
+        utils.save_as_json(data, os.path.join(directory, "all.json"))
+
+
+def populate_store(corpus: SyntheticCorpus, chunk_size: int, stopwatch: Stopwatch = None) -> None:
+    """
+    Write the corpus into Projects/<project> of the current directory: GitHub commits and pull requests and parsed
+    issues. If a stopwatch is passed, parsing and saving issues is measured.
+    """
+    from jira_parser import JiraParser
+    write_github_data(corpus)
+    parser = JiraParser(corpus.project)
+    for chunk in corpus.chunks(chunk_size):
+        if stopwatch:
+            with stopwatch.measure(len(chunk)):
+                parser.parse_issues(chunk)
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                parser.parse_issues(chunk)
+
+
+def bench_fetch_issues(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    from jira_parser import JiraParser
+    from .fake_server import FakeServer, FakeData
+    with FakeServer(FakeData.from_corpus(corpus), latency=options["latency"]) as server:
+        parser = JiraParser(corpus.project, jira_server=server.jira_url)
+        with stopwatch.measure(corpus.issues):
+            parser.fetch_issues_raw(save=True)
+
+
+def bench_fetch_issues_async(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    from jira_parser import JiraParser
+    from .fake_server import FakeServer, FakeData
+    with FakeServer(FakeData.from_corpus(corpus), latency=options["latency"]) as server:
+        parser = JiraParser(corpus.project, jira_server=server.jira_url)
+        with stopwatch.measure(corpus.issues):
+            parser.fetch_issues_raw(save=True, engine="async", concurrency=options["concurrency"])
+
+
+def bench_fetch_github(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    from github_fetcher import GitHubFetcher
+    from .fake_server import FakeServer, FakeData
+    with FakeServer(FakeData.from_corpus(corpus), latency=options["latency"]) as server:
+        with stopwatch.measure(corpus.issues):
+            fetcher = GitHubFetcher(corpus.project, server.github_repository, ("benchmark", "token"),
+                                    server.github_url)
+            fetcher.fetch_commits(save=True)
+            fetcher.fetch_pull_requests(save=True)
+
+
+def bench_extract_references(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    for chunk in corpus.chunks(options["chunk_size"]):
+        texts = [__issue_texts(issue) for issue in chunk]
+        with stopwatch.measure(len(chunk)):
+            for issue_texts in texts:
+                for text in issue_texts:
+                    utils.extract_references(text, corpus.project)
+
+
+def bench_escape_with_listings(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    for chunk in corpus.chunks(options["chunk_size"]):
+        texts = [__issue_texts(issue) for issue in chunk]
+        with stopwatch.measure(len(chunk)):
+            for issue_texts in texts:
+                for text in issue_texts:
+                    utils.escape_with_listings(text.replace('\r', '\n').replace('\xa0', ''))
+
+
+def bench_prepare_json_object(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    from jira_parser import JiraParser
+    parser = JiraParser(corpus.project)
+    if options["github"]:
+        write_github_data(corpus)
+        parser.github = __offline_fetcher(corpus)
+    prepare = parser.prepare_json_object
+    for chunk in corpus.chunks(options["chunk_size"]):
+        with stopwatch.measure(len(chunk)):
+            for issue in chunk:
+                prepare(issue)
+
+
+def bench_parse_issues(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    populate_store(corpus, options["chunk_size"], stopwatch)
+
+
+def bench_stream_issues(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    from jira_parser import JiraParser
+    from .fake_server import FakeServer, FakeData
+    with FakeServer(FakeData.from_corpus(corpus), latency=options["latency"]) as server:
+        parser = JiraParser(corpus.project, jira_server=server.jira_url)
+        with stopwatch.measure(corpus.issues):
+            for _ in parser.iter_parse_issues(parser.iter_fetch_issues_raw(save=True)):
+                pass
+
+
+def bench_analyze(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    import analyzer
+    with stopwatch.measure(corpus.issues):
+        analyzer.compute_statistics(corpus.project).bin(100, "id")
+
+
+def bench_github_lookup(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    fetcher = __offline_fetcher(corpus)
+    keys = ["{}-{}".format(corpus.project, issue_id) for issue_id in range(1, options["report_issues"] + 1)]
+    with stopwatch.measure(len(keys)):
+        for key in keys:
+            fetcher.get_commits(key)
+            fetcher.get_pull_requests(key)
+
+
+def bench_describe_issue(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    import genreport
+    for issue_id in range(1, options["report_issues"] + 1):
+        key = "{}-{}".format(corpus.project, issue_id)
+        generator = genreport.ReportGenerator(corpus.project, key, bots=BOTS)
+        with stopwatch.measure():
+            generator.build_document().dumps()
+
+
+def bench_describe_issue_cached(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    """
+    Assemble the reports of the issues from a fragment cache shared by all of them and warmed up by a first pass, as
+    report_generator.py does when it is run again.
+    """
+    import genreport
+    import shutil
+    from genreport.fragment_cache import FragmentCache
+    directory = os.path.join("Projects", corpus.project, "Fragments")
+    shutil.rmtree(directory, ignore_errors=True)
+    cache = FragmentCache(directory)
+    keys = ["{}-{}".format(corpus.project, issue_id) for issue_id in range(1, options["report_issues"] + 1)]
+    for measured in [False, True]:
+        for key in keys:
+            generator = genreport.ReportGenerator(corpus.project, key, bots=BOTS, fragment_cache=cache)
+            with stopwatch.measure() if measured else contextlib.nullcontext():
+                generator.build_document().dumps()
+
+
+def bench_startup(corpus: SyntheticCorpus, stopwatch: Stopwatch, options: dict) -> None:
+    for script in ["analyzer.py", "report_generator.py"]:
+        with stopwatch.measure():
+            subprocess.run([sys.executable, os.path.join(REPOSITORY_DIR, script), "--help"],
+                           stdout=subprocess.DEVNULL, check=True)
+
+
+BENCHMARKS: Dict[str, Callable[[SyntheticCorpus, Stopwatch, dict], None]] = {
+    "fetch_issues": bench_fetch_issues,
+    "fetch_issues_async": bench_fetch_issues_async,
+    "fetch_github": bench_fetch_github,
+    "extract_references": bench_extract_references,
+    "escape_with_listings": bench_escape_with_listings,
+    "prepare_json_object": bench_prepare_json_object,
+    "parse_issues": bench_parse_issues,
+    "stream_issues": bench_stream_issues,
+    "analyze": bench_analyze,
+    "github_lookup": bench_github_lookup,
+    "describe_issue": bench_describe_issue,
+    "describe_issue_cached": bench_describe_issue_cached,
+    "startup": bench_startup,
+}
+
+
+def run_stage(stage: str, corpus: SyntheticCorpus, options: dict) -> dict:
+    """
+    Run a stage options["repeat"] times and keep the fastest run, then, if options["memory"] is set, run it once more
+    under tracemalloc to find its peak memory.
+    :param stage: Name of the stage (see STAGES)
+    :param corpus: Synthetic corpus to run the stage on
+    :param options: Options of the benchmark
+    :return: Dictionary describing the results of the stage
+    """
+    benchmark = BENCHMARKS[stage]
+    best = None
+    for _ in range(options["repeat"]):
+        stopwatch = Stopwatch()
+        benchmark(corpus, stopwatch, options)
+        if best is None or stopwatch.seconds < best.seconds:
+            best = stopwatch
+    result = {
+        "seconds": best.seconds,
+        "items": best.items,
+        "items_per_second": best.items / best.seconds if best.seconds else None
+    }
+    if options["memory"]:
+        stopwatch = Stopwatch(trace_memory=True)
+        tracemalloc.start()
+        try:
+            benchmark(corpus, stopwatch, options)
+        finally:
+            tracemalloc.stop()
+        result["peak_memory_bytes"] = stopwatch.peak_memory
+    return result
@@ -0,0 +1,469 @@
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import utils
+from .synthetic import SyntheticCorpus
+
+JIRA_PREFIX = "/jira"
+GITHUB_PREFIX = "/github"
+GITHUB_OWNER = "apache"
+# Attachments of the served issues are downloaded from the fake server, whatever server they were uploaded to
+_ATTACHMENT_URL = re.compile(r"^[a-z]+://[^/]+(?:/jira)?(?=/secure/attachment/)")
+
+
+class FakeData:
+    def __init__(self, project: str, issue_ids: List[int], raw_issue: Callable[[int], Optional[dict]],
+                 commits: List[dict], pull_requests: List[dict]):
+        """
+        Data served by the fake server.
+        :param project: Jira project key
+        :param issue_ids: Sorted list of IDs of existing issues
+        :param raw_issue: Function returning the raw issue (as stored inside Issues_raw) by its ID
+        :param commits: Commits in the form stored inside Commits/all.json
+        :param pull_requests: Pull requests in the form stored inside PullRequests/all.json
+        """
+        self.project = project
+        self.issue_ids = issue_ids
+        self.raw_issue = raw_issue
+        self.commits = commits
+        self.pull_requests = pull_requests
+        self.pull_requests_by_number = {pr["number"]: pr for pr in pull_requests}
+
+    @classmethod
+    def from_corpus(cls, corpus: SyntheticCorpus) -> "FakeData":
+        """
+        Serve a synthetic corpus. Issues are generated on request, so the size of the corpus does not matter.
+        """
+        return cls(corpus.project, list(range(1, corpus.issues + 1)), corpus.raw_issue, corpus.commits(),
+                   corpus.pull_requests())
+
+    @classmethod
+    def from_store(cls, project_dir: str) -> "FakeData":
+        """
+        Serve recorded responses: raw issues, commits and pull requests previously fetched into a project directory,
+        e.g. Projects/HBASE.
+        """
+        project = os.path.basename(os.path.normpath(project_dir))
+        issues_raw_dir = os.path.join(project_dir, "Issues_raw")
+        issue_ids = sorted(int(filename[len(project) + 1:-len(".json")])
+                           for filename in (os.listdir(issues_raw_dir) if os.path.isdir(issues_raw_dir) else [])
+                           if re.fullmatch(re.escape(project) + r"-\d+\.json", filename))
+
+        def raw_issue(issue_id: int) -> Optional[dict]:
+            path = os.path.join(issues_raw_dir, "{}-{}.json".format(project, issue_id))
+            return utils.load_json(path) if os.path.isfile(path) else None
+
+        def load_list(path: str) -> List[dict]:
+            return utils.load_json(path) if os.path.isfile(path) else []
+
+        return cls(project, issue_ids, raw_issue, load_list(os.path.join(project_dir, "Commits", "all.json")),
+                   load_list(os.path.join(project_dir, "PullRequests", "all.json")))
+
+
+class FakeServer:
+    def __init__(self, data: FakeData, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, max_page_size: int = 100, rate_limit: int = 0, rate_window: float = 60.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        """
+        Local stand-in for the Jira REST API (served under /jira) and the GitHub REST API (served under /github).
+        Only the endpoints used by JiraParser, GitHubFetcher and AttachmentMirror are implemented. Attachments are
+        served with generated content (see attachment_content), also for recorded data.
+        :param data: Data to serve
+        :param host: Host to listen on
+        :param port: Port to listen on. If 0, a free port is picked
+        :param latency: Delay of each response in seconds
+        :param jitter: Maximum random delay added to the latency in seconds
+        :param max_page_size: Maximum number of items per page, whatever the client asks for
+        :param rate_limit: Maximum number of requests to each API per rate window. If 0, requests are not limited
+        :param rate_window: Duration of a rate window in seconds
+        :param error_rate: Probability of a request to fail with an HTTP 503 error
+        :param seed: Seed of the random generator used for jitter and errors
+        """
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.max_page_size = max_page_size
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.windows = {}  # API -> (start of the current rate window, requests made in it)
+        self.stats = {"requests": 0, "bytes": 0, "errors": 0, "rate_limited": 0, "endpoints": {}}
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def jira_url(self) -> str:
+        """
+        URL to pass as the Jira server to JiraParser.
+        """
+        return self.url + JIRA_PREFIX
+
+    @property
+    def github_url(self) -> str:
+        """
+        URL to pass as the GitHub API to GitHubFetcher. The served repository is "apache/<project in lower case>".
+        """
+        return self.url + GITHUB_PREFIX
+
+    @property
+    def github_repository(self) -> str:
+        return "{}/{}".format(GITHUB_OWNER, self.data.project.lower())
+
+    def start(self) -> "FakeServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def delay(self) -> None:
+        with self.lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    def should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def consume_rate(self, api: str) -> Tuple[int, int]:
+        """
+        Account for a request to the API.
+        :param api: Either "jira" or "github"
+        :return: Tuple of the number of requests remaining in the current window (negative if the limit is exceeded)
+        and the UNIX time when the window resets
+        """
+        with self.lock:
+            now = time.time()
+            start, count = self.windows.get(api, (now, 0))
+            if now - start >= self.rate_window:
+                start, count = now, 0
+            count += 1
+            self.windows[api] = (start, count)
+        remaining = self.rate_limit - count if self.rate_limit else 1
+        return remaining, int(start + self.rate_window)
+
+    def record(self, endpoint: str, status: int, size: int) -> None:
+        with self.lock:
+            stats = self.stats
+            stats["requests"] += 1
+            stats["bytes"] += size
+            if status == 429 or status == 403:
+                stats["rate_limited"] += 1
+            elif status >= 500:
+                stats["errors"] += 1
+            stats["endpoints"][endpoint] = stats["endpoints"].get(endpoint, 0) + 1
+
+
+def _select_issue_ids(data: FakeData, jql: str) -> Optional[List[int]]:
+    """
+    Evaluate the subset of JQL used by the clients: "project = KEY", "key in (...)", "key >= KEY-1", "key <= KEY-2"
+    joined by AND, optionally followed by "ORDER BY key ASC|DESC". Other clauses are ignored.
+    :param data: Served data
+    :param jql: JQL query
+    :return: Sorted list of matching issue IDs or None if the project does not exist
+    """
+    project = re.search(r"project\s*=\s*\"?([A-Za-z][A-Za-z0-9_]*)\"?", jql, re.IGNORECASE)
+    if project and project.group(1).upper() != data.project:
+        return None
+    issue_ids = data.issue_ids
+    key = r"(?:issue)?key\s*{}\s*\"?" + re.escape(data.project) + r"-(\d+)\"?"
+    lower = re.search(key.format(">="), jql, re.IGNORECASE)
+    upper = re.search(key.format("<="), jql, re.IGNORECASE)
+    if lower:
+        issue_ids = [issue_id for issue_id in issue_ids if issue_id >= int(lower.group(1))]
+    if upper:
+        issue_ids = [issue_id for issue_id in issue_ids if issue_id <= int(upper.group(1))]
+    keys = re.search(r"(?:issue)?key\s+in\s*\(([^)]*)\)", jql, re.IGNORECASE)
+    if keys:
+        wanted = set(int(number) for number in re.findall(re.escape(data.project) + r"-(\d+)", keys.group(1)))
+        issue_ids = [issue_id for issue_id in issue_ids if issue_id in wanted]
+    if re.search(r"order\s+by\s+(?:issue)?key\s+desc", jql, re.IGNORECASE):
+        issue_ids = list(reversed(issue_ids))
+    return issue_ids
+
+
+def _project_fields(issue: dict, fields: Optional[str]) -> dict:
+    """
+    Keep only the requested fields of a raw issue, like Jira does.
+    """
+    if not fields or fields in ("*all", "*navigable"):
+        return issue
+    wanted = set(utils.split_and_strip(fields, ','))
+    projected = dict(issue)
+    projected["fields"] = {name: value for name, value in issue["fields"].items() if name in wanted}
+    return projected
+
+
+def attachment_content(attachment_id: int, filename: str) -> bytes:
+    """
+    Content served for an attachment: a few kilobytes of text depending only on its ID and file name, so that tests
+    can tell whether a download is complete.
+    """
+    line = "{} {}\n".format(filename, attachment_id).encode()
+    return line * (1 + (1024 + attachment_id % 4096) // len(line))
+
+
+def _serve_attachments(issue: dict, jira_url: str) -> dict:
+    """
+    Point the attachments of a raw issue to the fake server.
+    """
+    fields = issue.get("fields") or {}
+    if not fields.get("attachment"):
+        return issue
+    attachments = [dict(attachment, content=_ATTACHMENT_URL.sub(jira_url, attachment["content"]))
+                   for attachment in fields["attachment"]]
+    return dict(issue, fields=dict(fields, attachment=attachments))
+
+
+def _github_date(date: str) -> str:
+    return date + "T00:00:00Z"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def __send(self, endpoint: str, status: int, body, headers: Dict[str, str] = None,
+               content_type: str = "application/json;charset=UTF-8") -> None:
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.fake.record(endpoint, status, len(payload))
+
+    def __base_url(self) -> str:
+        return "http://" + self.headers.get("Host", "{}:{}".format(*self.server.server_address[:2]))
+
+    def do_GET(self) -> None:
+        fake = self.server.fake
+        url = urlparse(self.path)
+        # Repeated parameters (e.g. fields=summary&fields=comment) are joined by comma
+        query = {name: ",".join(values) for name, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+
+        if path == "/_stats":
+            self.__send("stats", 200, fake.stats)
+            return
+
+        api = "jira" if path.startswith(JIRA_PREFIX) else "github" if path.startswith(GITHUB_PREFIX) else None
+        if api is None:
+            self.__send("unknown", 404, {"message": "Not Found"})
+            return
+
+        fake.delay()
+        remaining, reset = fake.consume_rate(api)
+        if remaining < 0:
+            if api == "jira":
+                self.__send("jira:rate_limited", 429, {"errorMessages": ["Rate limit exceeded"]},
+                            {"Retry-After": str(max(1, reset - int(time.time())))})
+            else:
+                self.__send("github:rate_limited", 403,
+                            {"message": "API rate limit exceeded",
+                             "documentation_url": "https://docs.github.com/rest/rate-limit"},
+                            {"X-RateLimit-Limit": str(fake.rate_limit), "X-RateLimit-Remaining": "0",
+                             "X-RateLimit-Reset": str(reset)})
+            return
+        if fake.should_fail():
+            self.__send(api + ":error", 503, {"errorMessages": ["Injected failure"], "message": "Injected failure"})
+            return
+
+        if api == "jira":
+            self.__jira(path[len(JIRA_PREFIX):], query)
+        else:
+            headers = {}
+            if fake.rate_limit:
+                headers = {"X-RateLimit-Limit": str(fake.rate_limit), "X-RateLimit-Remaining": str(remaining),
+                           "X-RateLimit-Reset": str(reset)}
+            self.__github(path[len(GITHUB_PREFIX):], query, headers)
+
+    def __jira(self, path: str, query: Dict[str, str]) -> None:
+        data = self.server.fake.data
+        if path == "/rest/api/2/serverInfo":
+            self.__send("jira:serverInfo", 200, {"baseUrl": self.__base_url() + JIRA_PREFIX, "version": "8.3.4",
+                                                 "versionNumbers": [8, 3, 4], "deploymentType": "Server",
+                                                 "serverTitle": "Fake Jira"})
+        elif path == "/rest/api/2/field":
+            self.__send("jira:field", 200, [])
+        elif path == "/rest/api/2/search":
+            issue_ids = _select_issue_ids(data, query.get("jql", ""))
+            if issue_ids is None:
+                self.__send("jira:search", 400, {"errorMessages": ["The value '{}' does not exist for the field "
+                                                                   "'project'.".format(query.get("jql"))]})
+                return
+            start_at = int(query.get("startAt", 0))
+            max_results = min(int(query.get("maxResults", 50)), self.server.fake.max_page_size)
+            page = [data.raw_issue(issue_id) for issue_id in issue_ids[start_at:start_at + max_results]]
+            self.__send("jira:search", 200, {
+                "startAt": start_at,
+                "maxResults": max_results,
+                "total": len(issue_ids),
+                "issues": [_project_fields(self.__jira_issue(issue), query.get("fields")) for issue in page if issue]
+            })
+        elif path.startswith("/secure/attachment/"):
+            self.__attachment(path)
+        else:
+            match = re.fullmatch(r"/rest/api/2/issue/([A-Za-z0-9_]+)-(\d+)(/remotelink)?", path)
+            issue = data.raw_issue(int(match.group(2))) \
+                if match and match.group(1) == data.project and int(match.group(2)) in data.issue_ids else None
+            if not issue:
+                self.__send("jira:issue", 404, {"errorMessages": ["Issue Does Not Exist"], "errors": {}})
+            elif match.group(3):
+                self.__send("jira:remotelink", 200, issue.get("remotelinks", []))
+            else:
+                self.__send("jira:issue", 200, _project_fields(self.__jira_issue(issue), query.get("fields")))
+
+    def __jira_issue(self, issue: dict) -> dict:
+        """
+        Turn a stored raw issue back into the form returned by Jira: remote links are served separately and
+        attachments are downloaded from the fake server.
+        """
+        issue = {name: value for name, value in issue.items() if name != "remotelinks"}
+        issue.setdefault("self", "{}{}/rest/api/2/issue/{}".format(self.__base_url(), JIRA_PREFIX, issue["key"]))
+        return _serve_attachments(issue, self.__base_url() + JIRA_PREFIX)
+
+    def __attachment(self, path: str) -> None:
+        """
+        Serve the content of an attachment, supporting the open-ended range requests used to continue downloads.
+        """
+        match = re.fullmatch(r"/secure/attachment/(\d+)/([^/]+)", path)
+        if not match:
+            self.__send("jira:attachment", 404, {"errorMessages": ["Attachment Does Not Exist"]})
+            return
+        content = attachment_content(int(match.group(1)), match.group(2))
+        offset = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if not offset:
+            self.__send("jira:attachment", 200, content, content_type="application/octet-stream")
+        elif int(offset.group(1)) >= len(content):
+            self.__send("jira:attachment", 416, b"", {"Content-Range": "bytes */{}".format(len(content))},
+                        "application/octet-stream")
+        else:
+            start = int(offset.group(1))
+            self.__send("jira:attachment_range", 206, content[start:],
+                        {"Content-Range": "bytes {}-{}/{}".format(start, len(content) - 1, len(content))},
+                        "application/octet-stream")
+
+    def __github_page(self, endpoint: str, items: List[dict], query: Dict[str, str],
+                      headers: Dict[str, str]) -> None:
+        per_page = min(int(query.get("per_page", 30)), self.server.fake.max_page_size)
+        page = int(query.get("page", 1))
+        pages = max(1, (len(items) + per_page - 1) // per_page)
+        links = []
+        url = self.__base_url() + self.path.split("?")[0]
+        for relation, number in [("next", page + 1), ("last", pages)]:
+            if page < pages:
+                links.append('<{}?{}>; rel="{}"'.format(url, urlencode(dict(query, page=number, per_page=per_page)),
+                                                         relation))
+        if links:
+            headers = dict(headers, Link=", ".join(links))
+        self.__send(endpoint, 200, items[(page - 1) * per_page:page * per_page], headers)
+
+    def __github(self, path: str, query: Dict[str, str], headers: Dict[str, str]) -> None:
+        fake = self.server.fake
+        data = fake.data
+        repo_url = "{}{}/repos/{}".format(self.__base_url(), GITHUB_PREFIX, fake.github_repository)
+        repo_path = "/repos/" + fake.github_repository
+        if path == "/rate_limit":
+            self.__send("github:rate_limit", 200, {"resources": {"core": {"limit": fake.rate_limit or 5000,
+                                                                          "remaining": fake.rate_limit or 5000,
+                                                                          "reset": int(time.time())}}}, headers)
+        elif path == repo_path:
+            self.__send("github:repo", 200, {"id": 1, "name": data.project.lower(),
+                                             "full_name": fake.github_repository, "url": repo_url,
+                                             "owner": {"login": GITHUB_OWNER}}, headers)
+        elif path == repo_path + "/commits":
+            commits = [{"sha": commit["sha"], "url": repo_url + "/commits/" + commit["sha"],
+                        "commit": {"message": commit["message"],
+                                   "author": {"name": commit["author"], "email": commit["author"] + "@apache.org",
+                                              "date": _github_date(commit["date"])}}}
+                       for commit in data.commits]
+            self.__github_page("github:commits", commits, query, headers)
+        elif path == repo_path + "/pulls":
+            state = query.get("state", "open")
+            pull_requests = [{"number": pr["number"], "title": pr["title"], "body": pr["body"], "state": pr["status"],
+                              "created_at": _github_date(pr["date"]), "user": {"login": pr["author"]},
+                              "url": "{}/pulls/{}".format(repo_url, pr["number"]),
+                              "issue_url": "{}/issues/{}".format(repo_url, pr["number"])}
+                             for pr in data.pull_requests if state == "all" or pr["status"] == state]
+            self.__github_page("github:pulls", pull_requests, query, headers)
+        else:
+            match = re.fullmatch(re.escape(repo_path) + r"/issues/(\d+)/comments", path)
+            pr = data.pull_requests_by_number.get(int(match.group(1))) if match else None
+            if not pr:
+                self.__send("github:unknown", 404, {"message": "Not Found"}, headers)
+                return
+            comments = [{"user": {"login": comment["author"]}, "created_at": _github_date(comment["date"]),
+                         "body": comment["body"]}
+                        for comment in pr["comments"]]
+            self.__github_page("github:comments", comments, query, headers)
+
+
+def __parse_arguments() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description="Serve synthetic or recorded Jira and GitHub REST responses")
+    arg_parser.add_argument("--store", help="Project directory with recorded data to serve, e.g. Projects/HBASE. "
+                                            "By default, a synthetic corpus is served")
+    arg_parser.add_argument("-n", "--issues", help="Number of synthetic issues", type=int, default=1000)
+    arg_parser.add_argument("--project", help="Key of the synthetic project", default="BENCH")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--latency", help="Delay of each response in seconds", type=float, default=0.0)
+    arg_parser.add_argument("--jitter", help="Maximum random delay added to the latency", type=float, default=0.0)
+    arg_parser.add_argument("--max-page-size", help="Maximum number of items per page", type=int, default=100)
+    arg_parser.add_argument("--rate-limit", help="Maximum number of requests per API per window", type=int, default=0)
+    arg_parser.add_argument("--rate-window", help="Duration of a rate window in seconds", type=float, default=60.0)
+    arg_parser.add_argument("--error-rate", help="Probability of a request to fail", type=float, default=0.0)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = __parse_arguments()
+    if args.store:
+        fake_data = FakeData.from_store(args.store)
+    else:
+        fake_data = FakeData.from_corpus(SyntheticCorpus(args.project, args.issues, args.seed))
+    server = FakeServer(fake_data, args.host, args.port, args.latency, args.jitter, args.max_page_size,
+                        args.rate_limit, args.rate_window, args.error_rate, args.seed)
+    print("Serving project {} ({} issues)".format(fake_data.project, len(fake_data.issue_ids)))
+    print("Jira server: {}".format(server.jira_url))
+    print("GitHub API: {} (repository {})".format(server.github_url, server.github_repository))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
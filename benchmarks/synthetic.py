@@ -0,0 +1,273 @@
+import random
+from typing import Iterator, List
+
+WORDS = ["region", "server", "compaction", "flush", "memstore", "block", "cache", "replica", "timeout", "exception",
+         "client", "scanner", "table", "snapshot", "balancer", "split", "merge", "namenode", "datanode", "lease",
+         "the", "a", "is", "when", "after", "before", "fails", "with", "patch", "attached", "please", "review",
+         "+1", "LGTM", "committed", "trunk", "branch", "thanks", "test", "failure", "flaky", "reproduce"]
+AUTHORS = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan", "judy"]
+BOTS = ["hadoopqa", "githubbot", "jenkins"]
+STATUSES = ["Open", "In Progress", "Patch Available", "Resolved", "Closed", "Reopened"]
+ISSUE_TYPES = ["Bug", "Improvement", "New Feature", "Task", "Sub-task"]
+LINK_TYPES = ["Relates", "Duplicate", "Blocker", "Incorporates", "Reference"]
+LANGUAGES = ["java", "xml", "bash", "python", ""]
+JIRA_URL = "https://issues.apache.org/jira"
+URL_TEMPLATES = [
+    "https://github.com/apache/{project}/blob/master/src/main/java/org/apache/{project}/Foo{n}.java",
+    "http://mail-archives.apache.org/mod_mbox/{project}-dev/201{d}.mbox/%3C{n}@apache.org%3E",
+    "https://lists.apache.org/thread.html/{n}@%3Cdev.{project}.apache.org%3E",
+    "https://markmail.org/message/{n}",
+    "https://www.example.org/papers/design-{n}.pdf",
+    "https://archive.apache.org/dist/{project}/{project}-{d}.{n}.tar.gz",
+    "https://builds.apache.org/job/PreCommit-{project}-Build/{n}/testReport/",
+    "https://svn.apache.org/r{n}",
+]
+
+
+class SyntheticCorpus:
+    def __init__(self, project: str = "BENCH", issues: int = 1000, seed: int = 0, comments: int = 8,
+                 code_heavy: bool = False, long_urls: bool = False):
+        """
+        Deterministic generator of Jira issues, GitHub commits and GitHub pull requests resembling those of Apache
+        projects. Every issue is generated from its own seed, so any slice of the corpus can be regenerated
+        independently and large corpora never have to be kept in memory at once.
+        :param project: Jira project key
+        :param issues: Number of issues in the corpus
+        :param seed: Seed of the corpus
+        :param comments: Average number of comments per issue
+        :param code_heavy: Whether descriptions and comments often contain large code blocks and pasted logs
+        :param long_urls: Whether URLs often carry very long paths and query strings
+        """
+        self.project = project
+        self.issues = issues
+        self.seed = seed
+        self.comments = comments
+        self.code_heavy = code_heavy
+        self.long_urls = long_urls
+
+    def __random(self, issue_id: int, stream: int = 0) -> random.Random:
+        return random.Random((self.seed * 1000003 + issue_id) * 7 + stream)
+
+    def __sentence(self, rng: random.Random, words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    def __url(self, rng: random.Random) -> str:
+        url = rng.choice(URL_TEMPLATES).format(project=self.project.lower(), n=rng.randint(1, 10 ** 7),
+                                               d=rng.randint(0, 9))
+        if self.long_urls and rng.random() < 0.5:
+            url += "?" + "&".join("param{}={}".format(i, "x" * rng.randint(10, 80)) for i in range(rng.randint(5, 30)))
+        return url
+
+    def __code_block(self, rng: random.Random) -> str:
+        lines = rng.randint(20, 400) if self.code_heavy else rng.randint(3, 30)
+        body = "\n".join("    at org.apache.{}.Class{}.method{}(Class{}.java:{})".format(
+            self.project.lower(), rng.randint(1, 500), rng.randint(1, 50), rng.randint(1, 500), rng.randint(1, 2000))
+            for _ in range(lines))
+        if rng.random() < 0.3:
+            return "{noformat}\n" + body + "\n{noformat}"
+        language = rng.choice(LANGUAGES)
+        return ("{code:" + language + "}" if language else "{code}") + "\n" + body + "\n{code}"
+
+    def text(self, rng: random.Random, issue_id: int) -> str:
+        """
+        Generate a piece of Jira markup containing prose, URLs, revisions, other issue keys and code blocks.
+        :param rng: Random generator to use
+        :param issue_id: ID of the issue the text belongs to; other issues referenced precede it
+        :return: Generated text
+        """
+        parts = []
+        for _ in range(rng.randint(1, 6)):
+            parts.append(self.__sentence(rng, rng.randint(5, 40)))
+            roll = rng.random()
+            if roll < 0.35:
+                parts.append(self.__url(rng))
+            elif roll < 0.45:
+                parts.append("Committed as r{}".format(rng.randint(100000, 2000000)))
+            elif roll < 0.6:
+                parts.append("See {}-{}".format(self.project, rng.randint(1, max(1, issue_id))))
+            if rng.random() < (0.5 if self.code_heavy else 0.1):
+                parts.append(self.__code_block(rng))
+        return "\r\n".join(parts)
+
+    def __date(self, issue_id: int, offset: int = 0) -> str:
+        day = (issue_id * 3650 // max(1, self.issues)) + offset
+        year, day = 2010 + day // 365, day % 365
+        return "{}-{:02d}-{:02d}T12:00:00.000+0000".format(year, 1 + day // 31 % 12, 1 + day % 28)
+
+    @staticmethod
+    def __user(name: str) -> dict:
+        """
+        User in the form returned by the Jira REST API, with the avatars and profile details the parser never reads.
+        """
+        return {
+            "self": "{}/rest/api/2/user?username={}".format(JIRA_URL, name),
+            "name": name,
+            "key": name,
+            "avatarUrls": {
+                size: "{}/secure/useravatar?size={}&avatarId=10452".format(JIRA_URL, label)
+                for size, label in [("48x48", "large"), ("24x24", "small"), ("16x16", "xsmall"),
+                                    ("32x32", "medium")]
+            },
+            "displayName": name.title(),
+            "active": True,
+            "timeZone": "Etc/UTC"
+        }
+
+    @staticmethod
+    def __named(resource: str, name: str, resource_id: int) -> dict:
+        """
+        Named resource like a status or an issue type in the form returned by the Jira REST API.
+        """
+        return {
+            "self": "{}/rest/api/2/{}/{}".format(JIRA_URL, resource, resource_id),
+            "description": "",
+            "iconUrl": "{}/images/icons/{}/{}.png".format(JIRA_URL, resource, resource_id),
+            "name": name,
+            "id": str(resource_id)
+        }
+
+    def raw_issue(self, issue_id: int) -> dict:
+        """
+        Generate an issue in the form returned by the Jira REST API (and stored inside Issues_raw).
+        :param issue_id: ID of the issue
+        :return: Raw issue represented as a dictionary
+        """
+        rng = self.__random(issue_id)
+        key = "{}-{}".format(self.project, issue_id)
+        comments = []
+        for index in range(rng.randint(0, 2 * self.comments)):
+            author = rng.choice(BOTS) if rng.random() < 0.15 else rng.choice(AUTHORS)
+            comments.append({
+                "self": "{}/rest/api/2/issue/{}/comment/{}".format(JIRA_URL, issue_id, issue_id * 100 + index),
+                "id": str(issue_id * 100 + index),
+                "author": self.__user(author),
+                "body": self.text(rng, issue_id),
+                "updateAuthor": self.__user(author),
+                "created": self.__date(issue_id, index),
+                "updated": self.__date(issue_id, index)
+            })
+        links = []
+        for _ in range(rng.randint(0, 3) if issue_id > 1 else 0):
+            direction = "inwardIssue" if rng.random() < 0.5 else "outwardIssue"
+            link_type = rng.choice(LINK_TYPES)
+            linked_id = rng.randint(1, issue_id - 1)
+            links.append({
+                "id": str(issue_id * 10 + len(links)),
+                "self": "{}/rest/api/2/issueLink/{}".format(JIRA_URL, issue_id * 10 + len(links)),
+                "type": {"id": "10030", "name": link_type, "inward": "is related to", "outward": "relates to",
+                         "self": "{}/rest/api/2/issueLinkType/10030".format(JIRA_URL)},
+                direction: {
+                    "id": str(linked_id),
+                    "key": "{}-{}".format(self.project, linked_id),
+                    "self": "{}/rest/api/2/issue/{}".format(JIRA_URL, linked_id),
+                    "fields": {"summary": "Linked issue {}".format(linked_id),
+                               "status": self.__named("status", "Open", 1),
+                               "issuetype": self.__named("issuetype", "Bug", 1)}
+                }
+            })
+        creator = rng.choice(AUTHORS)
+        return {
+            "expand": "operations,versionedRepresentations,editmeta,changelog,renderedFields",
+            "id": str(issue_id),
+            "self": "{}/rest/api/2/issue/{}".format(JIRA_URL, issue_id),
+            "key": key,
+            "fields": {
+                "project": {
+                    "self": "{}/rest/api/2/project/12310000".format(JIRA_URL),
+                    "id": "12310000",
+                    "key": self.project,
+                    "name": self.project.title(),
+                    "avatarUrls": {"48x48": "{}/secure/projectavatar?pid=12310000&avatarId=10011".format(JIRA_URL)}
+                },
+                "creator": self.__user(creator),
+                "created": self.__date(issue_id),
+                "updated": self.__date(issue_id, 30),
+                "status": self.__named("status", rng.choice(STATUSES), 1),
+                "issuetype": self.__named("issuetype", rng.choice(ISSUE_TYPES), 1),
+                "summary": self.__sentence(rng, rng.randint(4, 12)),
+                "description": self.text(rng, issue_id) if rng.random() < 0.95 else None,
+                "attachment": [{"self": "{}/rest/api/2/attachment/{}".format(JIRA_URL, issue_id * 10 + index),
+                                "id": str(issue_id * 10 + index),
+                                "filename": "{}.{}.patch".format(key, index),
+                                "author": self.__user(creator),
+                                "created": self.__date(issue_id, index),
+                                "size": 4096 * (index + 1),
+                                "mimeType": "text/x-patch",
+                                "content": "https://issues.apache.org/jira/secure/attachment/{}/{}.patch".format(
+                                    rng.randint(1, 10 ** 8), key)}
+                               for index in range(rng.randint(0, 4))],
+                "issuelinks": links,
+                "comment": {"comments": comments, "maxResults": len(comments), "total": len(comments),
+                            "startAt": 0}
+            },
+            "remotelinks": [{"id": issue_id * 10 + index,
+                             "self": "{}/rest/api/2/issue/{}/remotelink/{}".format(JIRA_URL, key,
+                                                                                   issue_id * 10 + index),
+                             "object": {"url": self.__url(rng), "title": "Link {}".format(index),
+                                        "icon": {}}}
+                            for index in range(rng.randint(0, 2))]
+        }
+
+    def raw_issues(self, start: int = 1, count: int = None) -> Iterator[dict]:
+        """
+        Generate raw issues with IDs from start on.
+        :param start: ID of the first issue
+        :param count: Number of issues to generate. By default, the rest of the corpus is generated
+        :return: Generator of raw issues
+        """
+        end = self.issues + 1 if count is None else min(self.issues + 1, start + count)
+        for issue_id in range(start, end):
+            yield self.raw_issue(issue_id)
+
+    def chunks(self, size: int) -> Iterator[List[dict]]:
+        """
+        Generate the corpus as lists of at most size raw issues.
+        :param size: Number of issues per chunk
+        :return: Generator of lists of raw issues
+        """
+        for start in range(1, self.issues + 1, size):
+            yield list(self.raw_issues(start, size))
+
+    def commits(self) -> List[dict]:
+        """
+        Generate commits in the form stored inside Projects/<project>/Commits/all.json. Roughly two thirds of the
+        issues get one or more commits.
+        :return: List of commits represented as dictionaries
+        """
+        commits = []
+        for issue_id in range(1, self.issues + 1):
+            rng = self.__random(issue_id, 1)
+            for index in range(rng.choice([0, 1, 1, 2])):
+                sha = "{:040x}".format(rng.getrandbits(160))
+                commits.append({
+                    "sha": sha,
+                    "short_sha": sha[:7],
+                    "author": rng.choice(AUTHORS),
+                    "date": self.__date(issue_id, index + 1).split("T")[0],
+                    "message": "{}-{}: {}".format(self.project, issue_id, self.__sentence(rng, rng.randint(4, 15)))
+                })
+        return commits
+
+    def pull_requests(self) -> List[dict]:
+        """
+        Generate pull requests in the form stored inside Projects/<project>/PullRequests/all.json. Roughly a third
+        of the issues get a pull request.
+        :return: List of pull requests represented as dictionaries
+        """
+        pull_requests = []
+        for issue_id in range(1, self.issues + 1):
+            rng = self.__random(issue_id, 2)
+            if rng.random() > 0.33:
+                continue
+            pull_requests.append({
+                "number": len(pull_requests) + 1,
+                "title": "{}-{}: {}".format(self.project, issue_id, self.__sentence(rng, rng.randint(4, 10))),
+                "author": rng.choice(AUTHORS),
+                "status": rng.choice(["open", "closed"]),
+                "date": self.__date(issue_id, 2).split("T")[0],
+                "body": self.text(rng, issue_id),
+                "comments": [{"author": rng.choice(AUTHORS + BOTS), "date": self.__date(issue_id, 3).split("T")[0],
+                              "body": self.text(rng, issue_id)}
+                             for _ in range(rng.randint(0, 5))]
+            })
+        return pull_requests
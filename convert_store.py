@@ -0,0 +1,71 @@
+import argparse
+import os
+import time
+from typing import Tuple
+
+import utils
+from jira_parser import slim_issue_raw
+from utils import codec
+
+STORES = ["Issues_raw", "Issues", "Summary", "Commits", "PullRequests"]
+
+
+def __parse_arguments() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description="Convert the stored files of a project to another codec")
+    arg_parser.add_argument("-p", "--project", help="Target Jira project in capital letters", required=True)
+    arg_parser.add_argument("--stores", help="Stores to convert, separated by comma. By default, all of {} "
+                                             "are converted".format(", ".join(STORES)))
+    arg_parser.add_argument("--codec", help="Codec of the files", choices=codec.CODECS, default="compact")
+    arg_parser.add_argument("--compression", help="Compression of the files", choices=codec.COMPRESSIONS,
+                            default="none")
+    arg_parser.add_argument("--slim-raw", help="Keep only the fields used by the parser in Issues_raw",
+                            action="store_true")
+    return arg_parser.parse_args()
+
+
+def __measure(directory: str) -> Tuple[int, int, float]:
+    """
+    Measure the files of a store.
+    :param directory: Directory of the store
+    :return: Tuple of the number of files, their total size in bytes and the time to load all of them in seconds
+    """
+    files, size, seconds = 0, 0, 0.0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".json"):
+                start = time.perf_counter()
+                utils.load_json(entry.path)
+                seconds += time.perf_counter() - start
+                files += 1
+                size += entry.stat().st_size
+    return files, size, seconds
+
+
+def __convert(directory: str, slim_raw: bool) -> None:
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".json"):
+                obj = utils.load_json(entry.path)
+                utils.save_as_json(slim_issue_raw(obj) if slim_raw else obj, entry.path)
+
+
+if __name__ == "__main__":
+    args = __parse_arguments()
+    stores = utils.split_and_strip(args.stores, ',') if args.stores else STORES
+    invalid_stores = [store for store in stores if store not in STORES]
+    if invalid_stores:
+        print("Invalid stores: {}. Stores are: {}".format(", ".join(invalid_stores), ", ".join(STORES)))
+        exit(-1)
+
+    print("{:<16}{:>8}{:>16}{:>16}{:>12}{:>12}".format("store", "files", "bytes before", "bytes after",
+                                                       "load before", "load after"))
+    for store in stores:
+        directory = os.path.join("Projects", args.project, store)
+        if not os.path.isdir(directory):
+            continue
+        files, size_before, load_before = __measure(directory)
+        codec.set_store_codec(directory, args.codec, args.compression)
+        __convert(directory, args.slim_raw and store == "Issues_raw")
+        _, size_after, load_after = __measure(directory)
+        print("{:<16}{:>8}{:>16}{:>16}{:>11.2f}s{:>11.2f}s".format(store, files, size_before, size_after,
+                                                                   load_before, load_after))
@@ -1,20 +1,60 @@
-from pylatex import Document, Package, Command, Enumerate, Subsection
-from pylatex.section import Chapter, Section
-from pylatex.utils import escape_latex, NoEscape, bold
-from github.GithubException import UnknownObjectException, BadCredentialsException
 import os
 import utils
+from utils import instrumentation
 from github_fetcher import GitHubFetcher
 from jira_parser import JiraParser
-from typing import Tuple, List
-import pdflatex
+from jira_parser.link_graph import LinkGraph
+from jira_parser.attachments import AttachmentMirror
+from genreport.fragment_cache import FragmentCache
+from utils.latex_transform import RenderPolicy
+from typing import Callable, Tuple, List, Optional, TYPE_CHECKING
+
+# PyLaTeX and PyGithub are imported by the code paths using them, so that importing the package stays cheap
+if TYPE_CHECKING:
+    from pylatex import Document
+    from pylatex.base_classes import Container
+
+# How attachments are referred to: by their URLs, by links to their local copies in the attachment mirror or, for
+# images, by embedding their local copies
+ATTACHMENT_MODES = ["link", "local", "embed"]
+EMBEDDED_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".pdf"}
+# Directory of the whole texts of truncated descriptions and comments, when they are referred to as appendices
+APPENDIX_DIR = os.path.join("Reports", "Appendix")
+
+
+class GitHubError(Exception):
+    pass
 
 
 class ReportGenerator:
     def __init__(self, project: str, issue_key: str, github_repository: str = None,
                  github_credentials: Tuple[str, str] = None, bots: List[str] = None,
-                 exclude: List[str] = None):
+                 exclude: List[str] = None, jira_server: str = None, github_api: str = None, depth: int = 1,
+                 fragment_cache: FragmentCache = None, parser: JiraParser = None, link_graph: LinkGraph = None,
+                 github_fetcher: GitHubFetcher = None, attachments: str = "link",
+                 attachment_mirror: AttachmentMirror = None, render_policy: RenderPolicy = None):
+        """
+        Generator of the report of an issue. A long-running process generating many reports may pass the parser,
+        the link graph, the GitHub fetcher and the attachment mirror it keeps, so that their caches are reused.
+        Attachments missing from the mirror are always referred to by their URLs. Descriptions and comments are
+        truncated as defined by the render policy, the default one unless specified.
+        """
         self.project = project
+        self.render_policy = render_policy or RenderPolicy()
+        self.attachments = attachments
+        self.attachment_mirror = None
+        if attachments != "link":
+            self.attachment_mirror = attachment_mirror or AttachmentMirror(project)
+        self.parser = parser or JiraParser(project, jira_server=jira_server)
+        self.link_graph = link_graph
+        self.github_fetcher = github_fetcher
+        self.fragment_cache = fragment_cache
+        self.depth = depth
+        self.distances = dict()
+        # Number of truncated texts written to Reports/Appendix
+        self.__appendices = 0
+        self.jira_server = jira_server
+        self.github_api = github_api
         self.issue_key = issue_key
         self.github_repository = github_repository
         self.credentials = github_credentials
@@ -29,19 +69,25 @@ class ReportGenerator:
         else:
             self.exclude = []
 
-        self.data = self.__load_issue()
+        with instrumentation.span("report.load_issues", issue_key):
+            self.data = self.__load_issue()
         self.commits, self.pull_requests = None, None
         if self.github_repository:
+            from github.GithubException import UnknownObjectException, BadCredentialsException
             try:
-                self.commits = self.__load_commits()
-                self.pull_requests = self.__load_pull_requests()
-            except UnknownObjectException:
-                print("Invalid GitHub repository. Aborting...")
-                exit(-1)
-            except BadCredentialsException:
-                print("Invalid GitHub credentials. Aborting...")
-                exit(-1)
+                with instrumentation.span("report.load_github", issue_key):
+                    if self.github_fetcher is None:
+                        self.github_fetcher = GitHubFetcher(self.project,
+                                                            self.github_repository.replace("https://github.com/", ""),
+                                                            self.credentials, self.github_api)
+                    self.commits = self.__load_commits()
+                    self.pull_requests = self.__load_pull_requests()
+            except UnknownObjectException as error:
+                raise GitHubError("Invalid GitHub repository {}".format(self.github_repository)) from error
+            except BadCredentialsException as error:
+                raise GitHubError("Invalid GitHub credentials") from error
 
+        from pylatex import Document
         self.doc = Document(documentclass="report")
         self.__setup_packages()
         self.__setup_preamble()
@@ -54,43 +100,54 @@ class ReportGenerator:
         :param description: URL description
         :return: Raw string representing hyperref
         """
+        from pylatex.utils import escape_latex, NoEscape
         description = escape_latex(description)
         return NoEscape(r"\href{" + url + r"}{\underline{" + description + "}}")
 
     def __load_issue(self) -> Tuple[dict, List[dict]]:
         """
-        Load the issue specified by the field "issue_key" and a list of connected issues. For each issue, comments
+        Load the issue specified by the field "issue_key" and a list of connected issues: all issues at most "depth"
+        links away from it, found in the link graph of the project. For each issue, comments
         left by bots are filtered out and all '\r' symbols are replaced with '\n' to prevent LaTeX errors of
         empty newlines.
         :return: Tuple representing:
             1. Issue specified by the field "issue_key"
             2. List of connected issues
         """
-        parser = JiraParser(self.project)
-        issue = parser.load_issue(self.issue_key)
-        issue["comments"] = list(
-            filter(
-                lambda comment: not comment["author"] in self.bots,
-                issue["comments"]
-            )
-        )
-        for comment in issue["comments"]:
-            comment["body"] = comment["body"].replace('\r', '\n').replace('\xa0', '')
-
-        connected_issues_keys = [connected_issue["issue_key"] for connected_issue in issue["issuelinks"]]
-        connected_issues = [parser.load_issue(key) for key in connected_issues_keys]
-        for connected_issue in connected_issues:
-            connected_issue["comments"] = list(
-                filter(
-                    lambda comment: not comment["author"] in self.bots,
-                    connected_issue["comments"]
-                )
-            )
-            for comment in connected_issue["comments"]:
-                comment["body"] = comment["body"].replace('\r', '\n').replace('\xa0', '')
+        parser = self.parser
+        issue = self.__filter_comments(parser.load_issue(self.issue_key))
+
+        graph = self.link_graph or LinkGraph(self.project)
+        with graph.lock:
+            graph.update(issue)
+        # Connected issues are not loaded at all if they are left out of the report. The search takes the lock of the
+        # graph itself, so that the reports built at the same time do not wait while issues are fetched.
+        neighbourhood, cycles = ([], set()) if "other_issues" in self.exclude else \
+            graph.neighbourhood(self.issue_key, self.depth, parser.load_issues)
+        with graph.lock:
+            graph.save()
+        if cycles:
+            print("\t{}: {} links closing cycles are skipped".format(self.issue_key, len(cycles)))
+        self.distances = dict(neighbourhood)
+        connected_issues = [self.__filter_comments(connected_issue)
+                            for connected_issue in parser.load_issues([key for key, _ in neighbourhood])]
 
         return issue, connected_issues
 
+    def __filter_comments(self, issue: dict) -> dict:
+        """
+        Copy the issue without the comments left by bots, replacing all '\r' symbols with '\n' in the other comments
+        to prevent LaTeX errors of empty newlines. The loaded issue itself may be shared, so it is left unchanged.
+        :param issue: Issue represented as a dictionary
+        :return: Filtered copy of the issue
+        """
+        issue = dict(issue)
+        issue["comments"] = [
+            dict(comment, body=comment["body"].replace('\r', '\n').replace('\xa0', ''))
+            for comment in issue["comments"] if comment["author"] not in self.bots
+        ]
+        return issue
+
     def __load_commits(self) -> dict:
         """
         Load commits for the issue specified by the field "issue_key". Loaded commits represent
@@ -101,8 +158,7 @@ class ReportGenerator:
         issue, connected_issues = self.data
         issue_keys = [issue["issue_key"]] + [connected_issue["issue_key"] for connected_issue in connected_issues]
 
-        fetcher = GitHubFetcher(self.project, self.github_repository.replace("https://github.com/", ""),
-                                self.credentials)
+        fetcher = self.github_fetcher
         commits = dict()
         for key in issue_keys:
             commits[key] = fetcher.get_commits(key)
@@ -119,19 +175,53 @@ class ReportGenerator:
         issue, connected_issues = self.data
         issue_keys = [issue["issue_key"]] + [connected_issue["issue_key"] for connected_issue in connected_issues]
 
-        fetcher = GitHubFetcher(self.project, self.github_repository.replace("https://github.com/", ""),
-                                self.credentials)
+        fetcher = self.github_fetcher
         pull_requests = dict()
         for key in issue_keys:
             pull_requests[key] = fetcher.get_pull_requests(key)
         print("\t{}: successfully loaded pull requests".format(self.issue_key))
         return pull_requests
 
+    def __local_attachment(self, attachment: dict) -> Optional[str]:
+        """
+        Path to the local copy of the attachment relative to the directory of the reports, where LaTeX runs.
+        :param attachment: Attachment of a parsed issue
+        :return: Path to the local copy or None if the attachments are referred to by their URLs or not mirrored
+        """
+        if self.attachment_mirror is None:
+            return None
+        path = self.attachment_mirror.local_path(attachment["content"])
+        if path is None:
+            return None
+        return os.path.relpath(path, "Reports").replace(os.sep, "/")
+
+    def __overflow(self, issue_key: str, name: str) -> Callable[[str], str]:
+        """
+        Build the function referring to the whole of a text truncated by the render policy: a link to the issue in
+        Jira or to a text file inside Reports/Appendix, which is written when the text is rendered.
+        :param issue_key: Key of the issue of the text
+        :param name: Name of the text inside the issue, e.g. "description" or "comment-2"
+        :return: Function given the whole text, returning LaTeX code referring to it
+        """
+        def refer(text: str) -> str:
+            if self.render_policy.overflow == "link":
+                url = self.parser.jira_server.rstrip('/') + "/browse/" + issue_key
+                return self.__hyperlink(url, "Full text in Jira")
+            directory = os.path.join(APPENDIX_DIR, issue_key)
+            utils.create_dir_if_necessary(directory)
+            path = os.path.join(directory, name + ".txt")
+            with open(path, "w") as file:
+                file.write(text)
+            self.__appendices += 1
+            return self.__hyperlink("run:" + os.path.relpath(path, "Reports").replace(os.sep, "/"), "Full text")
+        return refer
+
     def __setup_packages(self) -> None:
         """
         Setup required LaTeX packages.
         :return: None
         """
+        from pylatex import Package
         packages = self.doc.packages
         packages.append(Package("a4wide"))
         packages.append(Package("listings"))
@@ -140,12 +230,16 @@ class ReportGenerator:
         packages.append(Package("tabularx"))
         packages.append(Package("hyperref"))
         packages.append(Package("spverbatim"))
+        if self.attachments == "embed":
+            packages.append(Package("graphicx"))
 
     def __setup_preamble(self) -> None:
         """
         Setup preamble of the LaTeX document.
         :return: None
         """
+        from pylatex import Command
+        from pylatex.utils import NoEscape
         preamble = self.doc.preamble
         issue = self.data[0]
         preamble.append(NoEscape(r"\UseRawInputEncoding"))
@@ -167,24 +261,27 @@ class ReportGenerator:
                                                    r"numberstyle = \tiny")))
         preamble.append(NoEscape(r"\definecolor{darkgreen}{rgb}{0,0.6,0}"))
 
-    def __add_comments(self, issue: dict) -> None:
+    def __add_comments(self, issue: dict, doc: "Container") -> None:
         """
         Add comments for the specified issue. Each comment has the author and the body.
         :param issue: Issue represented as dictionary
+        :param doc: Container to add the comments to
         :return: None
         """
-        doc = self.doc
+        from pylatex import Enumerate
+        from pylatex.utils import bold
         filtered_comments = [comment for comment in issue["comments"] if comment["author"] not in self.bots]
         if not filtered_comments:
             doc.append("No comments")
         else:
             with doc.create(Enumerate()) as enum:
-                for comment in filtered_comments:
-                    comment_body = utils.escape_with_listings(comment["body"])
-                    print("This is the comment after escaping", comment_body)
+                for index, comment in enumerate(filtered_comments, start=1):
+                    comment_body = utils.escape_with_listings(
+                        comment["body"], self.render_policy,
+                        self.__overflow(issue["issue_key"], "comment-{}".format(index)))
                     enum.add_item(bold(comment["author"] + ": ") + comment_body)
 
-    def __describe_issue(self, issue: dict, root_issue: bool = False) -> None:
+    def __describe_issue(self, issue: dict, root_issue: bool = False, chapter_title: str = None) -> str:
         """
         Describe the issue passed in the following form:
             1. Summary
@@ -195,20 +292,30 @@ class ReportGenerator:
             6. Pull requests
         :param issue: Issue represented as a dictionary
         :param root_issue: Whether the issue passed is the root (not a connected) issue of the document
-        :return: None
+        :param chapter_title: Title of the chapter. By default, the issue is named as the root or a connected issue
+        :return: LaTeX code of the chapter describing the issue
         """
-        doc = self.doc
-        chapter_title = ("Root issue " if root_issue else "Connected issue ") + issue["issue_key"]
+        from pylatex import Enumerate, Subsection
+        from pylatex.section import Chapter, Section
+        from pylatex.utils import escape_latex, NoEscape, bold
+        from genreport.latex_fragment import Fragment
+        doc = Fragment()
+        if chapter_title is None:
+            chapter_title = ("Root issue " if root_issue else "Connected issue ") + issue["issue_key"]
+            distance = self.distances.get(issue["issue_key"], 1)
+            if not root_issue and distance > 1:
+                chapter_title += " ({} links away)".format(distance)
         with doc.create(Chapter(chapter_title)):
             if "summary" not in self.exclude:
                 with doc.create(Section("Summary")):
-                    summary = utils.escape_with_listings(issue["summary"])
+                    summary = utils.escape_with_listings(issue["summary"], self.render_policy,
+                                                         self.__overflow(issue["issue_key"], "summary"))
                     doc.append(summary)
 
             if "description" not in self.exclude:
                 with doc.create(Section("Description")):
-                    description = utils.escape_with_listings(issue["description"])
-                    print("This is the description after esacping", description)
+                    description = utils.escape_with_listings(issue["description"], self.render_policy,
+                                                             self.__overflow(issue["issue_key"], "description"))
                     doc.append(description)
 
             if "attachments" not in self.exclude:
@@ -219,7 +326,16 @@ class ReportGenerator:
                     else:
                         with doc.create(Enumerate()) as enum:
                             for attachment in issue["attachments"]:
-                                enum.add_item(self.__hyperlink(attachment["content"], attachment["filename"]))
+                                local_path = self.__local_attachment(attachment)
+                                if local_path is None:
+                                    enum.add_item(self.__hyperlink(attachment["content"], attachment["filename"]))
+                                    continue
+                                enum.add_item(self.__hyperlink("run:" + local_path, attachment["filename"]))
+                                extension = os.path.splitext(local_path)[1]
+                                if self.attachments == "embed" and extension in EMBEDDED_IMAGE_EXTENSIONS:
+                                    enum.append(NoEscape(r"\\ \includegraphics[width=0.8\textwidth,"
+                                                         r"height=0.4\textheight,keepaspectratio]{" + local_path +
+                                                         "}"))
 
             # Each commit is described in the following way:
             # "Commit <short_SHA> by <author> (<date>): <commit_message>"
@@ -241,7 +357,7 @@ class ReportGenerator:
 
             if "comments" not in self.exclude:
                 with doc.create(Section("Comments")):
-                    self.__add_comments(issue)
+                    self.__add_comments(issue, doc)
 
             # Each pull request is described in the following way:
             # Title: <pr_title>
@@ -276,25 +392,96 @@ class ReportGenerator:
                                                 comment["date"],
                                                 escape_latex(comment["body"].replace('\r', '\n')))
                                             ))
+        return doc.dumps()
 
-    def generate_report(self) -> None:
+    def __add_chapter(self, issue: dict, root_issue: bool = False, chapter_title: str = None) -> None:
         """
-        Generate PDF report for the issue specified by the field "issue_key".
+        Add the chapter describing the issue to the document, taking it from the fragment cache if the issue was
+        already described with the same options. Chapters writing texts to Reports/Appendix are not cached, so that
+        those files are written by every report referring to them.
+        :param issue: Issue represented as a dictionary
+        :param root_issue: Whether the issue passed is the root (not a connected) issue of the document
+        :param chapter_title: Title of the chapter. By default, the issue is named as the root or a connected issue
         :return: None
         """
+        from pylatex.utils import NoEscape
+        cache = self.fragment_cache
+        if cache is None:
+            self.doc.append(NoEscape(self.__describe_issue(issue, root_issue, chapter_title)))
+            return
+        issue_key = issue["issue_key"]
+        key = cache.key(issue, self.parser.jira_server,
+                        self.commits.get(issue_key) if self.commits else None,
+                        self.pull_requests.get(issue_key) if self.pull_requests else None,
+                        sorted(self.exclude), sorted(self.bots), root_issue, self.distances.get(issue_key, 1),
+                        self.attachments, [self.__local_attachment(attachment) for attachment in issue["attachments"]],
+                        self.render_policy.key(), chapter_title)
+        fragment = cache.get(key)
+        if fragment is None:
+            instrumentation.count("report.fragment_cache_misses")
+            appendices = self.__appendices
+            fragment = self.__describe_issue(issue, root_issue, chapter_title)
+            if self.__appendices == appendices:
+                cache.put(key, fragment)
+        else:
+            instrumentation.count("report.fragment_cache_hits")
+        self.doc.append(NoEscape(fragment))
+
+    def build_document(self) -> "Document":
+        """
+        Add the title, the table of contents and the chapters of the issue specified by the field "issue_key" and of
+        its connected issues to the document, without compiling it.
+        :return: Document of the report
+        """
+        from pylatex.utils import NoEscape
         doc = self.doc
         root_issue, connected_issues = self.data
-        filename = root_issue["issue_key"]
         doc.append(NoEscape(r"\maketitle"))
         doc.append(NoEscape(r"\tableofcontents"))
 
-        self.__describe_issue(root_issue, root_issue=True)
+        with instrumentation.span("report.describe_issue", root_issue["issue_key"]):
+            self.__add_chapter(root_issue, root_issue=True)
 
         if "other_issues" not in self.exclude:
             for issue in connected_issues:
-                self.__describe_issue(issue)
+                with instrumentation.span("report.describe_issue", issue["issue_key"]):
+                    self.__add_chapter(issue)
+        return doc
+
+    def generate_report(self) -> None:
+        """
+        Generate PDF report for the issue specified by the field "issue_key".
+        :return: None
+        """
+        doc = self.build_document()
+        root_issue = self.data[0]
+        filename = root_issue["issue_key"]
 
         utils.create_dir_if_necessary("Reports")
-        doc.generate_pdf(os.path.join("Reports", filename), clean_tex=True, compiler='pdflatex')
+        instrumentation.count("report.pdflatex_invocations")
+        with instrumentation.span("report.compile", filename):
+            doc.generate_pdf(os.path.join("Reports", filename), clean_tex=True, compiler='pdflatex')
 
         print("{}: report is successfully created\n".format(root_issue["issue_key"]))
+
+    def generate_chapter_pdf(self, filepath: str, chapter_number: int) -> None:
+        """
+        Generate a PDF holding only the chapter of the issue specified by the field "issue_key", numbered as the
+        given chapter of a book. Its pages are numbered within the chapter ("<chapter>-<page>"), so that the chapters
+        of a book can be compiled apart from each other and merged (see genreport.book).
+        :param filepath: Path to the PDF without the extension, inside the directory of the reports so that links to
+        local files work
+        :param chapter_number: Number of the chapter in the book
+        :return: None
+        """
+        from pylatex.utils import NoEscape
+        doc = self.doc
+        issue = self.data[0]
+        doc.append(NoEscape(r"\renewcommand{\thepage}{\thechapter-\arabic{page}}"))
+        doc.append(NoEscape(r"\setcounter{chapter}{" + str(chapter_number - 1) + "}"))
+        with instrumentation.span("report.describe_issue", issue["issue_key"]):
+            self.__add_chapter(issue, root_issue=True, chapter_title=issue["issue_key"])
+
+        instrumentation.count("report.pdflatex_invocations")
+        with instrumentation.span("report.compile", issue["issue_key"]):
+            doc.generate_pdf(filepath, clean_tex=True, compiler='pdflatex')
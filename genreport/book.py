@@ -0,0 +1,137 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
+
+from pylatex import Document, Command
+from pylatex.utils import escape_latex, NoEscape
+
+import utils
+from utils import instrumentation
+
+if TYPE_CHECKING:
+    from genreport import ReportGenerator
+
+
+class BookGenerator:
+    def __init__(self, name: str, issue_keys: List[str], create_generator: Callable[[str], "ReportGenerator"],
+                 workers: int = 1, title: str = None):
+        """
+        Generator of a book: a single PDF covering many issues, one chapter per issue, e.g. for release reviews.
+        Every chapter is compiled by a pdflatex run of its own and up to "workers" chapters are loaded and compiled
+        at the same time, so that the time taken goes down with the number of cores. The compiled chapters are
+        merged with a table of contents and bookmarks (requires pypdf) into "Reports/<name>.pdf". Pages are numbered
+        within their chapters, e.g. 12-3, so that no chapter has to wait for the ones before it.
+        :param name: Name of the book
+        :param issue_keys: Keys of the issues in the order of their chapters
+        :param create_generator: Function creating the report generator of an issue
+        :param workers: Number of chapters loaded and compiled at the same time
+        :param title: Title of the book. By default, the name is used
+        """
+        self.name = name
+        self.issue_keys = issue_keys
+        self.create_generator = create_generator
+        self.workers = workers
+        self.title = title or name
+        self.lock = threading.Lock()
+        self.compiled = 0
+
+    def generate(self) -> List[Tuple[str, str]]:
+        """
+        Generate the book. Issues which fail to be loaded or compiled are left out of it.
+        :return: List of tuples of the key of each issue left out and the error
+        """
+        utils.create_dir_if_necessary("Reports")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            loaded = list(executor.map(self.__load, self.issue_keys))
+        failures = [(issue_key, error) for issue_key, _, error in loaded if error]
+        # Chapters are numbered once the issues which do not load are known, so that there are no gaps
+        chapters = [(number, generator, os.path.join("Reports", "{}.chapter-{}".format(self.name, number)))
+                    for number, generator in enumerate((generator for _, generator, error in loaded if not error),
+                                                       start=1)]
+        print("{}: compiling {} chapters".format(self.name, len(chapters)))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            errors = list(executor.map(lambda chapter: self.__compile(*chapter, len(chapters)), chapters))
+        failures += [(generator.issue_key, error) for (_, generator, _), error in zip(chapters, errors) if error]
+        chapters = [chapter for chapter, error in zip(chapters, errors) if not error]
+        if not chapters:
+            return failures
+
+        contents_path = os.path.join("Reports", "{}.contents".format(self.name))
+        with instrumentation.span("book.contents", self.name):
+            self.__contents(chapters).generate_pdf(contents_path, clean_tex=True, compiler='pdflatex')
+        with instrumentation.span("book.merge", self.name):
+            self.__merge(contents_path, chapters)
+        for path in [contents_path] + [path for _, _, path in chapters]:
+            os.remove(path + ".pdf")
+        print("{}: book of {} chapters is successfully created\n".format(self.name, len(chapters)))
+        return failures
+
+    def __load(self, issue_key: str) -> Tuple[str, Optional["ReportGenerator"], Optional[str]]:
+        try:
+            with instrumentation.span("book.load", issue_key):
+                return issue_key, self.create_generator(issue_key), None
+        except Exception as exception:
+            print("{}: failed to load ({}). Skipping...".format(issue_key, exception))
+            return issue_key, None, "".join(traceback.format_exception_only(type(exception), exception)).strip()
+
+    def __compile(self, number: int, generator: "ReportGenerator", path: str, chapters: int) -> Optional[str]:
+        try:
+            generator.generate_chapter_pdf(path, number)
+        except Exception as exception:
+            print("{}: failed to compile ({}). Skipping...".format(generator.issue_key, exception))
+            return "".join(traceback.format_exception_only(type(exception), exception)).strip()
+        with self.lock:
+            self.compiled += 1
+            print("{}: chapter {} compiled ({} of {})".format(generator.issue_key, number, self.compiled, chapters))
+        return None
+
+    def __contents(self, chapters: List[Tuple[int, "ReportGenerator", str]]) -> Document:
+        """
+        Build the title page and the table of contents of the book. Entries point to the first page of each
+        chapter, whose number is known in advance thanks to the numbering of pages within chapters.
+        """
+        doc = Document(documentclass="report")
+        doc.preamble.append(NoEscape(r"\UseRawInputEncoding"))
+        doc.preamble.append(Command("title", self.title))
+        doc.preamble.append(Command("author", ""))
+        doc.preamble.append(Command("date", NoEscape(r"\today")))
+        # Chapter numbers of large books do not fit into the default width
+        doc.preamble.append(NoEscape(r"\makeatletter\renewcommand*{\numberline}[1]{\hb@xt@3.5em{#1\hfil}}"
+                                     r"\makeatother"))
+        doc.append(NoEscape(r"\maketitle"))
+        doc.append(NoEscape(r"\pagenumbering{roman}"))
+        doc.append(NoEscape(r"\chapter*{Contents}"))
+        for number, generator, _ in chapters:
+            issue = generator.data[0]
+            doc.append(NoEscape(r"\contentsline{chapter}{\numberline{" + str(number) + "}" +
+                                escape_latex("{}: {}".format(issue["issue_key"], issue["summary"])) +
+                                "}{" + "{}-1".format(number) + "}"))
+        return doc
+
+    def __merge(self, contents_path: str, chapters: List[Tuple[int, "ReportGenerator", str]]) -> None:
+        """
+        Merge the table of contents and the chapters, keeping the bookmarks of each chapter and labelling the pages
+        the way they are numbered.
+        """
+        from pypdf import PdfReader, PdfWriter
+
+        writer = PdfWriter()
+        writer.append(contents_path + ".pdf", outline_item="Contents", import_outline=False)
+        writer.set_page_label(0, len(writer.pages) - 1, style="/r")
+        for number, generator, path in chapters:
+            start = len(writer.pages)
+            reader = PdfReader(path + ".pdf")
+            if reader.outline:
+                writer.append(reader, import_outline=True)
+            else:
+                writer.append(reader, outline_item="{} {}".format(number, generator.issue_key), import_outline=False)
+            writer.set_page_label(start, len(writer.pages) - 1, style="/D", prefix="{}-".format(number))
+        writer.page_mode = "/UseOutlines"
+
+        path = os.path.join("Reports", self.name + ".pdf")
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as file:
+            writer.write(file)
+        os.replace(temp_path, path)
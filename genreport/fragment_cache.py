@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+# Version of the rendering of issue chapters. It is part of the key of every fragment, so increasing it invalidates
+# fragments rendered by older code.
+FRAGMENT_VERSION = 2
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+class FragmentCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Cache of rendered LaTeX chapters of issues, stored one file per fragment inside the directory. The least
+        recently used fragments are evicted once the total size exceeds max_bytes; the modification time of a file
+        records when it was last used.
+        :param directory: Directory of the cache, e.g. "Projects/<project_name>/Fragments"
+        :param max_bytes: Maximum total size of the fragments in bytes
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.size = None
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        Build the key of a fragment from everything its content depends on: the issue itself, its commits and pull
+        requests, the Jira server, the options of the report and the title of the chapter.
+        :param parts: Objects serializable to JSON
+        :return: Key of the fragment
+        """
+        content = json.dumps([FRAGMENT_VERSION] + list(parts), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".tex")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.__path(key)
+        try:
+            with open(path, "r") as file:
+                fragment = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return fragment
+
+    def put(self, key: str, fragment: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.__path(key)
+        temp_path = "{}.{}-{}.tmp".format(path, os.getpid(), threading.get_ident())
+        with open(temp_path, "w") as file:
+            file.write(fragment)
+        os.replace(temp_path, path)
+        with self.lock:
+            if self.size is None:
+                self.size = self.__total_size()
+            else:
+                self.size += len(fragment.encode())
+            if self.size > self.max_bytes:
+                self.__evict()
+
+    def __total_size(self) -> int:
+        with os.scandir(self.directory) as entries:
+            return sum(entry.stat().st_size for entry in entries if entry.name.endswith(".tex"))
+
+    def __evict(self) -> None:
+        """
+        Remove the least recently used fragments until the cache takes at most 3/4 of its maximum size, so that
+        eviction does not run on every put once the cache is full.
+        """
+        with os.scandir(self.directory) as entries:
+            fragments = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries
+                               if entry.name.endswith(".tex"))
+        self.size = sum(size for _, size, _ in fragments)
+        for _, size, path in fragments:
+            if self.size <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
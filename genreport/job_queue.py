@@ -0,0 +1,184 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+STATUSES = ["pending", "running", "done", "failed"]
+
+
+class JobQueue:
+    def __init__(self, path: str, max_attempts: int = 3, backoff: float = 5.0, options: str = ""):
+        """
+        Queue of report jobs persisted in an SQLite database, so that a run which is interrupted, crashes or fails on
+        some issues can be started again and only does the remaining work. Every issue has one job recording its
+        status, the number of attempts, the last error, the options its report is generated with and when it was last
+        selected, so that a run can tell the jobs it selected from those of previous runs. A job failing with a
+        transient error is retried after backoff * 2 ** (attempts - 1) seconds, until max_attempts is reached.
+        Only jobs with the options of the queue are taken, so that jobs left pending by a run with other options are
+        not generated with the wrong ones.
+        Only one process is expected to use the queue at a time; its threads may share it.
+        :param path: Path to the database, e.g. "Projects/<project_name>/report_jobs.sqlite"
+        :param max_attempts: Maximum number of attempts of a job
+        :param backoff: Delay before the first retry of a job in seconds
+        :param options: Digest of the options the reports are generated with
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.options = options
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                                "issue_key TEXT PRIMARY KEY, "
+                                "issue_id INTEGER NOT NULL, "
+                                "status TEXT NOT NULL, "
+                                "attempts INTEGER NOT NULL DEFAULT 0, "
+                                "error TEXT, "
+                                "next_attempt REAL NOT NULL DEFAULT 0, "
+                                "seconds REAL, "
+                                "updated REAL NOT NULL, "
+                                "options TEXT NOT NULL DEFAULT '', "
+                                "selected REAL NOT NULL DEFAULT 0)")
+        columns = [column[1] for column in self.connection.execute("PRAGMA table_info(jobs)")]
+        # Databases created before the options were recorded get them empty, so that their reports are generated again
+        if "options" not in columns:
+            self.connection.execute("ALTER TABLE jobs ADD COLUMN options TEXT NOT NULL DEFAULT ''")
+        if "selected" not in columns:
+            self.connection.execute("ALTER TABLE jobs ADD COLUMN selected REAL NOT NULL DEFAULT 0")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, next_attempt, issue_id)")
+
+    def add(self, issue_keys: List[str], force: bool = False, report_exists: Callable[[str], bool] = None) -> int:
+        """
+        Enqueue the reports of the issues with the options of the queue. Jobs which failed before are given all their
+        attempts again. Reports which are already generated are skipped, unless force is set, they were generated
+        with other options or report_exists tells they are missing. Pending jobs of the issues take the options of the
+        queue. All the jobs of the issues are marked as selected now.
+        :param issue_keys: Keys of the issues
+        :param force: Whether to generate again the reports which are already generated
+        :param report_exists: Function telling whether the report of an issue exists. By default, reports are
+        assumed to exist
+        :return: Number of jobs left to do among the issues
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            done = set(issue_key for issue_key, options in self.__select(
+                "SELECT issue_key, options FROM jobs WHERE status = 'done' AND issue_key IN ({})", issue_keys)
+                       if force or options != self.options or (report_exists and not report_exists(issue_key)))
+            # Jobs still to do are counted before the new and requeued ones join them
+            remaining = self.connection.executemany(
+                "UPDATE jobs SET options = ?, updated = ? WHERE issue_key = ? AND status IN ('pending', 'running')",
+                [(self.options, now, issue_key) for issue_key in issue_keys]).rowcount
+            remaining += self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs (issue_key, issue_id, status, updated, options) "
+                "VALUES (?, ?, 'pending', ?, ?)",
+                [(issue_key, int(issue_key.rsplit('-', 1)[1]), now, self.options)
+                 for issue_key in issue_keys]).rowcount
+            remaining += self.connection.executemany(
+                "UPDATE jobs SET status = 'pending', attempts = 0, error = NULL, next_attempt = 0, updated = ?, "
+                "options = ? WHERE issue_key = ? AND (status = 'failed' OR status = 'done' AND ?)",
+                [(now, self.options, issue_key, issue_key in done) for issue_key in issue_keys]).rowcount
+            self.connection.executemany("UPDATE jobs SET selected = ? WHERE issue_key = ?",
+                                        [(now, issue_key) for issue_key in issue_keys])
+            self.connection.execute("COMMIT")
+        return remaining
+
+    def __select(self, query: str, issue_keys: List[str]) -> List[tuple]:
+        """
+        Run a query on the jobs of the issues, a chunk of keys at a time so that SQLite's limit of parameters is not
+        exceeded. The query has a placeholder for the list of parameters.
+        """
+        rows = []
+        for start in range(0, len(issue_keys), 500):
+            chunk = issue_keys[start:start + 500]
+            rows += self.connection.execute(query.format(", ".join("?" * len(chunk))), chunk).fetchall()
+        return rows
+
+    def recover(self) -> int:
+        """
+        Put back the jobs left running by a run which was interrupted or crashed.
+        :return: Number of recovered jobs
+        """
+        with self.lock:
+            return self.connection.execute("UPDATE jobs SET status = 'pending', next_attempt = 0, updated = ? "
+                                           "WHERE status = 'running'", (time.time(),)).rowcount
+
+    def claim(self) -> Optional[Tuple[str, int]]:
+        """
+        Take the pending job of the issue with the lowest ID whose retry delay is over.
+        :return: Tuple of the key of the issue and the number of the attempt, or None if no job is ready
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT issue_key, attempts FROM jobs "
+                                          "WHERE status = 'pending' AND options = ? AND next_attempt <= ? "
+                                          "ORDER BY issue_id LIMIT 1", (self.options, now)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? "
+                                    "WHERE issue_key = ?", (now, row[0]))
+            return row[0], row[1] + 1
+
+    def next_retry_delay(self) -> Optional[float]:
+        """
+        :return: Seconds until a pending job with the options of the queue is ready, 0 if one is ready now or None if
+        no such job is pending
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT MIN(next_attempt) FROM jobs WHERE status = 'pending' AND options = ?",
+                                          (self.options,)).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def complete(self, issue_key: str, seconds: float) -> None:
+        with self.lock:
+            self.connection.execute("UPDATE jobs SET status = 'done', error = NULL, seconds = ?, updated = ? "
+                                    "WHERE issue_key = ?", (seconds, time.time(), issue_key))
+
+    def fail(self, issue_key: str, error: str, retry: bool = True) -> bool:
+        """
+        Record a failed attempt of a job and schedule its retry, unless the error is permanent or the job ran out of
+        attempts.
+        :param issue_key: Key of the issue
+        :param error: Description of the error
+        :param retry: Whether the error is transient
+        :return: Whether the job is retried
+        """
+        now = time.time()
+        with self.lock:
+            attempts = self.connection.execute("SELECT attempts FROM jobs WHERE issue_key = ?",
+                                               (issue_key,)).fetchone()[0]
+            retry = retry and attempts < self.max_attempts
+            self.connection.execute("UPDATE jobs SET status = ?, error = ?, next_attempt = ?, updated = ? "
+                                    "WHERE issue_key = ?",
+                                    ("pending" if retry else "failed", error,
+                                     now + self.backoff * 2 ** (attempts - 1) if retry else 0, now, issue_key))
+        return retry
+
+    def status(self, issue_key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT status FROM jobs WHERE issue_key = ?", (issue_key,)).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def failures(self, selected_since: float = 0) -> List[Tuple[str, int, str]]:
+        """
+        :param selected_since: Time from which on the failed jobs were selected, e.g. the start of a run. By default,
+        all failed jobs are listed
+        :return: List of tuples of the key of the issue, the number of attempts and the last error of failed jobs
+        """
+        with self.lock:
+            return self.connection.execute("SELECT issue_key, attempts, error FROM jobs "
+                                           "WHERE status = 'failed' AND selected >= ? ORDER BY issue_id",
+                                           (selected_since,)).fetchall()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,9 @@
+from pylatex.base_classes import Container
+
+
+class Fragment(Container):
+    """
+    Container of LaTeX code rendered apart from the document, which is then appended to the document as is.
+    """
+    def dumps(self):
+        return self.dumps_content()
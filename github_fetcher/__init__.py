@@ -1,17 +1,23 @@
-from github import Github
-
 import os
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import utils
+from utils import instrumentation
 
 DATE_FORMAT = "%Y-%m-%d"
+GITHUB_API_URL = "https://api.github.com"
 
 
 class GitHubFetcher:
-    def __init__(self, project: str, repo_name: str, credentials: Tuple[str, str]):
+    # Commits and pull requests of each issue, filled by load_index
+    commits_index: Optional[Dict[str, List[dict]]] = None
+    pull_requests_index: Optional[Dict[str, List[dict]]] = None
+
+    def __init__(self, project: str, repo_name: str, credentials: Tuple[str, str], base_url: str = None):
+        from github import Github
+
         self.project = project
-        self.github = Github(credentials[0], credentials[1])
+        self.github = Github(credentials[0], credentials[1], base_url=base_url or GITHUB_API_URL)
         self.repo = self.github.get_repo(repo_name)
         self.savedir_commits = os.path.join("Projects", self.project, "Commits")
         self.savedir_pull_requests = os.path.join("Projects", self.project, "PullRequests")
@@ -34,6 +40,26 @@ class GitHubFetcher:
         path = os.path.join(directory, filename)
         utils.save_as_json(json_list, path)
 
+    def load_index(self) -> None:
+        """
+        Load all commits and pull requests once and index them by the issues they target, so that looking them up
+        for an issue no longer reads "all.json". Meant for long-running processes; the index is not refreshed when
+        the cached files change.
+        :return: None
+        """
+        commits_index = dict()
+        for commit in self.get_commits():
+            issue_key, separator, _ = commit["message"].partition(':')
+            if separator:
+                commits_index.setdefault(issue_key, []).append(commit)
+        pull_requests_index = dict()
+        for pr in self.get_pull_requests():
+            issue_keys = utils.extract_issues(pr["title"], self.project) | \
+                utils.extract_issues(pr["body"], self.project)
+            for issue_key in issue_keys:
+                pull_requests_index.setdefault(issue_key, []).append(pr)
+        self.commits_index, self.pull_requests_index = commits_index, pull_requests_index
+
     def get_commits(self, issue_key: str = None) -> List[dict]:
         """
         Get list of dictionaries representing commits for the desired issue. If issue_key is not specified, then
@@ -41,13 +67,21 @@ class GitHubFetcher:
         :param issue_key: Target issue key
         :return: List of dictionaries representing commits
         """
+        if issue_key and self.commits_index is not None:
+            return list(self.commits_index.get(issue_key, []))
         path = os.path.join(self.savedir_commits, "all.json")
+        prefix = (issue_key or "") + ':'
         if not os.path.isfile(path):
+            instrumentation.count("github.commits_cache_misses")
             commits = self.fetch_commits()
         else:
-            commits = utils.load_json(path)
+            instrumentation.count("github.commits_cache_hits")
+            with instrumentation.span("github.load_commits"):
+                commits = utils.load_json(path)
+                if not issue_key:
+                    return commits
+                return [commit for commit in commits if commit["message"].startswith(prefix)]
         if issue_key:
-            prefix = issue_key + ':'
             commits = list(
                 filter(
                     lambda commit: commit["message"].startswith(prefix),
@@ -75,15 +109,18 @@ class GitHubFetcher:
                 )
             )
         commits = []
-        for commit_raw in commits_raw:
-            commit = dict()
-            sha = commit_raw.sha
-            commit["sha"] = sha
-            commit["short_sha"] = sha[:7]
-            commit["author"] = commit_raw.commit.author.name
-            commit["date"] = commit_raw.commit.author.date.date().strftime(DATE_FORMAT)
-            commit["message"] = commit_raw.commit.message
-            commits.append(commit)
+        # Commits are fetched page by page while iterating over them
+        with instrumentation.span("github.fetch_commits"):
+            for commit_raw in commits_raw:
+                commit = dict()
+                sha = commit_raw.sha
+                commit["sha"] = sha
+                commit["short_sha"] = sha[:7]
+                commit["author"] = commit_raw.commit.author.name
+                commit["date"] = commit_raw.commit.author.date.date().strftime(DATE_FORMAT)
+                commit["message"] = commit_raw.commit.message
+                commits.append(commit)
+        instrumentation.count("github.commits_fetched", len(commits))
 
         if save:
             self.__save_commits(commits, issue_key)
@@ -105,21 +142,32 @@ class GitHubFetcher:
         :param issue_key: Target issue key
         :return: List of dictionaries representing pull requests
         """
+        if issue_key and self.pull_requests_index is not None:
+            return list(self.pull_requests_index.get(issue_key, []))
         path = os.path.join(self.savedir_pull_requests, "all.json")
         if not os.path.isfile(path):
+            instrumentation.count("github.pull_requests_cache_misses")
             pull_requests = self.fetch_pull_requests()
         else:
-            pull_requests = utils.load_json(path)
+            instrumentation.count("github.pull_requests_cache_hits")
+            with instrumentation.span("github.load_pull_requests"):
+                pull_requests = utils.load_json(path)
+                if not issue_key:
+                    return pull_requests
+                return [pr for pr in pull_requests if self.__targets_issue(pr, issue_key)]
         if issue_key:
             pull_requests = list(
                 filter(
-                    lambda pr: issue_key in utils.extract_issues(pr["title"], self.project) or
-                               issue_key in utils.extract_issues(pr["body"], self.project),
+                    lambda pr: self.__targets_issue(pr, issue_key),
                     pull_requests
                 )
             )
         return pull_requests
 
+    def __targets_issue(self, pr: dict, issue_key: str) -> bool:
+        return issue_key in utils.extract_issues(pr["title"], self.project) or \
+               issue_key in utils.extract_issues(pr["body"], self.project)
+
     def fetch_pull_requests(self, issue_key: str = None, save: bool = True) -> List[dict]:
         """
         Fetch and parse all pull requests for the target project, both closed and opened. If issue_key is specified,
@@ -151,14 +199,16 @@ class GitHubFetcher:
             # Now let's fetch comments
             pr["comments"] = []
             pr_comments = pr["comments"]
-            for comment in pr_raw.get_issue_comments():
-                comment_dict = dict()
-                comment_dict["author"] = comment.user.login
-                comment_dict["date"] = comment.created_at.strftime(DATE_FORMAT)
-                comment_dict["body"] = comment.body
-                pr_comments.append(comment_dict)
+            with instrumentation.span("github.fetch_pull_request_comments", str(pr_raw.number)):
+                for comment in pr_raw.get_issue_comments():
+                    comment_dict = dict()
+                    comment_dict["author"] = comment.user.login
+                    comment_dict["date"] = comment.created_at.strftime(DATE_FORMAT)
+                    comment_dict["body"] = comment.body
+                    pr_comments.append(comment_dict)
 
             pull_requests.append(pr)
+        instrumentation.count("github.pull_requests_fetched", len(pull_requests))
 
         if save:
             self.__save_pull_requests(pull_requests, issue_key)
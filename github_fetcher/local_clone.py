@@ -0,0 +1,69 @@
+import os
+import subprocess
+from typing import List
+
+import utils
+from utils import instrumentation
+from github_fetcher import GitHubFetcher, DATE_FORMAT
+
+# Separators of the fields and of the commits in the output of git log; neither can appear in a commit message
+FIELD_SEPARATOR = "\x1f"
+COMMIT_SEPARATOR = "\x1e"
+
+
+class LocalCloneFetcher(GitHubFetcher):
+    def __init__(self, project: str, clone_dir: str):
+        """
+        Fetcher reading commits from a local clone of the repository with git instead of the GitHub API, so that no
+        credentials nor requests are needed. A clone has no pull requests, so none are ever found.
+        :param project: Jira project
+        :param clone_dir: Path to the clone
+        """
+        if not os.path.isdir(clone_dir):
+            raise FileNotFoundError("The clone {} does not exist".format(clone_dir))
+        self.project = project
+        self.clone_dir = clone_dir
+        self.github, self.repo = None, None
+        self.savedir_commits = os.path.join("Projects", self.project, "Commits")
+        self.savedir_pull_requests = os.path.join("Projects", self.project, "PullRequests")
+        # Reading the log of a clone is cheap, so the cached commits are refreshed to follow the clone as it is pulled
+        self.fetch_commits()
+
+    def fetch_commits(self, issue_key: str = None, save: bool = True) -> List[dict]:
+        """
+        Read all commits of the current branch of the clone, in the same form as the commits fetched from GitHub.
+        If issue_key is specified, then only commits whose message starts with issue_key + ':' are retrieved.
+        :param issue_key: Target issue key
+        :param save: Whether to save commits to a file
+        :return: List of dictionaries representing commits
+        """
+        log_format = FIELD_SEPARATOR.join(["%H", "%an", "%ad", "%B"]) + COMMIT_SEPARATOR
+        with instrumentation.span("github.fetch_commits"):
+            output = subprocess.run(["git", "-C", self.clone_dir, "log", "--format=" + log_format,
+                                     "--date=format:" + DATE_FORMAT],
+                                    stdout=subprocess.PIPE, check=True).stdout.decode("utf-8", errors="replace")
+        commits = []
+        for entry in output.split(COMMIT_SEPARATOR):
+            entry = entry.lstrip("\n")
+            if not entry:
+                continue
+            sha, author, date, message = entry.split(FIELD_SEPARATOR, 3)
+            commits.append({
+                "sha": sha,
+                "short_sha": sha[:7],
+                "author": author,
+                "date": date,
+                "message": message.rstrip("\n")
+            })
+        instrumentation.count("github.commits_fetched", len(commits))
+
+        if issue_key:
+            prefix = issue_key + ":"
+            commits = [commit for commit in commits if commit["message"].startswith(prefix)]
+        if save:
+            utils.create_dir_if_necessary(self.savedir_commits)
+            utils.save_as_json(commits, os.path.join(self.savedir_commits, (issue_key or "all") + ".json"))
+        return commits
+
+    def fetch_pull_requests(self, issue_key: str = None, save: bool = True) -> List[dict]:
+        return []
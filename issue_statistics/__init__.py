@@ -0,0 +1,212 @@
+import datetime
+import os
+from array import array
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+import utils
+
+# Column names of the per-issue reference counts, in the order they are stored inside the counts matrix
+COLUMNS = ["total", "revisions", "mailing_lists", "pdf_documents", "archives", "other_issues", "other_urls",
+           "commits", "pull_requests"]
+BIN_BY = ["id", "date"]
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+class BinnedStatistics:
+    def __init__(self, labels: np.ndarray, counts: np.ndarray, bin_by: str, block_size: int):
+        """
+        Reference counts of issues summed up in bins.
+        :param labels: Array describing each bin. When binning by ID, the label is the last issue ID of the bin
+        (e.g. 100 means block 1-100, 400 means block 301-400). When binning by date, it is the first day of the bin
+        :param counts: Matrix with one row per bin and one column per reference type (see COLUMNS)
+        :param bin_by: Whether the issues were binned by "id" or by creation "date"
+        :param block_size: Size of each bin in issue IDs or in days
+        """
+        self.labels = labels
+        self.counts = counts
+        self.bin_by = bin_by
+        self.block_size = block_size
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.counts[:, COLUMNS.index(name)]
+
+    def rolling_mean(self, window: int) -> np.ndarray:
+        """
+        Compute the rolling mean of each column over the last window bins. The first window - 1 rows are NaN since
+        there are not enough bins to average over.
+        :param window: Number of bins to average over
+        :return: Matrix of the same shape as counts
+        """
+        result = np.full(self.counts.shape, np.nan)
+        if window < 1 or window > len(self):
+            return result
+        cumulative = np.cumsum(np.vstack([np.zeros((1, self.counts.shape[1])), self.counts]), axis=0)
+        result[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+        return result
+
+    def cumulative(self) -> np.ndarray:
+        """
+        Compute the cumulative number of references of each type up to and including each bin.
+        :return: Matrix of the same shape as counts
+        """
+        return np.cumsum(self.counts, axis=0)
+
+    def to_csv(self, path: str, window: int = 0) -> None:
+        """
+        Export the bins as a CSV document containing the counts and the cumulative series, and the rolling means if
+        window is specified.
+        :param path: Path to the CSV document
+        :param window: Number of bins to compute the rolling means over. If 0, rolling means are not exported
+        :return: None
+        """
+        header = ["block"] + COLUMNS + ["cumulative_" + column for column in COLUMNS]
+        matrices = [self.counts, self.cumulative()]
+        if window:
+            header += ["rolling_" + column for column in COLUMNS]
+            matrices.append(self.rolling_mean(window))
+        with open(path, "w") as file:
+            file.write(",".join(header) + "\n")
+            for label, row in zip(self.labels, np.hstack(matrices)):
+                file.write(",".join([str(label)] + ["{:g}".format(value) for value in row]) + "\n")
+
+
+class IssueStatistics:
+    def __init__(self, issue_ids: np.ndarray, created: np.ndarray, counts: np.ndarray):
+        """
+        Reference counts of each issue of a project, sorted by issue ID.
+        :param issue_ids: Array of issue IDs
+        :param created: Array of creation dates of the issues
+        :param counts: Matrix with one row per issue and one column per reference type (see COLUMNS)
+        """
+        order = np.argsort(issue_ids, kind="stable")
+        self.issue_ids = issue_ids[order]
+        self.created = created[order]
+        self.counts = counts[order]
+
+    def __len__(self) -> int:
+        return len(self.issue_ids)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, str, int, int, int, int, int, int, int, int, int]]) \
+            -> "IssueStatistics":
+        """
+        Build the statistics from an iterable of rows without materializing them. Rows are packed into compact
+        typed buffers as they arrive, so only the numbers themselves are kept in memory.
+        :param rows: Iterable of tuples describing each issue: issue ID, date of creation (ISO 8601) and the number
+        of references of each type in the order defined by COLUMNS
+        :return: Statistics of the issues
+        """
+        issue_ids, created, counts = array('q'), array('q'), array('q')
+        for row in rows:
+            issue_ids.append(row[0])
+            created.append(datetime.date.fromisoformat(row[1][:10]).toordinal() - EPOCH)
+            counts.extend(row[2:])
+        return cls(np.frombuffer(issue_ids, dtype=np.int64),
+                   np.frombuffer(created, dtype=np.int64).astype("datetime64[D]"),
+                   np.frombuffer(counts, dtype=np.int64).reshape(-1, len(COLUMNS)))
+
+    def bin(self, block_size: int = 100, bin_by: str = "id") -> BinnedStatistics:
+        """
+        Sum up the reference counts in bins of block_size issue IDs or block_size days. Bins between the first and
+        the last non-empty ones are kept even if they contain no issues, so that the series stay evenly spaced.
+        :param block_size: Size of each bin in issue IDs or in days
+        :param bin_by: Whether to bin the issues by "id" or by creation "date"
+        :return: Binned statistics
+        """
+        if bin_by not in BIN_BY:
+            raise ValueError("Issues can be binned by one of: {}".format(", ".join(BIN_BY)))
+        if block_size < 1:
+            raise ValueError("Block size should be a positive number")
+        if not len(self):
+            return BinnedStatistics(np.empty(0, dtype=np.int64), np.empty((0, len(COLUMNS)), dtype=np.int64),
+                                    bin_by, block_size)
+
+        if bin_by == "id":
+            bins = (self.issue_ids - 1) // block_size
+        else:
+            days = self.created.astype(np.int64)
+            bins = (days - days.min()) // block_size
+        first_bin = bins.min()
+        bins = bins - first_bin
+        bins_number = int(bins.max()) + 1
+
+        counts = np.empty((bins_number, len(COLUMNS)), dtype=np.int64)
+        for column in range(len(COLUMNS)):
+            counts[:, column] = np.bincount(bins, weights=self.counts[:, column], minlength=bins_number)
+
+        if bin_by == "id":
+            labels = (np.arange(bins_number) + first_bin + 1) * block_size
+        else:
+            labels = self.created.min() + np.arange(bins_number) * block_size
+        return BinnedStatistics(labels, counts, bin_by, block_size)
+
+    def to_csv(self, path: str) -> None:
+        """
+        Export the reference counts of each issue as a CSV document.
+        :param path: Path to the CSV document
+        :return: None
+        """
+        with open(path, "w") as file:
+            file.write(",".join(["issue_id", "created"] + COLUMNS) + "\n")
+            for issue_id, created, row in zip(self.issue_ids, self.created, self.counts):
+                file.write(",".join([str(issue_id), str(created)] + [str(value) for value in row]) + "\n")
+
+    def to_npz(self, path: str, binned: List[BinnedStatistics] = None, window: int = 0) -> None:
+        """
+        Export the reference counts of each issue and, optionally, binned statistics in NumPy format, so that they
+        can be loaded with numpy.load without re-running the analyzer.
+        :param path: Path to the NPZ archive
+        :param binned: List of binned statistics to store alongside, each prefixed with "<bin_by>_"
+        :param window: Number of bins to compute the rolling means over. If 0, rolling means are not exported
+        :return: None
+        """
+        arrays = {
+            "columns": np.array(COLUMNS),
+            "issue_ids": self.issue_ids,
+            "created": self.created,
+            "counts": self.counts
+        }
+        for statistics in binned or []:
+            prefix = statistics.bin_by + "_"
+            arrays[prefix + "labels"] = statistics.labels
+            arrays[prefix + "counts"] = statistics.counts
+            arrays[prefix + "cumulative"] = statistics.cumulative()
+            if window:
+                arrays[prefix + "rolling"] = statistics.rolling_mean(window)
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load_npz(cls, path: str) -> "IssueStatistics":
+        """
+        Load the reference counts of each issue previously exported with to_npz.
+        :param path: Path to the NPZ archive
+        :return: Statistics of the issues
+        """
+        with np.load(path) as data:
+            return cls(data["issue_ids"], data["created"], data["counts"])
+
+
+def export(project: str, statistics: IssueStatistics, binned: BinnedStatistics, export_format: str,
+           window: int = 0) -> str:
+    """
+    Export the statistics inside Projects/<project>/Statistics in the desired format.
+    :param project: Project name
+    :param statistics: Reference counts of each issue
+    :param binned: Binned statistics
+    :param export_format: Either "csv" or "npz"
+    :param window: Number of bins to compute the rolling means over. If 0, rolling means are not exported
+    :return: Directory where the statistics were exported
+    """
+    directory = os.path.join("Projects", project, "Statistics")
+    utils.create_dir_if_necessary(directory)
+    if export_format == "csv":
+        statistics.to_csv(os.path.join(directory, "issues.csv"))
+        binned.to_csv(os.path.join(directory, "blocks_by_{}.csv".format(binned.bin_by)), window)
+    else:
+        statistics.to_npz(os.path.join(directory, "statistics.npz"), [binned], window)
+    return directory
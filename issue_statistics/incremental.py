@@ -0,0 +1,224 @@
+import datetime
+import hashlib
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+import utils
+from . import BIN_BY, COLUMNS, EPOCH, BinnedStatistics, IssueStatistics
+
+# Bumped whenever the way references are counted changes, so that every issue is analyzed again
+STATE_VERSION = 1
+
+# Issue ID, date of creation (ISO 8601) and the number of references of each type in the order defined by COLUMNS
+CountsRow = Tuple[int, str, int, int, int, int, int, int, int, int, int]
+
+
+class AnalysisState:
+    __COUNT_COLUMNS = ", ".join("c{}".format(index) for index in range(len(COLUMNS)))
+
+    def __init__(self, project: str):
+        """
+        Reference counts of the analyzed issues of a project and their sums per block, stored in
+        "Projects/<project_name>/analysis_state.sqlite", so that a run only analyzes the issues which changed since
+        the previous one. An issue is considered changed when the modification time of its file differs and so does
+        the SHA-1 of its content. The sums of the blocks the changed issues fall into are updated in place.
+        Blocks by ID are kept for each block size used so far; blocks by date are kept per day and combined into
+        blocks of the size requested, since they start with the day of the first issue.
+        :param project: Jira project
+        """
+        self.project = project
+        self.issues_dir = os.path.join("Projects", project, "Issues")
+        self.path = os.path.join("Projects", project, "analysis_state.sqlite")
+        utils.create_dir_if_necessary(os.path.dirname(self.path))
+        self.connection = sqlite3.connect(self.path)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != STATE_VERSION:
+            self.connection.executescript("DROP TABLE IF EXISTS issues; DROP TABLE IF EXISTS blocks; "
+                                          "DROP TABLE IF EXISTS layouts; "
+                                          "PRAGMA user_version = {};".format(STATE_VERSION))
+        counts = ", ".join("c{} INTEGER NOT NULL".format(index) for index in range(len(COLUMNS)))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS issues (issue_key TEXT PRIMARY KEY, "
+                                "issue_id INTEGER NOT NULL, modified REAL NOT NULL, digest TEXT NOT NULL, "
+                                "created INTEGER NOT NULL, {})".format(counts))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blocks (bin_by TEXT, block_size INTEGER, bin INTEGER, "
+                                "issues INTEGER NOT NULL, {}, PRIMARY KEY (bin_by, block_size, bin))".format(counts))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS layouts (bin_by TEXT, block_size INTEGER, "
+                                "PRIMARY KEY (bin_by, block_size))")
+        self.connection.commit()
+        self.__layouts = self.connection.execute("SELECT bin_by, block_size FROM layouts").fetchall()
+        self.__pending: Dict[str, Tuple[float, str]] = dict()
+
+    def changed_issues(self, issue_keys: List[str] = None) -> Iterator[dict]:
+        """
+        Load the parsed issues which changed since they were analyzed last. Issues whose file was only touched get
+        their modification time updated without being loaded.
+        :param issue_keys: Keys of the issues to check. By default, all parsed issues are checked
+        :return: Generator of the changed issues represented as dictionaries
+        """
+        modified = dict(self.connection.execute("SELECT issue_key, modified FROM issues"))
+        for issue_key, path, entry_modified in self.__issue_files(issue_keys):
+            if modified.get(issue_key) == entry_modified:
+                continue
+            with open(path, "rb") as file:
+                data = file.read()
+            digest = hashlib.sha1(data).hexdigest()
+            row = self.connection.execute("SELECT digest FROM issues WHERE issue_key = ?", (issue_key,)).fetchone()
+            if row is not None and row[0] == digest:
+                self.connection.execute("UPDATE issues SET modified = ? WHERE issue_key = ?",
+                                        (entry_modified, issue_key))
+                continue
+            self.__pending[issue_key] = (entry_modified, digest)
+            yield utils.codec.decode(data)
+
+    def update(self, issue_key: str, row: CountsRow) -> None:
+        """
+        Record the reference counts of a changed issue, replacing its previous ones in the sums of the blocks.
+        :param issue_key: Key of the issue, previously produced by changed_issues()
+        :param row: Reference counts of the issue
+        :return: None
+        """
+        modified, digest = self.__pending.pop(issue_key)
+        self.__remove(issue_key)
+        issue_id, counts = row[0], list(row[2:])
+        created = datetime.date.fromisoformat(row[1][:10]).toordinal() - EPOCH
+        self.connection.execute("INSERT INTO issues (issue_key, issue_id, modified, digest, created, {}) "
+                                "VALUES (?, ?, ?, ?, ?, {})".format(self.__COUNT_COLUMNS,
+                                                                    ", ".join("?" * len(counts))),
+                                [issue_key, issue_id, modified, digest, created] + counts)
+        self.__add_to_blocks(issue_id, created, counts, 1)
+
+    def remove_deleted(self, issue_keys: List[str] = None) -> List[str]:
+        """
+        Forget the issues whose files were deleted since they were analyzed.
+        :param issue_keys: Keys of the issues to check. By default, all analyzed issues are checked
+        :return: Keys of the forgotten issues
+        """
+        existing = set(issue_key for issue_key, _, _ in self.__issue_files(issue_keys))
+        if issue_keys is None:
+            analyzed = [issue_key for issue_key, in self.connection.execute("SELECT issue_key FROM issues")]
+        else:
+            analyzed = [issue_key for issue_key in issue_keys
+                        if self.connection.execute("SELECT 1 FROM issues WHERE issue_key = ?",
+                                                   (issue_key,)).fetchone()]
+        deleted = [issue_key for issue_key in analyzed if issue_key not in existing]
+        for issue_key in deleted:
+            self.__remove(issue_key)
+        return deleted
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def statistics(self, issue_keys: List[str] = None) -> IssueStatistics:
+        """
+        :param issue_keys: Keys of the issues to include. By default, all analyzed issues are included
+        :return: Reference counts of each analyzed issue
+        """
+        query = "SELECT issue_id, created, {} FROM issues".format(self.__COUNT_COLUMNS)
+        if issue_keys is None:
+            rows = self.connection.execute(query).fetchall()
+        else:
+            rows = [row for issue_key in issue_keys
+                    for row in self.connection.execute(query + " WHERE issue_key = ?", (issue_key,))]
+        matrix = np.array(rows, dtype=np.int64).reshape(-1, len(COLUMNS) + 2)
+        return IssueStatistics(matrix[:, 0], matrix[:, 1].astype("datetime64[D]"), matrix[:, 2:])
+
+    def binned(self, block_size: int = 100, bin_by: str = "id") -> BinnedStatistics:
+        """
+        Read the sums of the blocks of all analyzed issues, the same as statistics().bin(block_size, bin_by) but
+        without going through every issue. Blocks of a size which was not used before are computed once from the
+        reference counts of the issues and kept up to date from then on.
+        :param block_size: Size of each bin in issue IDs or in days
+        :param bin_by: Whether to bin the issues by "id" or by creation "date"
+        :return: Binned statistics
+        """
+        if bin_by not in BIN_BY:
+            raise ValueError("Issues can be binned by one of: {}".format(", ".join(BIN_BY)))
+        if block_size < 1:
+            raise ValueError("Block size should be a positive number")
+        layout = (bin_by, block_size if bin_by == "id" else 1)
+        if layout not in self.__layouts:
+            self.__build_blocks(*layout)
+        rows = self.connection.execute("SELECT bin, {} FROM blocks WHERE bin_by = ? AND block_size = ? "
+                                       "ORDER BY bin".format(self.__COUNT_COLUMNS), layout).fetchall()
+        if not rows:
+            return BinnedStatistics(np.empty(0, dtype=np.int64), np.empty((0, len(COLUMNS)), dtype=np.int64),
+                                    bin_by, block_size)
+
+        matrix = np.array(rows, dtype=np.int64)
+        first_bin = matrix[0, 0]
+        if bin_by == "date":
+            # Days are combined into blocks starting with the day of the first issue
+            matrix[:, 0] = first_bin + (matrix[:, 0] - first_bin) // block_size
+        bins = matrix[:, 0] - first_bin
+        bins_number = int(bins[-1]) + 1
+        counts = np.empty((bins_number, len(COLUMNS)), dtype=np.int64)
+        for column in range(len(COLUMNS)):
+            counts[:, column] = np.bincount(bins, weights=matrix[:, column + 1], minlength=bins_number)
+
+        if bin_by == "id":
+            labels = (np.arange(bins_number) + first_bin + 1) * block_size
+        else:
+            labels = np.datetime64(int(first_bin), "D") + np.arange(bins_number) * block_size
+        return BinnedStatistics(labels, counts, bin_by, block_size)
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
+
+    def __issue_files(self, issue_keys: List[str] = None) -> Iterable[Tuple[str, str, float]]:
+        """
+        :return: Generator of tuples of the key, the path and the modification time of the files of parsed issues.
+        Issues without a file, e.g. deleted ones, are left out
+        """
+        if not os.path.isdir(self.issues_dir):
+            return
+        if issue_keys is not None:
+            for issue_key in issue_keys:
+                path = os.path.join(self.issues_dir, issue_key + ".json")
+                try:
+                    modified = os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+                yield issue_key, path, modified
+            return
+        with os.scandir(self.issues_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    yield entry.name[:-len(".json")], entry.path, entry.stat().st_mtime
+
+    def __remove(self, issue_key: str) -> None:
+        row = self.connection.execute("SELECT issue_id, created, {} FROM issues WHERE issue_key = ?"
+                                      .format(self.__COUNT_COLUMNS), (issue_key,)).fetchone()
+        if row is None:
+            return
+        self.connection.execute("DELETE FROM issues WHERE issue_key = ?", (issue_key,))
+        self.__add_to_blocks(row[0], row[1], [-count for count in row[2:]], -1)
+
+    def __add_to_blocks(self, issue_id: int, created: int, counts: List[int], issues: int) -> None:
+        """
+        Add the reference counts of an issue to the block it falls into in every layout, or subtract them when
+        issues is -1. Blocks left without issues are deleted.
+        """
+        sums = ", ".join("c{0} = c{0} + ?".format(index) for index in range(len(COLUMNS)))
+        for bin_by, block_size in self.__layouts:
+            block = (issue_id - 1) // block_size if bin_by == "id" else created
+            key = (bin_by, block_size, block)
+            self.connection.execute("INSERT OR IGNORE INTO blocks (bin_by, block_size, bin, issues, {}) "
+                                    "VALUES (?, ?, ?, 0, {})".format(self.__COUNT_COLUMNS,
+                                                                     ", ".join("0" * len(COLUMNS))), key)
+            self.connection.execute("UPDATE blocks SET issues = issues + ?, {} "
+                                    "WHERE bin_by = ? AND block_size = ? AND bin = ?".format(sums),
+                                    [issues] + counts + list(key))
+            self.connection.execute("DELETE FROM blocks WHERE bin_by = ? AND block_size = ? AND bin = ? "
+                                    "AND issues = 0", key)
+
+    def __build_blocks(self, bin_by: str, block_size: int) -> None:
+        block = "(issue_id - 1) / {}".format(block_size) if bin_by == "id" else "created"
+        sums = ", ".join("SUM(c{})".format(index) for index in range(len(COLUMNS)))
+        self.connection.execute("INSERT INTO blocks (bin_by, block_size, bin, issues, {}) "
+                                "SELECT ?, ?, {}, COUNT(*), {} FROM issues GROUP BY 3"
+                                .format(self.__COUNT_COLUMNS, block, sums), (bin_by, block_size))
+        self.connection.execute("INSERT INTO layouts (bin_by, block_size) VALUES (?, ?)", (bin_by, block_size))
+        self.__layouts.append((bin_by, block_size))
@@ -0,0 +1,155 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import utils
+from . import BinnedStatistics
+
+# Index of the column inside the binned statistics and the title of the plot
+PLOT_TYPES = [
+    (0, "Total references"),
+    (1, "Revisions"),
+    (2, "Mailing Lists"),
+    (3, "PDF documents"),
+    (4, "Archives"),
+    (5, "Other issues"),
+    (6, "Other URLs"),
+    (7, "Commits"),
+    (8, "Pull requests")
+]
+RENDER_MODES = ["serial", "parallel", "single"]
+OVERVIEW_TITLE = "Overview"
+DIGESTS_FILENAME = "digests.json"
+
+# Everything required to draw a single plot: title, label of the X axis, X values, Y values, rolling means
+PlotData = Tuple[str, str, np.ndarray, np.ndarray, np.ndarray]
+
+
+def __draw(axes, project: str, data: PlotData, long_title: bool = True) -> None:
+    """
+    Draw a plot on the axes provided. The rolling mean, if any, is drawn as a dashed line.
+    :param axes: Matplotlib axes to draw on
+    :param project: Project name
+    :param data: Data describing the plot
+    :param long_title: Whether to describe the plot in its title or just name the type of references
+    :return: None
+    """
+    title, xlabel, x, y, rolling = data
+    axes.plot(x, y)
+    if not np.isnan(rolling).all():
+        axes.plot(x, rolling, linestyle="--")
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel("Frequency of {}".format(title))
+    if long_title:
+        axes.set_title("Changes in frequency of {} through the evolution of the project {}".format(title, project))
+    else:
+        axes.set_title(title)
+
+
+def render_plot(project: str, path: str, data: PlotData) -> str:
+    """
+    Render a single plot into a PNG file. Figures are built with the object-oriented API on the Agg canvas, so
+    neither pyplot nor a display is involved and the function is safe to run in worker processes.
+    :param project: Project name
+    :param path: Path to the PNG file
+    :param data: Data describing the plot
+    :return: Path to the PNG file
+    """
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    __draw(figure.add_subplot(), project, data)
+    figure.savefig(path, bbox_inches='tight')
+    return path
+
+
+def render_overview(project: str, path: str, plots: List[PlotData]) -> str:
+    """
+    Render all plots as panels of a single figure.
+    :param project: Project name
+    :param path: Path to the PNG file
+    :param plots: List of data describing each plot
+    :return: Path to the PNG file
+    """
+    columns = 3
+    rows = (len(plots) + columns - 1) // columns
+    figure = Figure(figsize=(6 * columns, 4 * rows))
+    FigureCanvasAgg(figure)
+    for index, data in enumerate(plots, start=1):
+        __draw(figure.add_subplot(rows, columns, index), project, data, long_title=False)
+    figure.suptitle("Changes in frequency of references through the evolution of the project {}".format(project))
+    figure.tight_layout()
+    figure.savefig(path, bbox_inches='tight')
+    return path
+
+
+def __digest(project: str, plots: List[PlotData]) -> str:
+    """
+    Compute a digest of everything that affects the look of a plot.
+    :param project: Project name
+    :param plots: List of data describing the plots drawn on the same figure
+    :return: Hexadecimal digest
+    """
+    digest = hashlib.sha1(project.encode())
+    for title, xlabel, x, y, rolling in plots:
+        digest.update(title.encode())
+        digest.update(xlabel.encode())
+        for values in (x, y, rolling):
+            digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def make_plots(project: str, statistics: BinnedStatistics, window: int, mode: str = "serial",
+               workers: Optional[int] = None) -> List[str]:
+    """
+    Make plots for the statistics provided inside Projects/<project>/Plots. Plots whose data did not change since the
+    previous run are not rendered again.
+    :param project: Project name
+    :param statistics: Binned statistics
+    :param window: Number of blocks to compute the rolling means over
+    :param mode: "serial" renders plots one after another, "parallel" renders them in worker processes and "single"
+    renders all of them as panels of a single figure
+    :param workers: Maximum number of worker processes in the "parallel" mode. By default, the number of CPUs is used
+    :return: List of paths to the rendered plots
+    """
+    if mode not in RENDER_MODES:
+        raise ValueError("Plots can be rendered in one of the modes: {}".format(", ".join(RENDER_MODES)))
+    plots_dir = os.path.join("Projects", project, "Plots")
+    utils.create_dir_if_necessary(plots_dir)
+    digests_path = os.path.join(plots_dir, DIGESTS_FILENAME)
+    digests = utils.load_json(digests_path) if os.path.isfile(digests_path) else {}
+
+    rolling = statistics.rolling_mean(window)
+    xlabel = "Issue IDs" if statistics.bin_by == "id" else "Date of creation"
+    plots = [(title, xlabel, statistics.labels, statistics.counts[:, index], rolling[:, index])
+             for index, title in PLOT_TYPES]
+
+    if mode == "single":
+        figures = [(OVERVIEW_TITLE, plots)]
+    else:
+        figures = [(data[0], [data]) for data in plots]
+
+    outdated = []
+    for title, figure_plots in figures:
+        filename = title + ".png"
+        digest = __digest(project, figure_plots)
+        if digests.get(filename) != digest or not os.path.isfile(os.path.join(plots_dir, filename)):
+            outdated.append((os.path.join(plots_dir, filename), figure_plots))
+            digests[filename] = digest
+
+    if mode == "single":
+        rendered = [render_overview(project, path, figure_plots) for path, figure_plots in outdated]
+    elif mode == "parallel" and len(outdated) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(render_plot, [project] * len(outdated),
+                                         [path for path, _ in outdated],
+                                         [figure_plots[0] for _, figure_plots in outdated]))
+    else:
+        rendered = [render_plot(project, path, figure_plots[0]) for path, figure_plots in outdated]
+
+    utils.save_as_json(digests, digests_path)
+    return rendered
@@ -1,17 +1,114 @@
 import os
+import queue
+import threading
 import traceback
-from jira.client import JIRA
-from typing import List, Tuple, Optional
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Set, Tuple, Optional, TYPE_CHECKING
 import utils
+from utils import instrumentation
+from jira_parser.fetch_manifest import FetchManifest
 
-from github_fetcher import GitHubFetcher
+if TYPE_CHECKING:
+    from jira_parser.async_fetch import AsyncJiraFetcher
 
 APACHE_JIRA_SERVER = "https://issues.apache.org/jira/"
+FETCH_ENGINES = ["sync", "async"]
+# Version of the slim raw issues (see slim_issue_raw). It is increased whenever the parser starts to use fields that
+# older slim issues do not keep, so that those are fetched again.
+SLIM_RAW_SCHEMA = 1
+# Number of fetched pages the async engine may get ahead of their consumer
+FETCH_QUEUE_PAGES = 4
+# Number of issue IDs whose existence is resolved at once, and page size of searches for keys
+KEY_BLOCK_SIZE = 1000
+
+
+class _FetchCancelled(Exception):
+    pass
+
+
+def slim_issue_raw(issue: dict) -> dict:
+    """
+    Keep only the parts of a raw issue that are used to parse it, in the same structure as the full raw issue. Slim
+    issues have the key "_schema" set to the version of the slim format (SLIM_RAW_SCHEMA).
+    :param issue: Raw issue as returned by Jira, or an already slim one
+    :return: Slim raw issue
+    """
+    fields = issue["fields"]
+    creator = fields["creator"]
+    return {
+        "_schema": SLIM_RAW_SCHEMA,
+        "key": issue["key"],
+        "fields": {
+            "project": {
+                "key": fields["project"]["key"],
+                "name": fields["project"]["name"]
+            },
+            "creator": {"name": creator["name"]} if creator else None,
+            "created": fields["created"],
+            "updated": fields["updated"],
+            "status": {"name": fields["status"]["name"]},
+            "summary": fields["summary"],
+            "description": fields["description"],
+            "attachment": [
+                {
+                    "filename": attachment["filename"],
+                    "content": attachment["content"]
+                }
+                for attachment in fields.get("attachment", None) or []
+            ],
+            "issuelinks": [
+                dict(
+                    {"type": {"name": link["type"]["name"]}},
+                    **({"inwardIssue": {"key": link["inwardIssue"]["key"]}} if "inwardIssue" in link else
+                       {"outwardIssue": {"key": link["outwardIssue"]["key"]}})
+                )
+                for link in fields["issuelinks"]
+            ],
+            "comment": {
+                "comments": [
+                    {
+                        "author": {"name": comment["author"]["name"]},
+                        "created": comment["created"],
+                        "updated": comment["updated"],
+                        "body": comment["body"]
+                    }
+                    for comment in fields["comment"]["comments"]
+                ]
+            }
+        },
+        "remotelinks": [
+            {
+                "object": {
+                    "title": link["object"]["title"],
+                    "url": link["object"]["url"]
+                }
+            }
+            for link in issue["remotelinks"]
+        ]
+    }
+
+
+def is_outdated_raw(issue: dict) -> bool:
+    """
+    Whether a raw issue is a slim one that lacks fields the parser needs now.
+    :param issue: Raw issue
+    :return: True if the issue has to be fetched again
+    """
+    return issue.get("_schema", SLIM_RAW_SCHEMA) < SLIM_RAW_SCHEMA
 
 
 class JiraParser:
-    def __init__(self, jira_project: str, github_repository: str = None, github_credentials: Tuple[str, str] = None):
-        self.jira = JIRA(server=APACHE_JIRA_SERVER)
+    def __init__(self, jira_project: str, github_repository: str = None, github_credentials: Tuple[str, str] = None,
+                 jira_server: str = None, github_api: str = None, slim_raw: bool = False, local_clone: str = None,
+                 issue_cache_size: int = 0):
+        self.__jira = None
+        # Parsed issues kept in memory by load_issue and load_issues, least recently used first. Each is stored with
+        # the modification time of its file, so that issues parsed again in the meantime are reloaded.
+        self.issue_cache_size = issue_cache_size
+        self.__issue_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self.__issue_cache_lock = threading.Lock()
+        self.slim_raw = slim_raw
+        self.jira_server = jira_server or APACHE_JIRA_SERVER
         self.project = jira_project
         self.project_dir = os.path.join("Projects", self.project)
         self.issues_raw_dir = os.path.join(self.project_dir, "Issues_raw")
@@ -28,50 +125,228 @@ class JiraParser:
                       "project," \
                       "creator"
         self.github = None
-        if github_repository and github_credentials:
+        if local_clone:
+            from github_fetcher.local_clone import LocalCloneFetcher
+            self.github = LocalCloneFetcher(jira_project, local_clone)
+        elif github_repository and github_credentials:
+            from github_fetcher import GitHubFetcher
             self.github = GitHubFetcher(jira_project, github_repository.replace("https://github.com/", ""),
-                                        github_credentials)
+                                        github_credentials, github_api)
+
+    @property
+    def jira(self):
+        """
+        Jira client, created on first use since neither importing the client nor connecting to the server is needed
+        to work with cached issues.
+        :return: Jira client
+        """
+        if self.__jira is None:
+            from jira.client import JIRA
+            self.__jira = JIRA(server=self.jira_server)
+            instrumentation.instrument_session(self.__jira._session, "jira")
+        return self.__jira
 
-    def fetch_issues_raw(self, block_index: int = 0, save: bool = True) -> List[dict]:
+    def fetch_issues_raw(self, block_index: int = 0, save: bool = True, engine: str = "sync",
+                         concurrency: int = 16, resume: bool = False) -> List[dict]:
         """
         Fetch all issues in their raw (unparsed) form from the project
         and return them as a list of dictionaries (decoded JSON form). Each issue will additionally have a key
         "remotelinks" which stores a list of remote links found in the issue (remote links cannot be fetched alongside
         other fields).
-        :param block_index: Issues are fetched in blocks of 100 issues each, so this variable shows which block should
-        the program start with
+        When issues are saved, the progress is recorded in "Projects/<project_name>/fetch_manifest.json" after each
+        page, so that an interrupted fetch can be resumed.
+        For large projects, prefer iter_fetch_issues_raw, which does not keep all issues in memory.
+        :param block_index: Issues are fetched in blocks of 100 issues each (fewer if the server returns fewer issues
+        per page), so this variable shows which block should the program start with
         :param save: Whether to persist issues in JSON format
-        :return: List of issues as dictionaries
+        :param engine: "sync" to fetch issues one request at a time with the Jira client, "async" to fetch them
+        concurrently with asyncio (requires aiohttp)
+        :param concurrency: Maximum number of requests in flight of the "async" engine
+        :param resume: Whether to skip the pages completed by a previous fetch and to retry the remote links that
+        could not be fetched
+        :return: List of fetched issues as dictionaries
+        """
+        return list(self.iter_fetch_issues_raw(block_index, save, engine, concurrency, resume))
+
+    def iter_fetch_issues_raw(self, block_index: int = 0, save: bool = True, engine: str = "sync",
+                              concurrency: int = 16, resume: bool = False) -> Iterator[dict]:
         """
+        Generator version of fetch_issues_raw: issues are yielded page by page as soon as the page is fetched (and
+        saved), so that only a few pages are held in memory at once. See fetch_issues_raw for the parameters.
+        :return: Generator of fetched issues as dictionaries
+        """
+        if engine not in FETCH_ENGINES:
+            raise ValueError("Unknown fetch engine {}. Engines are: {}".format(engine, ", ".join(FETCH_ENGINES)))
         print("{}: fetching issues. This may take a while".format(self.project))
-        issues = []
+        count = 0
         block_size = 100
+        # Pages are resumed by their offsets, so the order of issues has to be stable between runs; issues created in
+        # the meantime then only add pages at the end
+        query = "project={} ORDER BY key ASC".format(self.project)
+        # The offsets only line up with the pages of a fetch of the same size, and servers may return fewer issues
+        # per page than requested, so the page size the server actually returns is used and recorded
+        fetcher = None
+        if engine == "async":
+            from jira_parser.async_fetch import AsyncJiraFetcher
+            fetcher = AsyncJiraFetcher(self.jira_server, query, self.fields, concurrency, block_size)
+            page_size = fetcher.page_size = fetcher.fetch_page_size()
+        else:
+            page_size = self.__fetch_page_size(query, block_size)
+        manifest = FetchManifest(self.project_dir, query, self.fields, page_size)
+        if resume:
+            if manifest.load():
+                print("{}: resuming the fetch, {} pages are already fetched".format(self.project,
+                                                                                     len(manifest.completed_pages)))
+                self.__retry_remote_links(manifest)
+            else:
+                print("{}: no previous fetch to resume, fetching from scratch".format(self.project))
+        if fetcher is not None:
+            pages = self.__iter_fetch_pages_async(fetcher, block_index * page_size, save, manifest)
+        else:
+            pages = self.__iter_fetch_pages(block_index, page_size, save, manifest)
+        for fetched_issues in pages:
+            count += len(fetched_issues)
+            print("{}: Fetched {} issues".format(self.project, count))
+            yield from fetched_issues
+        if save:
+            manifest.finish()
+        print("{}: Finished fetching{} issues! Totally fetched: {}".format(self.project,
+                                                                           " and saving" if save else "",
+                                                                           count))
+
+    def __fetch_page_size(self, query: str, block_size: int) -> int:
+        """
+        Ask the server how many issues it returns per search page when block_size issues are requested, which may be
+        fewer.
+        :param query: JQL query of the fetch
+        :param block_size: Number of issues requested per page
+        :return: Number of issues per page
+        """
+        result = self.jira.search_issues(query, maxResults=block_size, fields="key", json_result=True)
+        return max(1, min(block_size, result.get("maxResults") or block_size))
+
+    def __iter_fetch_pages(self, block_index: int, block_size: int, save: bool,
+                           manifest: FetchManifest) -> Iterator[List[dict]]:
+        """
+        Fetch pages of issues one request at a time with the Jira client.
+        :param block_index: Index of the first page to fetch
+        :param block_size: Number of issues per page
+        :param save: Whether to persist issues in JSON format
+        :param manifest: Progress of the fetch
+        :return: Generator of pages of issues
+        """
         while True:
             start_index = block_index * block_size
-            fetched_issues = [issue.raw for issue in self.jira.search_issues("project={}".format(self.project),
-                                                                             startAt=start_index,
-                                                                             maxResults=block_size,
-                                                                             validate_query=True,
-                                                                             fields=self.fields)]
+            block_index += 1
+            if manifest.is_completed(start_index):
+                continue
+            with instrumentation.span("jira.search_page"):
+                # Only the raw issues are used, so the client does not build its resources out of them
+                fetched_issues = self.jira.search_issues(manifest.query, startAt=start_index, maxResults=block_size,
+                                                         validate_query=True, fields=self.fields,
+                                                         json_result=True)["issues"]
             if len(fetched_issues) == 0:
                 break
-            block_index += 1
+            failed_remote_links = []
             for issue in fetched_issues:
                 issue["remotelinks"] = []
                 try:
-                    remote_links = self.jira.remote_links(issue["key"])
+                    with instrumentation.span("jira.remote_links", issue["key"]):
+                        remote_links = self.jira.remote_links(issue["key"])
                     issue["remotelinks"] = [link.raw for link in remote_links]
                 except:
+                    instrumentation.count("jira.remote_links_failures")
+                    failed_remote_links.append(issue["key"])
                     print("An error occurred while trying to retrieve remote links for issue {}".format(issue["key"]))
                     traceback.print_exc()
-            issues.extend(fetched_issues)
-            print("{}: Fetched {} issues".format(self.project, len(issues)))
+            instrumentation.count("jira.issues_fetched", len(fetched_issues))
+            if save:
+                with instrumentation.span("jira.save_page"):
+                    self.__save_issues_raw(fetched_issues)
+                    manifest.complete_page(start_index, failed_remote_links)
+            yield fetched_issues
+
+    def __iter_fetch_pages_async(self, fetcher: "AsyncJiraFetcher", start_index: int, save: bool,
+                                 manifest: FetchManifest) -> Iterator[List[dict]]:
+        """
+        Fetch pages of issues with the asyncio engine, which runs in a background thread. Each page is saved as soon
+        as it is fetched together with remote links of its issues, while the following pages are still being
+        fetched. At most FETCH_QUEUE_PAGES pages wait to be consumed; the engine pauses when the queue is full.
+        :param fetcher: Engine fetching the pages
+        :param start_index: Index of the first issue to fetch
+        :param save: Whether to persist issues in JSON format
+        :param manifest: Progress of the fetch
+        :return: Generator of pages of issues in the order they are fetched
+        """
+        pages = queue.Queue(maxsize=FETCH_QUEUE_PAGES)
+        stopped = threading.Event()
+        finished = object()
+
+        def on_page(page_start: int, fetched_issues: List[dict]) -> None:
             if save:
-                self.__save_issues_raw(fetched_issues)
-        print("{}: Finished fetching {} issues! Totally fetched: {}".format(self.project,
-                                                                            " and saving" if save else "",
-                                                                            len(issues)))
-        return issues
+                with instrumentation.span("jira.save_page"):
+                    self.__save_issues_raw(fetched_issues)
+                    manifest.complete_page(page_start, [issue["key"] for issue in fetched_issues
+                                                        if issue["key"] in fetcher.failed_remote_links])
+            while not stopped.is_set():
+                try:
+                    pages.put(fetched_issues, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            raise _FetchCancelled()
+
+        def fetch() -> None:
+            try:
+                fetcher.fetch(on_page, start_index, set(manifest.completed_pages))
+            except _FetchCancelled:
+                pass
+            except BaseException as e:
+                pages.put(e)
+            pages.put(finished)
+
+        thread = threading.Thread(target=fetch, name="{}-fetch".format(self.project), daemon=True)
+        thread.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is finished:
+                    break
+                if isinstance(page, BaseException):
+                    raise page
+                yield page
+        finally:
+            # The consumer may stop early; the engine is then cancelled and the queue drained for it to finish
+            stopped.set()
+            while thread.is_alive():
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+    def __retry_remote_links(self, manifest: FetchManifest) -> None:
+        """
+        Fetch the remote links of the saved issues for which it failed previously.
+        :param manifest: Progress of the fetch listing the issues
+        :return: None
+        """
+        for issue_key in sorted(manifest.failed_remote_links):
+            issue = self.load_issue_raw(issue_key)
+            if issue is None:
+                manifest.failed_remote_links.discard(issue_key)
+                continue
+            try:
+                with instrumentation.span("jira.remote_links", issue_key):
+                    remote_links = self.jira.remote_links(issue_key)
+            except:
+                print("An error occurred while trying to retrieve remote links for issue {}".format(issue_key))
+                traceback.print_exc()
+                continue
+            issue["remotelinks"] = [link.raw for link in remote_links]
+            self.__save_issues_raw([issue])
+            manifest.failed_remote_links.discard(issue_key)
+        manifest.save()
 
     def fetch_issue_raw(self, issue_key: str, save: bool = True) -> dict:
         """
@@ -80,9 +355,12 @@ class JiraParser:
         :param save: Whether to persist the issue in JSON format
         :return: Issue as a dictionary
         """
-        issue = self.jira.issue(issue_key, self.fields).raw
+        with instrumentation.span("jira.fetch_issue", issue_key):
+            issue = self.jira.issue(issue_key, self.fields).raw
+        instrumentation.count("jira.issues_fetched")
         try:
-            remote_links = self.jira.remote_links(issue["key"])
+            with instrumentation.span("jira.remote_links", issue_key):
+                remote_links = self.jira.remote_links(issue["key"])
             issue["remotelinks"] = [link.raw for link in remote_links]
         except:
             print("An error occurred while trying to retrieve remote links for issue {}".format(issue["key"]))
@@ -93,7 +371,8 @@ class JiraParser:
 
     def __save_issues_raw(self, issues: List[dict]) -> None:
         """
-        Persist raw issues in the corresponding folder.
+        Persist raw issues in the corresponding folder. In the slim raw mode, only the parts used by the parser are
+        kept.
         :param issues: List of dictionaries describing unparsed issues
         :return: None
         """
@@ -104,23 +383,29 @@ class JiraParser:
             key = issue["key"]
             filename = key + ".json"
             path = os.path.join(directory, filename)
-            utils.save_as_json(issue, path)
+            utils.save_as_json(slim_issue_raw(issue) if self.slim_raw else issue, path)
 
     def load_issues_raw(self) -> List[dict]:
         """
         Load unparsed issues stored in the folder "Issues_raw" and return them as a list of dictionaries.
         :return: List of issues represented as dictionaries
         """
+        return list(self.iter_load_issues_raw())
+
+    def iter_load_issues_raw(self) -> Iterator[dict]:
+        """
+        Load unparsed issues stored in the folder "Issues_raw" one at a time.
+        :return: Generator of issues represented as dictionaries
+        """
         directory = self.issues_raw_dir
         if not os.path.exists(directory):
-            return []
-        issues = []
-        files = os.listdir(directory)
-        for filename in files:
-            path = os.path.join(directory, filename)
-            issue = utils.load_json(path)
-            issues.append(issue)
-        return issues
+            return
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Skips temporary files of interrupted writes
+                if not entry.name.endswith(".json"):
+                    continue
+                yield utils.load_json(entry.path)
 
     def load_issue_raw(self, issue_key: str) -> Optional[dict]:
         """
@@ -167,42 +452,55 @@ class JiraParser:
         loaded from the cache
         :return: List of dictionaries of parsed issues
         """
+        return list(self.iter_parse_issues(issues_raw or None))
+
+    def iter_parse_issues(self, issues_raw: Iterable[dict] = None) -> Iterator[dict]:
+        """
+        Generator version of parse_issues: each issue is parsed, saved and yielded in turn, so that raw issues can be
+        streamed from iter_fetch_issues_raw or iter_load_issues_raw without holding them all in memory.
+        :param issues_raw: Raw issues. If none are specified, then they are loaded from the cache
+        :return: Generator of dictionaries of parsed issues
+        """
         print("{}: parsing issues. This may take a while".format(self.project))
         count = 0
         issues_dir = self.issues_dir
         utils.create_dir_if_necessary(issues_dir)
 
-        if not issues_raw:
-            issues_raw = self.load_issues_raw()
+        if issues_raw is None:
+            issues_raw = self.iter_load_issues_raw()
 
-        issues = []
         for count, issue in enumerate(issues_raw, start=1):
+            if is_outdated_raw(issue):
+                issue = self.fetch_issue_raw(issue["key"], save=True)
             filename = issue["key"] + ".json"
             path = os.path.join(issues_dir, filename)
-            json_object = self.__prepare_json_object(issue)
-            utils.save_as_json(json_object, path)
-            issues.append(json_object)
+            with instrumentation.span("jira.parse_issue", issue["key"]):
+                json_object = self.prepare_json_object(issue)
+                utils.save_as_json(json_object, path)
+            yield json_object
 
             if count % 100 == 0:
                 print("{}: Parsed {} issues".format(self.project, count))
         print("{}: Finished parsing issues! Totally parsed: {}".format(self.project, count))
-        return issues
 
     def parse_issue(self, issue_key: str) -> dict:
         """
         Parse a raw issue and store it in "Projects/<project_name>/Issues/<issue_key>.json.
-        If the issue is not cached, then it is fetched first.
+        If the issue is not cached or it is cached in an outdated slim form, then it is fetched first.
         :param issue_key: Key of the issue to parse
         :return: Dictionary representing the issue
         """
         filename = issue_key + ".json"
         utils.create_dir_if_necessary(self.issues_dir)
         path_raw = os.path.join(self.issues_raw_dir, filename)
-        if not os.path.isfile(path_raw):
+        issue_raw = utils.load_json(path_raw) if os.path.isfile(path_raw) else None
+        if issue_raw is None or is_outdated_raw(issue_raw):
+            instrumentation.count("jira.raw_cache_misses")
             issue_raw = self.fetch_issue_raw(issue_key, save=True)
         else:
-            issue_raw = utils.load_json(path_raw)
-        json_object = self.__prepare_json_object(issue_raw)
+            instrumentation.count("jira.raw_cache_hits")
+        with instrumentation.span("jira.parse_issue", issue_key):
+            json_object = self.prepare_json_object(issue_raw)
 
         path = os.path.join(self.issues_dir, filename)
         utils.save_as_json(json_object, path)
@@ -212,12 +510,173 @@ class JiraParser:
         filename = issue_key + ".json"
         path = os.path.join(self.issues_dir, filename)
         if not os.path.isfile(path):
+            instrumentation.count("jira.issue_cache_misses")
             issue = self.parse_issue(issue_key)
         else:
-            issue = utils.load_json(path)
+            instrumentation.count("jira.issue_cache_hits")
+            issue = self.__read_issue(issue_key, path)
         return issue
 
-    def __prepare_json_object(self, issue: dict) -> dict:
+    def __read_issue(self, issue_key: str, path: str) -> dict:
+        """
+        Read a parsed issue from its file or, if the issue cache is enabled, from memory. Issues in memory are shared by
+        all the callers, so they must not be modified.
+        :param issue_key: Key of the issue
+        :param path: Path to the file of the issue
+        :return: Dictionary representing the issue
+        """
+        if not self.issue_cache_size:
+            return utils.load_json(path)
+        modified = os.path.getmtime(path)
+        with self.__issue_cache_lock:
+            cached = self.__issue_cache.get(issue_key)
+            if cached and cached[0] == modified:
+                self.__issue_cache.move_to_end(issue_key)
+                instrumentation.count("jira.issue_memory_hits")
+                return cached[1]
+        issue = utils.load_json(path)
+        with self.__issue_cache_lock:
+            self.__issue_cache[issue_key] = (modified, issue)
+            self.__issue_cache.move_to_end(issue_key)
+            while len(self.__issue_cache) > self.issue_cache_size:
+                self.__issue_cache.popitem(last=False)
+        return issue
+
+    def iter_issue_keys(self, ranges: List[Tuple[int, int]] = None, jql: str = None) -> Iterator[str]:
+        """
+        Keys of the existing issues of the project whose IDs fall into the ranges and which match the JQL filter, in
+        the order of their IDs. Keys are produced lazily: with a JQL filter, they are streamed from the search a page
+        at a time; otherwise the IDs of a range are resolved a block at a time, against the local store first and
+        with a single search on the server for the IDs missing from it, so that huge ranges are neither
+        materialized nor probed one key at a time.
+        :param ranges: Sorted, non-overlapping ranges of issue IDs, both ends included. By default, all issues
+        :param jql: JQL filter, e.g. "status = Resolved AND type = Bug"
+        :return: Generator of issue keys
+        """
+        if jql or not ranges:
+            issue_ids = self.__iter_search_ids(jql)
+            if ranges:
+                issue_ids = self.__within_ranges(issue_ids, ranges)
+            for issue_id in issue_ids:
+                yield "{}-{}".format(self.project, issue_id)
+            return
+
+        local_ids = self.__local_issue_ids()
+        last_local_id = max(local_ids, default=0)
+        last_id = None  # Highest ID on the server, only asked for once an ID is missing from the local store
+        for first, last in ranges:
+            for block_start in range(first, last + 1, KEY_BLOCK_SIZE):
+                if last_id is not None and block_start > max(last_id, last_local_id):
+                    # No issue exists beyond, so the rest of the ranges is not walked through
+                    return
+                block_end = min(block_start + KEY_BLOCK_SIZE - 1, last)
+                missing = [issue_id for issue_id in range(block_start, block_end + 1) if issue_id not in local_ids]
+                remote_ids = set()
+                if missing:
+                    if last_id is None:
+                        last_id = next(self.__iter_search_ids(None, descending=True), 0)
+                    if missing[0] <= last_id:
+                        # Jira may ignore a bound which is not an existing key, so the results are filtered as well
+                        search = self.__iter_search_ids("key >= {0}-{1} AND key <= {0}-{2}".format(
+                            self.project, missing[0], min(missing[-1], last_id)), validate=False)
+                        remote_ids = set(self.__within_ranges(search, [(missing[0], missing[-1])]))
+                for issue_id in range(block_start, block_end + 1):
+                    if issue_id in local_ids or issue_id in remote_ids:
+                        yield "{}-{}".format(self.project, issue_id)
+
+    def __iter_search_ids(self, jql: Optional[str], validate: bool = True, descending: bool = False) -> Iterator[int]:
+        """
+        IDs of the issues of the project matching the JQL filter, ordered by the IDs, fetched a page at a time.
+        """
+        query = "project = {}{} ORDER BY key {}".format(self.project, " AND ({})".format(jql) if jql else "",
+                                                        "DESC" if descending else "ASC")
+        start = 0
+        while True:
+            with instrumentation.span("jira.search_page"):
+                page = self.jira.search_issues(query, startAt=start, maxResults=KEY_BLOCK_SIZE, fields="key",
+                                               validate_query=validate)
+            for issue in page:
+                yield int(issue.key.rsplit('-', 1)[1])
+            start += len(page)
+            if not page or start >= page.total:
+                return
+
+    @staticmethod
+    def __within_ranges(issue_ids: Iterator[int], ranges: List[Tuple[int, int]]) -> Iterator[int]:
+        """
+        Filter ascending IDs by sorted ranges, stopping as soon as an ID is past the last range.
+        """
+        range_index = 0
+        for issue_id in issue_ids:
+            while issue_id > ranges[range_index][1]:
+                range_index += 1
+                if range_index == len(ranges):
+                    return
+            if issue_id >= ranges[range_index][0]:
+                yield issue_id
+
+    def __local_issue_ids(self) -> Set[int]:
+        """
+        IDs of the issues found in the local store, parsed or raw.
+        """
+        prefix = self.project + "-"
+        issue_ids = set()
+        for directory in [self.issues_dir, self.issues_raw_dir]:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith(prefix) and name.endswith(".json") and name[len(prefix):-5].isdecimal():
+                        issue_ids.add(int(name[len(prefix):-5]))
+        return issue_ids
+
+    def load_issues(self, issue_keys: List[str]) -> List[dict]:
+        """
+        Load parsed issues by their keys. Issues missing from the cache are fetched in bulk, a page of issues per
+        request, rather than one at a time.
+        :param issue_keys: Keys of the issues to load
+        :return: List of dictionaries representing the issues, in the order of the keys
+        """
+        issues = dict()
+        missing = []
+        for issue_key in dict.fromkeys(issue_keys):
+            path = os.path.join(self.issues_dir, issue_key + ".json")
+            if os.path.isfile(path):
+                instrumentation.count("jira.issue_cache_hits")
+                issues[issue_key] = self.__read_issue(issue_key, path)
+            else:
+                instrumentation.count("jira.issue_cache_misses")
+                missing.append(issue_key)
+
+        block_size = 100
+        for start in range(0, len(missing), block_size):
+            keys = missing[start:start + block_size]
+            with instrumentation.span("jira.search_page"):
+                # Without validation, keys of issues which do not exist are ignored instead of failing the query
+                fetched_issues = [issue.raw for issue in self.jira.search_issues("key in ({})".format(",".join(keys)),
+                                                                                 maxResults=block_size,
+                                                                                 validate_query=False,
+                                                                                 fields=self.fields)]
+            for issue in fetched_issues:
+                issue["remotelinks"] = []
+                try:
+                    with instrumentation.span("jira.remote_links", issue["key"]):
+                        remote_links = self.jira.remote_links(issue["key"])
+                    issue["remotelinks"] = [link.raw for link in remote_links]
+                except:
+                    print("An error occurred while trying to retrieve remote links for issue {}".format(issue["key"]))
+                    traceback.print_exc()
+            instrumentation.count("jira.issues_fetched", len(fetched_issues))
+            self.__save_issues_raw(fetched_issues)
+            for issue in self.iter_parse_issues(fetched_issues):
+                issues[issue["issue_key"]] = issue
+
+        # Issues not found by the search (e.g. moved to another key) are looked up one by one, which reports issues
+        # that do not exist
+        return [issues[issue_key] if issue_key in issues else self.load_issue(issue_key) for issue_key in issue_keys]
+
+    def prepare_json_object(self, issue: dict) -> dict:
         """
         Prepare a dictionary containing the following data:
         {
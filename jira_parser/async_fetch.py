@@ -0,0 +1,167 @@
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Set
+
+from utils import instrumentation
+
+RETRIES = 4
+BACKOFF_SECONDS = 1.0
+
+
+class AsyncJiraFetcher:
+    def __init__(self, server: str, query: str, fields: str, concurrency: int = 16, page_size: int = 100):
+        """
+        Fetch engine talking to the Jira REST API directly with asyncio and aiohttp. It keeps at most concurrency
+        requests in flight (search pages and remote links together) and produces the same raw dictionaries as the
+        blocking Jira client, each with an additional "remotelinks" key.
+        :param server: URL of the Jira server
+        :param query: JQL query selecting the issues, which has to order them so that pages can be resumed, e.g.
+        "project=<project> ORDER BY key ASC"
+        :param fields: Comma-separated issue fields to fetch
+        :param concurrency: Maximum number of requests in flight
+        :param page_size: Number of issues requested per search page
+        """
+        self.rest_url = server.rstrip("/") + "/rest/api/2/"
+        self.query = query
+        self.fields = fields
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.semaphore = None
+        self.failed_remote_links = set()
+
+    async def __get_json(self, session, path: str, params: dict = None):
+        """
+        GET a REST resource, retrying on rate limiting (honouring Retry-After) and on server errors with exponential
+        backoff. Client errors other than 429 are raised immediately.
+        """
+        for attempt in range(RETRIES + 1):
+            async with self.semaphore:
+                async with session.get(self.rest_url + path, params=params) as response:
+                    body = await response.read()
+                    instrumentation.count("jira.http_requests")
+                    instrumentation.count("jira.http_bytes", len(body))
+                    if response.status < 400:
+                        return await response.json(content_type=None)
+                    instrumentation.count("jira.http_errors")
+                    retry_after = response.headers.get("Retry-After")
+                    if (response.status != 429 and response.status < 500) or attempt == RETRIES:
+                        response.raise_for_status()
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else BACKOFF_SECONDS * 2 ** attempt
+            await asyncio.sleep(delay)
+
+    async def __fetch_remote_links(self, session, issue: dict) -> None:
+        issue["remotelinks"] = []
+        try:
+            with instrumentation.span("jira.remote_links", issue["key"]):
+                issue["remotelinks"] = await self.__get_json(session, "issue/{}/remotelink".format(issue["key"]))
+        except Exception:
+            instrumentation.count("jira.remote_links_failures")
+            self.failed_remote_links.add(issue["key"])
+            print("An error occurred while trying to retrieve remote links for issue {}".format(issue["key"]))
+            traceback.print_exc()
+
+    async def __search(self, session, start_at: int, max_results: int) -> dict:
+        with instrumentation.span("jira.search_page"):
+            return await self.__get_json(session, "search", {
+                "jql": self.query,
+                "startAt": str(start_at),
+                "maxResults": str(max_results),
+                "validateQuery": "true",
+                "fields": self.fields
+            })
+
+    async def __fetch_page_size(self) -> int:
+        import aiohttp
+
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with aiohttp.ClientSession() as session:
+            result = await self.__get_json(session, "search", {
+                "jql": self.query,
+                "startAt": "0",
+                "maxResults": str(self.page_size),
+                "validateQuery": "true",
+                "fields": "key"
+            })
+        return max(1, min(self.page_size, result.get("maxResults") or self.page_size))
+
+    def fetch_page_size(self) -> int:
+        """
+        Ask the server how many issues it returns per search page when page_size issues are requested, which may be
+        fewer.
+        :return: Number of issues per page
+        """
+        return asyncio.run(self.__fetch_page_size())
+
+    async def __fetch_page(self, session, start_at: int, max_results: int) -> dict:
+        """
+        Fetch a search page and the remote links of all of its issues.
+        :return: Search result as returned by Jira
+        """
+        result = await self.__search(session, start_at, max_results)
+        await asyncio.gather(*[self.__fetch_remote_links(session, issue) for issue in result["issues"]])
+        instrumentation.count("jira.issues_fetched", len(result["issues"]))
+        return result
+
+    async def __fetch(self, on_page: Callable[[int, List[dict]], None], start_index: int, skip: Set[int]) -> int:
+        import aiohttp
+
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        # Pages are handed to on_page in a thread of its own, one at a time, so that saving them or waiting for their
+        # consumer does not stall the requests in flight
+        handler = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jira-pages")
+        try:
+            async with aiohttp.ClientSession() as session:
+                # The first page not fetched yet tells the total number of issues and the page size of the server,
+                # which may return fewer issues per page than requested
+                first_start = start_index
+                while first_start in skip:
+                    first_start += self.page_size
+                first_page = await self.__fetch_page(session, first_start, self.page_size)
+                page_size = max(1, min(self.page_size, first_page.get("maxResults") or self.page_size))
+                fetched = len(first_page["issues"])
+                if first_page["issues"]:
+                    await loop.run_in_executor(handler, on_page, first_start, first_page["issues"])
+                total = first_page.get("total", 0)
+
+                # Pages are fetched by a bounded number of workers, so that only a few pages are kept in memory at
+                # once while all of them still share the limit of requests in flight.
+                pending = [start_at for start_at in range(start_index, total, page_size)
+                           if start_at not in skip and start_at != first_start]
+                starts = iter(pending)
+
+                async def worker() -> int:
+                    count = 0
+                    for start_at in starts:
+                        page = await self.__fetch_page(session, start_at, page_size)
+                        if page["issues"]:
+                            await loop.run_in_executor(handler, on_page, start_at, page["issues"])
+                        count += len(page["issues"])
+                    return count
+
+                workers = [asyncio.ensure_future(worker())
+                           for _ in range(max(1, min(self.concurrency // 4, len(pending))))]
+                try:
+                    fetched += sum(await asyncio.gather(*workers))
+                except BaseException:
+                    # E.g. on_page cancelled the fetch: the other workers are stopped before the session is closed
+                    for task in workers:
+                        task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                    raise
+        finally:
+            handler.shutdown(wait=True)
+        return fetched
+
+    def fetch(self, on_page: Callable[[int, List[dict]], None], start_index: int = 0, skip: Set[int] = None) -> int:
+        """
+        Fetch all issues of the project from start_index on. Pages are passed to on_page as soon as they and the
+        remote links of their issues are fetched, so they may arrive out of order. on_page runs outside the event
+        loop, one page at a time, so it may block, e.g. to save the page or to wait for the page to be consumed.
+        :param on_page: Function called with the index of the first issue of the page and the list of raw issues
+        :param start_index: Index of the first issue to fetch
+        :param skip: Indices of the first issues of the pages that are already fetched
+        :return: Number of fetched issues
+        """
+        return asyncio.run(self.__fetch(on_page, start_index, skip or set()))
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import utils
+from utils import instrumentation
+
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+RETRIES = 3
+BACKOFF_SECONDS = 1.0
+# Number of downloads after which the index is saved, so that an interrupted mirror loses little work
+INDEX_SAVE_INTERVAL = 50
+
+
+class AttachmentMirror:
+    def __init__(self, project: str, concurrency: int = 8):
+        """
+        Local copy of the attachments of the issues of a project, stored in "Projects/<project_name>/Attachments".
+        Files are stored under the SHA-256 of their content in "objects", so that an attachment uploaded to several
+        issues is kept once. "index.json" maps the URL of each attachment to its file.
+        Downloads in progress are kept in "partial" and continued with range requests when interrupted.
+        :param project: Jira project
+        :param concurrency: Maximum number of downloads at the same time
+        """
+        self.project = project
+        self.concurrency = concurrency
+        self.directory = os.path.join("Projects", project, "Attachments")
+        self.objects_dir = os.path.join(self.directory, "objects")
+        self.partial_dir = os.path.join(self.directory, "partial")
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.index: Dict[str, dict] = utils.load_json(self.index_path) if os.path.isfile(self.index_path) else dict()
+        self.objects = {entry["sha256"]: entry["path"] for entry in self.index.values()}
+        self.lock = threading.Lock()
+        self.downloaded, self.downloaded_bytes, self.duplicates, self.failed = 0, 0, 0, 0
+
+    def local_path(self, url: str) -> Optional[str]:
+        """
+        :param url: URL of an attachment
+        :return: Path to the local copy of the attachment or None if it is not mirrored
+        """
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        path = os.path.join(self.directory, entry["path"])
+        return path if os.path.isfile(path) else None
+
+    def mirror(self, issues: Iterable[dict]) -> int:
+        """
+        Download the attachments of the parsed issues which are not mirrored yet. Downloads which fail are counted in
+        the field "failed" and retried by the next call.
+        :param issues: Iterable of parsed issues
+        :return: Number of attachments of the issues which were already mirrored
+        """
+        attachments = dict()
+        for issue in issues:
+            for attachment in issue["attachments"]:
+                attachments.setdefault(attachment["content"], attachment["filename"])
+        missing = [(url, filename) for url, filename in attachments.items() if self.local_path(url) is None]
+        print("{}: {} of {} attachments to download".format(self.project, len(missing), len(attachments)))
+        if missing:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency))
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency))
+            utils.create_dir_if_necessary(self.partial_dir)
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for _ in executor.map(lambda attachment: self.__download(session, *attachment), missing):
+                    pass
+            self.save()
+        return len(attachments) - len(missing)
+
+    def save(self) -> None:
+        with self.lock:
+            utils.create_dir_if_necessary(self.directory)
+            utils.save_as_json(self.index, self.index_path)
+
+    def __download(self, session, url: str, filename: str) -> None:
+        partial_path = os.path.join(self.partial_dir, hashlib.sha256(url.encode()).hexdigest())
+        for attempt in range(RETRIES + 1):
+            try:
+                with instrumentation.span("attachments.download", url):
+                    digest, size = self.__fetch(session, url, partial_path)
+                break
+            except Exception as exception:
+                if attempt == RETRIES:
+                    print("\t{}: failed to download {}: {}".format(self.project, url, exception))
+                    with self.lock:
+                        self.failed += 1
+                    instrumentation.count("attachments.failed")
+                    return
+                time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+
+        extension = os.path.splitext(filename)[1].lower()
+        if not re.fullmatch(r"\.[a-z0-9]{1,8}", extension):
+            extension = ""
+        with self.lock:
+            path = self.objects.get(digest)
+            if path is None:
+                # The extension is kept, so that LaTeX recognizes the type of embedded images
+                path = os.path.join("objects", digest[:2], digest + extension)
+                utils.create_dir_if_necessary(os.path.join(self.objects_dir, digest[:2]))
+                os.replace(partial_path, os.path.join(self.directory, path))
+                self.objects[digest] = path
+            else:
+                os.remove(partial_path)
+                self.duplicates += 1
+                instrumentation.count("attachments.duplicates")
+            self.index[url] = {"sha256": digest, "path": path, "size": size, "filename": filename}
+            self.downloaded += 1
+            self.downloaded_bytes += size
+            save = self.downloaded % INDEX_SAVE_INTERVAL == 0
+        instrumentation.count("attachments.downloaded")
+        instrumentation.count("attachments.bytes", size)
+        if save:
+            self.save()
+
+    @staticmethod
+    def __fetch(session, url: str, partial_path: str):
+        """
+        Download the attachment into the partial file, continuing the download already stored in it if the server
+        supports range requests.
+        :return: Tuple of the SHA-256 of the content and its size in bytes
+        """
+        digest = hashlib.sha256()
+        offset = os.path.getsize(partial_path) if os.path.isfile(partial_path) else 0
+        headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+        with session.get(url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 416:
+                # The partial file is not a prefix of the attachment anymore
+                os.remove(partial_path)
+                raise IOError("Invalid partial download")
+            response.raise_for_status()
+            if response.status_code == 206:
+                with open(partial_path, "rb") as file:
+                    for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                mode = "ab"
+            else:
+                offset, mode = 0, "wb"
+            size = offset
+            with open(partial_path, mode) as file:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        return digest.hexdigest(), size
@@ -0,0 +1,77 @@
+import os
+from typing import List
+
+import utils
+
+
+class FetchManifest:
+    def __init__(self, project_dir: str, query: str, fields: str, page_size: int):
+        """
+        Progress of a project fetch, persisted in "Projects/<project_name>/fetch_manifest.json" after every page:
+        {
+          "query": <JQL query>,
+          "fields": <fetched fields>,
+          "page_size": <number of issues per page returned by the server>,
+          "completed_pages": [<index of the first issue of the page>, ...],
+          "failed_remote_links": [<issue key>, ...],
+          "finished": <whether all pages are fetched>
+        }
+        :param project_dir: Directory of the project
+        :param query: JQL query of the fetch
+        :param fields: Fetched fields
+        :param page_size: Number of issues per page returned by the server
+        """
+        self.path = os.path.join(project_dir, "fetch_manifest.json")
+        self.query = query
+        self.fields = fields
+        self.page_size = page_size
+        self.completed_pages = set()
+        self.failed_remote_links = set()
+        self.finished = False
+
+    def load(self) -> bool:
+        """
+        Load the progress of a previous fetch with the same query, fields and page size. Pages are recorded by their
+        offsets, which do not line up with the pages of another size, e.g. if the server now returns fewer issues per
+        page, so such a fetch starts from scratch.
+        :return: Whether the progress was loaded
+        """
+        if not os.path.isfile(self.path):
+            return False
+        manifest = utils.load_json(self.path)
+        if (manifest["query"], manifest["fields"], manifest.get("page_size")) != (self.query, self.fields,
+                                                                                 self.page_size):
+            return False
+        self.completed_pages = set(manifest["completed_pages"])
+        self.failed_remote_links = set(manifest["failed_remote_links"])
+        self.finished = manifest["finished"]
+        return True
+
+    def save(self) -> None:
+        utils.create_dir_if_necessary(os.path.dirname(self.path))
+        utils.save_as_json({
+            "query": self.query,
+            "fields": self.fields,
+            "page_size": self.page_size,
+            "completed_pages": sorted(self.completed_pages),
+            "failed_remote_links": sorted(self.failed_remote_links),
+            "finished": self.finished
+        }, self.path)
+
+    def is_completed(self, start_index: int) -> bool:
+        return start_index in self.completed_pages
+
+    def complete_page(self, start_index: int, failed_remote_links: List[str]) -> None:
+        """
+        Record a page whose issues are saved, together with the issues whose remote links could not be fetched.
+        :param start_index: Index of the first issue of the page
+        :param failed_remote_links: Keys of the issues of the page whose remote links could not be fetched
+        :return: None
+        """
+        self.completed_pages.add(start_index)
+        self.failed_remote_links.update(failed_remote_links)
+        self.save()
+
+    def finish(self) -> None:
+        self.finished = True
+        self.save()
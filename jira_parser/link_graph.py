@@ -0,0 +1,136 @@
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+import utils
+
+# Links of an issue: list of (type of link, key of the linked issue)
+Links = List[Tuple[str, str]]
+
+
+class LinkGraph:
+    def __init__(self, project: str):
+        """
+        Index of the links between the parsed issues of a project, stored in "Projects/<project_name>/link_graph.json".
+        The index is built from "Projects/<project_name>/Issues" once and then updated incrementally: only issues
+        parsed after the last update are read again.
+        Jira stores a link on both of the issues it connects, but only one of them may be parsed, so links are
+        followed in both directions.
+        The graph is not thread-safe: threads sharing it have to hold its lock while using it, except for
+        neighbourhood(), which takes the lock itself.
+        :param project: Jira project
+        """
+        self.project = project
+        self.issues_dir = os.path.join("Projects", project, "Issues")
+        self.path = os.path.join("Projects", project, "link_graph.json")
+        self.links: Dict[str, Links] = dict()
+        self.modified: Dict[str, float] = dict()  # Modification time of the file each issue was indexed from
+        self.reverse: Dict[str, Set[str]] = dict()
+        self.dirty = False
+        self.lock = threading.RLock()
+        if os.path.isfile(self.path):
+            graph = utils.load_json(self.path)
+            for key, links in graph["links"].items():
+                self.__set_links(key, [(link_type, linked_key) for link_type, linked_key in links])
+            self.modified = graph["modified"]
+        self.refresh()
+
+    def __set_links(self, key: str, links: Links) -> None:
+        for _, linked_key in self.links.get(key, []):
+            self.reverse.get(linked_key, set()).discard(key)
+        self.links[key] = links
+        for _, linked_key in links:
+            self.reverse.setdefault(linked_key, set()).add(key)
+
+    def refresh(self) -> None:
+        """
+        Index the issues parsed since the last update.
+        :return: None
+        """
+        if not os.path.isdir(self.issues_dir):
+            return
+        with os.scandir(self.issues_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                key = entry.name[:-len(".json")]
+                modified = entry.stat().st_mtime
+                if self.modified.get(key) != modified:
+                    self.update(utils.load_json(entry.path), modified)
+
+    def update(self, issue: dict, modified: float = None) -> None:
+        """
+        Index the links of a parsed issue.
+        :param issue: Parsed issue
+        :param modified: Modification time of the file of the issue. By default, it is read from the file system
+        :return: None
+        """
+        key = issue["issue_key"]
+        if modified is None:
+            path = os.path.join(self.issues_dir, key + ".json")
+            modified = os.path.getmtime(path) if os.path.isfile(path) else 0
+        self.__set_links(key, [(link["type"], link["issue_key"]) for link in issue["issuelinks"]])
+        self.modified[key] = modified
+        self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        utils.create_dir_if_necessary(os.path.dirname(self.path))
+        utils.save_as_json({"links": self.links, "modified": self.modified}, self.path)
+        self.dirty = False
+
+    def neighbours(self, key: str) -> List[str]:
+        """
+        Keys of the issues linked with the issue in any direction, without duplicates, in the order of the links of
+        the issue itself.
+        :param key: Key of the issue
+        :return: List of keys
+        """
+        neighbours = dict.fromkeys(linked_key for _, linked_key in self.links.get(key, []))
+        neighbours.update(dict.fromkeys(sorted(self.reverse.get(key, set()))))
+        neighbours.pop(key, None)
+        return list(neighbours)
+
+    def neighbourhood(self, root: str, depth: int, load: Callable[[List[str]], Iterable[dict]] = None) \
+            -> Tuple[List[Tuple[str, int]], Set[Tuple[str, str]]]:
+        """
+        Breadth-first search of the issues at most depth links away from the root issue. Every issue is visited once,
+        so cycles of links are never followed.
+        Issues of a level that are not indexed yet are passed to load at once, which has to return them parsed. The
+        lock of the graph is taken for each level and released while issues are loaded, so that threads sharing the
+        graph do not wait for each other's loads; the caller should not hold it.
+        :param root: Key of the root issue
+        :param depth: Maximum number of links between the root and an issue
+        :param load: Function loading parsed issues by their keys in bulk
+        :return: Tuple of:
+            1. List of tuples of the key of an issue and its distance from the root, ordered by the distance
+            2. Set of the links closing cycles, as tuples of the keys of the issues they connect
+        """
+        distances = {root: 0}
+        neighbourhood = []
+        cycles = set()
+        frontier = [root]
+        for distance in range(1, depth + 1):
+            with self.lock:
+                unknown = [key for key in frontier if key not in self.links]
+            if unknown and load:
+                loaded = list(load(unknown))
+                with self.lock:
+                    for issue in loaded:
+                        self.update(issue)
+            next_frontier = []
+            with self.lock:
+                for key in frontier:
+                    for linked_key in self.neighbours(key):
+                        if linked_key not in distances:
+                            distances[linked_key] = distance
+                            next_frontier.append(linked_key)
+                            neighbourhood.append((linked_key, distance))
+                        elif distances[linked_key] >= distances[key]:
+                            # The link leads to an issue already reached through another path
+                            cycles.add((min(key, linked_key), max(key, linked_key)))
+            frontier = next_frontier
+            if not frontier:
+                break
+        return neighbourhood, cycles
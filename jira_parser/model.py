@@ -0,0 +1,45 @@
+import sys
+from array import array
+from typing import Collection, Sequence
+
+
+class IssueSummary:
+    """
+    References found in an issue, in the layout of the files inside "Projects/<project_name>/Summary". The number of
+    references of each type in REFERENCE_TYPES is kept in an array of machine integers, and the referenced values
+    themselves only when they are needed, e.g. to be saved, so that counting the references of a whole project keeps
+    a few dozen bytes per issue in memory.
+    """
+    __slots__ = ("issue_key", "issue_id", "created", "counts", "references")
+    REFERENCE_TYPES = ("urls", "revisions", "mailing_lists", "pdf_documents", "archives", "other_issues", "commits",
+                       "pull_requests")
+
+    def __init__(self, issue_key: str, created: str, references: Sequence[Collection[str]],
+                 keep_references: bool = True):
+        """
+        :param issue_key: Key of the issue
+        :param created: Date of creation of the issue
+        :param references: Referenced values of each type, in the order of REFERENCE_TYPES
+        :param keep_references: Whether to keep the referenced values rather than only their number
+        """
+        self.issue_key = issue_key
+        self.issue_id = int(issue_key.split('-')[1])
+        self.created = sys.intern(created) if type(created) is str else created
+        self.counts = array('q', map(len, references))
+        self.references = tuple(references) if keep_references else None
+
+    def to_dict(self) -> dict:
+        """
+        :return: New dictionary in the layout the summary is stored as in JSON files. The date of creation is not
+        part of it
+        """
+        if self.references is None:
+            raise ValueError("References of {} were not kept".format(self.issue_key))
+        data = {"issue_key": self.issue_key, "issue_id": self.issue_id}
+        for reference_type, references in zip(self.REFERENCE_TYPES, self.references):
+            data[reference_type] = list(references)
+        return data
+
+    def __repr__(self) -> str:
+        return "IssueSummary(issue_key={!r}, created={!r}, counts={})".format(self.issue_key, self.created,
+                                                                              list(self.counts))
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+from typing import List
+
+import utils
+
+
+class SearchError(Exception):
+    pass
+
+
+class SearchIndex:
+    def __init__(self, project: str):
+        """
+        Full-text index of the summaries, descriptions and comments of the parsed issues of a project, stored in
+        "Projects/<project_name>/search_index.sqlite" with SQLite FTS5. Like the link graph, it is updated
+        incrementally: issues are indexed as they are parsed and refresh() indexes the issues parsed since the last
+        update by any other means and removes the deleted ones.
+        :param project: Jira project
+        """
+        self.project = project
+        self.issues_dir = os.path.join("Projects", project, "Issues")
+        self.path = os.path.join("Projects", project, "search_index.sqlite")
+        utils.create_dir_if_necessary(os.path.dirname(self.path))
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            # The row ID of an issue is its numeric ID, so that an issue is replaced quickly and results come out in
+            # the order of the issues
+            self.connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS issues "
+                                    "USING fts5(issue_key UNINDEXED, summary, description, comments)")
+        except sqlite3.OperationalError as error:
+            raise SearchError("SQLite is built without FTS5, which is required by the search index") from error
+        self.connection.execute("CREATE TABLE IF NOT EXISTS indexed (issue_key TEXT PRIMARY KEY, modified REAL)")
+        self.connection.commit()
+
+    def update(self, issue: dict, modified: float = None) -> None:
+        """
+        Index a parsed issue, replacing its previous version. Changes are written by save().
+        :param issue: Parsed issue
+        :param modified: Modification time of the file of the issue. By default, it is read from the file system
+        :return: None
+        """
+        issue_key = issue["issue_key"]
+        if modified is None:
+            path = os.path.join(self.issues_dir, issue_key + ".json")
+            modified = os.path.getmtime(path) if os.path.isfile(path) else 0
+        rowid = int(issue_key.rsplit('-', 1)[1])
+        comments = "\n".join(comment["body"] for comment in issue["comments"])
+        with self.lock:
+            self.connection.execute("DELETE FROM issues WHERE rowid = ?", (rowid,))
+            self.connection.execute("INSERT INTO issues (rowid, issue_key, summary, description, comments) "
+                                    "VALUES (?, ?, ?, ?, ?)",
+                                    (rowid, issue_key, issue["summary"], issue["description"] or "", comments))
+            self.connection.execute("INSERT OR REPLACE INTO indexed (issue_key, modified) VALUES (?, ?)",
+                                    (issue_key, modified))
+
+    def refresh(self) -> int:
+        """
+        Index the issues parsed since the last update and remove the issues whose files were deleted.
+        :return: Number of indexed issues
+        """
+        with self.lock:
+            modified = dict(self.connection.execute("SELECT issue_key, modified FROM indexed"))
+        updated = 0
+        if os.path.isdir(self.issues_dir):
+            with os.scandir(self.issues_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    entry_modified = entry.stat().st_mtime
+                    if modified.pop(entry.name[:-len(".json")], None) != entry_modified:
+                        self.update(utils.load_json(entry.path), entry_modified)
+                        updated += 1
+        # Issues left are no longer parsed
+        with self.lock:
+            self.connection.executemany("DELETE FROM issues WHERE rowid = ?",
+                                        [(int(issue_key.rsplit('-', 1)[1]),) for issue_key in modified])
+            self.connection.executemany("DELETE FROM indexed WHERE issue_key = ?",
+                                        [(issue_key,) for issue_key in modified])
+        self.save()
+        return updated
+
+    def save(self) -> None:
+        with self.lock:
+            self.connection.commit()
+
+    def search(self, query: str) -> List[str]:
+        """
+        Find the issues matching a query in the FTS5 syntax: words have to occur all unless joined with OR, NOT
+        excludes words ("oom NOT test"), double quotes match phrases ("\"region server\""), a trailing asterisk matches
+        prefixes (region*) and a column name restricts the search to a field (summary: oom). Matching ignores case.
+        :param query: Query
+        :return: Keys of the matching issues in the order of their IDs
+        """
+        try:
+            with self.lock:
+                rows = self.connection.execute("SELECT issue_key FROM issues WHERE issues MATCH ? ORDER BY rowid",
+                                               (query,)).fetchall()
+        except sqlite3.OperationalError as error:
+            raise SearchError("Invalid query {}: {}".format(query, error)) from error
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
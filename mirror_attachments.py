@@ -0,0 +1,77 @@
+import argparse
+import itertools
+import os
+from typing import Iterable, Iterator
+
+import utils
+from utils import instrumentation
+
+# Number of selected issues loaded at once
+ISSUE_BATCH_SIZE = 100
+
+
+def __parse_arguments() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description="Download the attachments of issues into "
+                                                     "Projects/<project>/Attachments")
+    arg_parser.add_argument("-p", "--project", help="Jira project in capital letters", required=True)
+    arg_parser.add_argument("-i", "--issues", help="Issues to download attachments of, separated by comma and/or "
+                                                   "defined as ranges. For example, \"124,136-152,174\". By default, "
+                                                   "the attachments of all parsed issues are downloaded")
+    arg_parser.add_argument("--concurrency", help="Maximum number of downloads at the same time", type=int, default=8)
+    arg_parser.add_argument("--jira-server", help="URL of the Jira server. By default, Apache Jira is used")
+    arg_parser.add_argument("--metrics", help="Print timings and counters of each stage at exit", action="store_true")
+    arg_parser.add_argument("--metrics-output", help="Export timings and counters at exit to a file: in Prometheus "
+                                                     "text format if it ends with .prom, in JSON otherwise")
+    return arg_parser.parse_args()
+
+
+def __load_parsed_issues(project: str):
+    directory = os.path.join("Projects", project, "Issues")
+    if not os.path.isdir(directory):
+        return
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".json"):
+                yield utils.load_json(entry.path)
+
+
+def __load_selected_issues(parser, issue_keys: Iterable[str]) -> Iterator[dict]:
+    # Issues are loaded a batch at a time, so that a large range is never held in memory at once
+    issue_keys = iter(issue_keys)
+    while True:
+        batch = list(itertools.islice(issue_keys, ISSUE_BATCH_SIZE))
+        if not batch:
+            return
+        yield from parser.load_issues(batch)
+
+
+if __name__ == "__main__":
+    import report_generator
+    from jira_parser import JiraParser
+    from jira_parser.attachments import AttachmentMirror
+
+    args = __parse_arguments()
+    project = args.project
+    if args.concurrency < 1:
+        print("The concurrency should be a positive number. Aborting...")
+        exit(-1)
+    if args.metrics or args.metrics_output:
+        instrumentation.enable(args.metrics, args.metrics_output)
+
+    if args.issues:
+        ranges = report_generator.__define_issues(args.issues)
+        if not ranges:
+            print("Aborting...")
+            exit(-1)
+        parser = JiraParser(project, jira_server=args.jira_server)
+        issues = __load_selected_issues(parser, parser.iter_issue_keys(ranges))
+    else:
+        issues = __load_parsed_issues(project)
+
+    mirror = AttachmentMirror(project, args.concurrency)
+    mirrored = mirror.mirror(issues)
+    print("{}: downloaded {} attachments ({:.1f} MiB), {} of them duplicates stored once; {} were already mirrored"
+          .format(project, mirror.downloaded, mirror.downloaded_bytes / 2 ** 20, mirror.duplicates, mirrored))
+    if mirror.failed:
+        print("{}: {} attachments failed to download. Run again to retry them".format(project, mirror.failed))
+        exit(-1)
@@ -1,18 +1,40 @@
 import argparse
-from typing import List, Optional
-from jira.exceptions import JIRAError
+import bisect
+import hashlib
+import itertools
+import json
+import math
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
-import genreport
 import utils
+from utils import instrumentation
 
-__EXCLUDE_SECTIONS = {"summary", "description", "attachments", "commits", "pull_requests", "comments", "other_issues"}
+if TYPE_CHECKING:
+    from genreport.job_queue import JobQueue
+
+# Number of parsed issues kept in memory, shared by the reports
+ISSUE_CACHE_SIZE = 10000
+# Number of selected issues added to the job queue at once
+SELECTION_BATCH_SIZE = 500
 
 
 def __parse_arguments() -> argparse.Namespace:
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument("-p", "--project", help="Jira project in capital letters", required=True)
     arg_parser.add_argument("-i", "--issues", help="Issues to generate reports for, separated by comma and/or"
-                                                   "defined as ranges. For example, \"124,136-152,174\"", required=True)
+                                                   "defined as ranges. For example, \"124,136-152,174\"")
+    arg_parser.add_argument("-j", "--jql", help="Generate reports for the issues matching a JQL filter, e.g. "
+                                                "\"status = Resolved AND type = Bug AND created >= 2019-01-01\". "
+                                                "Combined with --issues, only the matching issues among them are "
+                                                "selected")
+    arg_parser.add_argument("-q", "--query", help="Generate reports for the issues whose summary, description or "
+                                                  "comments match a full-text query, e.g. \"RegionServer AND (OOM OR "
+                                                  "\\\"out of memory\\\")\". Combined with --issues, only the "
+                                                  "matching issues among them are selected")
     arg_parser.add_argument("-g", "--github", help="Target Jira project's GitHub repository")
     arg_parser.add_argument("-c", "--credentials", help="GitHub username and personal access token separated by comma. "
                                                         "Compulsory if GitHub repository is specified")
@@ -20,22 +42,63 @@ def __parse_arguments() -> argparse.Namespace:
     arg_parser.add_argument("-e", "--exclude", help="Sections to skip when generating report, separated by comma."
                                                     "Sections are: [summary, description, attachments, commits, "
                                                     "pull_requests, comments, other_issues]")
+    arg_parser.add_argument("-d", "--depth", help="Include issues at most this many links away from the reported "
+                                                  "issue as connected issues. Links are followed in both directions, "
+                                                  "so parsed issues linking to the reported one are included even at "
+                                                  "depth 1",
+                            type=int, default=1)
+    arg_parser.add_argument("--no-fragment-cache", help="Render every issue again instead of reusing the chapters "
+                                                        "cached in Projects/<project>/Fragments", action="store_true")
+    arg_parser.add_argument("--fragment-cache-size", help="Maximum size of the cache of rendered chapters in MiB",
+                            type=int, default=256)
+    arg_parser.add_argument("-a", "--attachments", help="Refer to attachments by their URLs, by links to their local "
+                                                        "copies downloaded with mirror_attachments.py or, for images, "
+                                                        "by embedding their local copies",
+                            choices=["link", "local", "embed"], default="link")
+    arg_parser.add_argument("--max-text-length", help="Number of characters of a description or a comment after which "
+                                                      "it is truncated, so that huge pasted logs do not slow LaTeX "
+                                                      "down", type=int, default=100000)
+    arg_parser.add_argument("--max-block-length", help="Number of characters of a code listing or a noformat block "
+                                                       "after which it is truncated", type=int, default=20000)
+    arg_parser.add_argument("--overflow", help="Refer to the whole of a truncated text by a link to the issue in Jira "
+                                               "or by a link to a text file inside Reports/Appendix",
+                            choices=["link", "appendix"], default="link")
+    arg_parser.add_argument("--book", help="Generate a single PDF named Reports/<BOOK>.pdf covering all the selected "
+                                           "issues, one chapter per issue without connected issues, instead of a "
+                                           "report per issue. Chapters are compiled by --workers at the same time "
+                                           "(requires pypdf)")
+    arg_parser.add_argument("--book-title", help="Title of the book. By default, its name is used")
+    arg_parser.add_argument("-w", "--workers", help="Number of reports generated at the same time", type=int,
+                            default=1)
+    arg_parser.add_argument("--max-attempts", help="Number of attempts to generate a report before giving up on it",
+                            type=int, default=3)
+    arg_parser.add_argument("--retry-backoff", help="Seconds to wait before the first retry of a report; the delay "
+                                                    "doubles with every attempt", type=float, default=5.0)
+    arg_parser.add_argument("-f", "--force", help="Generate again the reports generated by previous runs, which are "
+                                                  "skipped otherwise unless they were generated with other options or "
+                                                  "their PDF is missing", action="store_true")
+    arg_parser.add_argument("--jira-server", help="URL of the Jira server. By default, Apache Jira is used")
+    arg_parser.add_argument("--github-api", help="URL of the GitHub REST API. By default, api.github.com is used")
+    arg_parser.add_argument("--metrics", help="Print timings and counters of each stage at exit", action="store_true")
+    arg_parser.add_argument("--metrics-output", help="Export timings and counters at exit to a file: in Prometheus "
+                                                     "text format if it ends with .prom, in JSON otherwise")
     return arg_parser.parse_args()
 
 
-def __define_issues(issues_arg: str) -> Optional[List[str]]:
+def __define_issues(issues_arg: str) -> Optional[List[Tuple[int, int]]]:
     """
-    Split the string of issues into the list of issues. Returns None if failed to parse issues.
+    Split the string of issues into ranges of issue IDs, without expanding them. Ranges are sorted and the ones which
+    overlap or touch are merged. Returns None if failed to parse issues.
     :param issues_arg: String representing issues and issue ranges separated by comma
-    :return: List of parsed issues
+    :return: List of ranges of issue IDs, both ends included
     """
     if not issues_arg:
         print("You should specify at least one issue.")
         return None
-    issues = []
+    ranges = []
     for issues_entry in utils.split_and_strip(issues_arg, ','):
         if issues_entry.isdecimal():  # If it is a single issue
-            issues.append(issues_entry)
+            ranges.append((int(issues_entry), int(issues_entry)))
         else:
             issues_range = utils.split_and_strip(issues_entry, '-')  # Split the range of issues, e.g. 123-130
             if len(issues_range) != 2 or not issues_range[0].isdecimal() or not issues_range[1].isdecimal():
@@ -47,27 +110,117 @@ def __define_issues(issues_arg: str) -> Optional[List[str]]:
             if last_issue < first_issue:
                 print("The range should be from smaller to bigger.")
                 return None
+            ranges.append((first_issue, last_issue))
+
+    # Issues are sorted by their numeric IDs, so that e.g. 99 comes before 100
+    ranges.sort()
+    merged_ranges = [ranges[0]]
+    for first_issue, last_issue in ranges[1:]:
+        if first_issue <= merged_ranges[-1][1] + 1:
+            merged_ranges[-1] = (merged_ranges[-1][0], max(merged_ranges[-1][1], last_issue))
+        else:
+            merged_ranges.append((first_issue, last_issue))
+    return merged_ranges
+
+
+def __in_ranges(issue_key: str, ranges: List[Tuple[int, int]]) -> bool:
+    issue_id = int(issue_key.rsplit('-', 1)[1])
+    index = bisect.bisect_right(ranges, (issue_id, math.inf)) - 1
+    return index >= 0 and ranges[index][0] <= issue_id <= ranges[index][1]
 
-            for issue in range(first_issue, last_issue + 1):
-                issues.append(str(issue))
-    issues.sort()
-    return issues
 
+def __batches(iterable: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
-def __validate_exclude_list(exclude_list: List[str]) -> List[str]:
+
+def __work(queue: "JobQueue", generate: Callable[[str], None], selection_done: threading.Event) -> None:
     """
-    Returns the list of invalid sections to exclude.
-    :param exclude_list: List of sections to check for being valid
-    :return: List of invalid sections
+    Generate reports for the jobs of the queue until none is left. Jira and network errors (e.g. Jira being
+    unavailable or rate limiting) are retried later, while any other error, e.g. an issue which does not exist or
+    pdflatex failing on a report, fails its job for good.
+    :param queue: Queue of jobs
+    :param generate: Function generating the report of an issue
+    :param selection_done: Event set once all the selected issues are in the queue
+    :return: None
     """
-    return [exclude for exclude in exclude_list if exclude not in __EXCLUDE_SECTIONS]
+    from jira.exceptions import JIRAError
+    from github.GithubException import RateLimitExceededException
+    from requests.exceptions import RequestException
+    transient_errors = (RateLimitExceededException, RequestException, ConnectionError, TimeoutError)
+    while True:
+        job = queue.claim()
+        if job is None:
+            delay = queue.next_retry_delay()
+            if delay is None:
+                if selection_done.is_set():
+                    return
+                # More issues may still be selected
+                selection_done.wait(0.1)
+                continue
+            time.sleep(min(delay, 1.0))
+            continue
+
+        issue_key, attempt = job
+        print("{}: generating report{}".format(issue_key, " (attempt {})".format(attempt) if attempt > 1 else ""))
+        start = time.perf_counter()
+        error, retry = None, True
+        try:
+            with instrumentation.span("report.total", issue_key):
+                generate(issue_key)
+        except JIRAError as jira_error:
+            if jira_error.status_code == 404:
+                error, retry = "issue does not exist", False
+            else:
+                error = "Jira error {}: {}".format(jira_error.status_code, jira_error.text)
+        except transient_errors as exception:
+            error = "".join(traceback.format_exception_only(type(exception), exception)).strip()
+        except (Exception, SystemExit) as exception:
+            traceback.print_exc()
+            error, retry = "".join(traceback.format_exception_only(type(exception), exception)).strip(), False
+
+        if error is None:
+            queue.complete(issue_key, time.perf_counter() - start)
+        elif queue.fail(issue_key, error, retry):
+            print("{}: failed ({}). Retrying later...".format(issue_key, error))
+        else:
+            print("{}: failed ({}). Skipping...".format(issue_key, error))
+
+
+def __options_digest(github: Optional[str], bots: Optional[List[str]], exclude: Optional[List[str]],
+                     depth: int, attachments: str, render_policy: "utils.RenderPolicy") -> str:
+    """
+    Digest of the options the contents of reports depend on, so that reports generated with other options are
+    generated again.
+    :return: Hexadecimal SHA-1 of the options
+    """
+    options = [github, sorted(bots or []), sorted(exclude or []), depth, attachments, render_policy.key()]
+    return hashlib.sha1(json.dumps(options).encode()).hexdigest()
 
 
 if __name__ == "__main__":
-    github, github_credentials, bots, issues, exclude = None, None, None, None, None
+    github, github_credentials, bots, ranges, exclude = None, None, None, None, None
 
     args = __parse_arguments()
     project = args.project
+    if args.depth < 1:
+        print("The depth should be a positive number. Aborting...")
+        exit(-1)
+    if args.workers < 1 or args.max_attempts < 1:
+        print("The number of workers and attempts should be positive numbers. Aborting...")
+        exit(-1)
+    if args.fragment_cache_size < 1:
+        print("The size of the fragment cache should be a positive number. Aborting...")
+        exit(-1)
+    if args.max_text_length < 1 or args.max_block_length < 1:
+        print("The maximum lengths of texts and blocks should be positive numbers. Aborting...")
+        exit(-1)
+    if args.metrics or args.metrics_output:
+        instrumentation.enable(args.metrics, args.metrics_output)
 
     # If GitHub repository and credentiols are specified
     if args.github:
@@ -87,27 +240,152 @@ if __name__ == "__main__":
     # If the list of sections to exclude is specified
     if args.exclude:
         exclude = utils.split_and_strip(args.exclude, ',')
-        invalid_sections = __validate_exclude_list(exclude)
+        invalid_sections = utils.validate_exclude_list(exclude)
         if invalid_sections:
             print("Invalid sections to exclude: {}. Aborting...".format(", ".join(invalid_sections)))
             exit(-1)
-        elif len(exclude) == 7:
+        elif len(exclude) == len(utils.EXCLUDE_SECTIONS):
             print("All sections are excluded. Aborting...")
             exit(0)
 
-    issues = __define_issues(args.issues)
-    # If the list of issues passed is invalid (e.g. they are passed as an empty string
-    # or string containing invalid characters.
-    if not issues:
-        print("Aborting...")
-        exit(-1)
+    if args.issues or not (args.query or args.jql):
+        ranges = __define_issues(args.issues)
+        # If the list of issues passed is invalid (e.g. they are passed as an empty string
+        # or string containing invalid characters.
+        if not ranges:
+            print("Aborting...")
+            exit(-1)
+    matching_keys = None
+    if args.query:
+        from jira_parser.search_index import SearchIndex, SearchError
+        try:
+            search_index = SearchIndex(project)
+            search_index.refresh()
+            matching_keys = search_index.search(args.query)
+            search_index.close()
+        except SearchError as error:
+            print("{}. Aborting...".format(error))
+            exit(-1)
+        print("{}: {} issues match the query".format(project, len(matching_keys)))
+        if not matching_keys:
+            exit(0)
+
+    # Report generation pulls in Jira, GitHub and LaTeX libraries, which take a while to import, so they are only
+    # loaded once the arguments are known to be valid.
+    from jira.exceptions import JIRAError
+    import genreport
+    from genreport.fragment_cache import FragmentCache
+    from genreport.job_queue import JobQueue
+    from jira_parser import JiraParser
+    from jira_parser.link_graph import LinkGraph
+    from jira_parser.attachments import AttachmentMirror
 
-    for issue in issues:
-        issue_key = "{}-{}".format(project, issue)
-        print("{}: generating report".format(issue_key))
+    # The cache is shared by all the reports, so issues connected with several of them are rendered once
+    fragment_cache = None
+    if not args.no_fragment_cache:
+        fragment_cache = FragmentCache(os.path.join("Projects", project, "Fragments"),
+                                       args.fragment_cache_size * 2 ** 20)
+
+    # The workers share the parser, the link graph and the GitHub fetcher, so that their caches are reused
+    parser = JiraParser(project, jira_server=args.jira_server, issue_cache_size=ISSUE_CACHE_SIZE)
+    link_graph = LinkGraph(project)
+    attachment_mirror = AttachmentMirror(project) if args.attachments != "link" else None
+    render_policy = utils.RenderPolicy(args.max_text_length, args.max_block_length, overflow=args.overflow)
+    github_fetcher = None
+    if github:
+        from github.GithubException import UnknownObjectException, BadCredentialsException
+        from github_fetcher import GitHubFetcher
         try:
-            generator = genreport.ReportGenerator(project, issue_key, github, github_credentials, bots, exclude)
-            generator.generate_report()
-        except JIRAError:
-            print("{}: issue does not exist. Aborting...".format(issue_key))
+            github_fetcher = GitHubFetcher(project, github.replace("https://github.com/", ""), github_credentials,
+                                           args.github_api)
+            github_fetcher.load_index()
+        except UnknownObjectException:
+            print("Invalid GitHub repository. Aborting...")
+            exit(-1)
+        except BadCredentialsException:
+            print("Invalid GitHub credentials. Aborting...")
             exit(-1)
+
+    def create_generator(issue_key: str, excluded: List[str] = exclude) -> "genreport.ReportGenerator":
+        return genreport.ReportGenerator(project, issue_key, github, github_credentials, bots, excluded,
+                                         args.jira_server, args.github_api, args.depth, fragment_cache, parser,
+                                         link_graph, github_fetcher, args.attachments, attachment_mirror,
+                                         render_policy)
+
+    def generate(issue_key: str) -> None:
+        create_generator(issue_key).generate_report()
+
+    # Issues are selected lazily: reports are queued a batch at a time, while the workers already consume the queue
+    if matching_keys is not None and not args.jql:
+        issue_keys = [issue_key for issue_key in matching_keys if ranges is None or __in_ranges(issue_key, ranges)]
+    else:
+        issue_keys = parser.iter_issue_keys(ranges, args.jql)
+        if matching_keys is not None:
+            matching_keys = set(matching_keys)
+            issue_keys = (issue_key for issue_key in issue_keys if issue_key in matching_keys)
+
+    if args.book:
+        from genreport.book import BookGenerator
+        try:
+            with instrumentation.span("report.select_issues"):
+                issue_keys = list(issue_keys)
+        except JIRAError as error:
+            print("Failed to select issues: {}. Aborting...".format(error.text or error.status_code))
+            exit(-1)
+        # A book has a chapter for each of its issues, so connected issues are left out
+        book = BookGenerator(args.book, issue_keys,
+                             lambda issue_key: create_generator(issue_key, (exclude or []) + ["other_issues"]),
+                             args.workers, args.book_title)
+        with instrumentation.span("report.book", args.book):
+            failures = book.generate()
+        with link_graph.lock:
+            link_graph.save()
+        for issue_key, error in failures:
+            print("\t{}: {}".format(issue_key, error))
+        if failures:
+            exit(-1)
+        exit(0)
+
+    # Jobs left pending by an interrupted run with the same options are finished as well
+    utils.create_dir_if_necessary(os.path.join("Projects", project))
+    queue = JobQueue(os.path.join("Projects", project, "report_jobs.sqlite"), args.max_attempts, args.retry_backoff,
+                     __options_digest(github, bots, exclude, args.depth, args.attachments, render_policy))
+    recovered = queue.recover()
+    if recovered:
+        print("{}: {} reports interrupted by the previous run are generated again".format(project, recovered))
+    # Workers are daemons, so that the run can be interrupted; the jobs they leave running are recovered next time
+    selection_done = threading.Event()
+    workers = [threading.Thread(target=__work, args=(queue, generate, selection_done), daemon=True)
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    # The queue records which jobs are selected by this run, so that only their number is kept here
+    selection_start, selected, remaining = time.time(), 0, 0
+    try:
+        with instrumentation.span("report.select_issues"):
+            for batch in __batches(issue_keys, SELECTION_BATCH_SIZE):
+                remaining += queue.add(batch, args.force,
+                                       lambda issue_key: os.path.isfile(os.path.join("Reports", issue_key + ".pdf")))
+                selected += len(batch)
+    except JIRAError as error:
+        print("Failed to select issues: {}. Aborting...".format(error.text or error.status_code))
+        exit(-1)
+    selection_done.set()
+    print("{}: {} of {} selected reports to generate".format(project, remaining, selected))
+    for worker in workers:
+        while worker.is_alive():
+            worker.join(timeout=1.0)
+
+    with link_graph.lock:
+        link_graph.save()
+    failures = queue.failures(selection_start)
+    print("{}: {} of {} reports are generated".format(project, selected - len(failures), selected))
+    for issue_key, attempts, error in failures:
+        print("\t{}: {} (attempts: {})".format(issue_key, error, attempts))
+    queue.close()
+
+    if fragment_cache and fragment_cache.hits + fragment_cache.misses:
+        print("{}: {} of {} chapters taken from the fragment cache".format(
+            project, fragment_cache.hits, fragment_cache.hits + fragment_cache.misses))
+    if failures:
+        exit(-1)
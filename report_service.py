@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import utils
+from utils import instrumentation
+
+
+def __parse_arguments() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description="Serve reports of the issues of a project over a local HTTP API")
+    arg_parser.add_argument("-p", "--project", help="Jira project in capital letters", required=True)
+    arg_parser.add_argument("-g", "--github", help="Target Jira project's GitHub repository")
+    arg_parser.add_argument("-c", "--credentials", help="GitHub username and personal access token separated by comma. "
+                                                        "Compulsory if GitHub repository is specified")
+    arg_parser.add_argument("-b", "--bots", help="List of bots to exclude from reports, separated by comma")
+    arg_parser.add_argument("-e", "--exclude", help="Sections to skip when generating reports, separated by comma."
+                                                    "Sections are: [summary, description, attachments, commits, "
+                                                    "pull_requests, comments, other_issues]")
+    arg_parser.add_argument("-d", "--depth", help="Include issues at most this many links away from the reported "
+                                                  "issue as connected issues. Links are followed in both directions, "
+                                                  "so parsed issues linking to the reported one are included even at "
+                                                  "depth 1",
+                            type=int, default=1)
+    arg_parser.add_argument("--host", help="Address to listen on", default="127.0.0.1")
+    arg_parser.add_argument("--port", help="Port to listen on", type=int, default=8080)
+    arg_parser.add_argument("--workers", help="Number of reports generated at the same time", type=int, default=2)
+    arg_parser.add_argument("--issue-cache-size", help="Number of parsed issues kept in memory", type=int,
+                            default=10000)
+    arg_parser.add_argument("--fragment-cache-size", help="Maximum size of the cache of rendered chapters in MiB",
+                            type=int, default=256)
+    arg_parser.add_argument("--jira-server", help="URL of the Jira server. By default, Apache Jira is used")
+    arg_parser.add_argument("--github-api", help="URL of the GitHub REST API. By default, api.github.com is used")
+    arg_parser.add_argument("--metrics", help="Print timings and counters of each stage at exit", action="store_true")
+    arg_parser.add_argument("--metrics-output", help="Export timings and counters at exit to a file: in Prometheus "
+                                                     "text format if it ends with .prom, in JSON otherwise")
+    return arg_parser.parse_args()
+
+
+class ReportService:
+    def __init__(self, project: str, github_repository: str = None, github_credentials: Tuple[str, str] = None,
+                 bots: List[str] = None, exclude: List[str] = None, depth: int = 1, jira_server: str = None,
+                 github_api: str = None, workers: int = 2, issue_cache_size: int = 10000,
+                 fragment_cache_size: int = 256 * 2 ** 20):
+        """
+        Generator of reports living as long as the process, so that the clients, the parsed issues, the link graph,
+        the index of commits and pull requests and the rendered chapters stay in memory between reports.
+        Reports are generated by a pool of workers. A report requested while it is already being generated is not
+        generated twice: the callers share the running build.
+        """
+        import genreport
+        from genreport.fragment_cache import FragmentCache
+        from jira_parser import JiraParser
+        from jira_parser.link_graph import LinkGraph
+
+        self.genreport = genreport
+        self.project = project
+        self.github_repository = github_repository
+        self.credentials = github_credentials
+        self.bots = bots or []
+        self.exclude = exclude or []
+        self.depth = depth
+        self.jira_server = jira_server
+        self.github_api = github_api
+        self.workers = workers
+        self.key_pattern = re.compile(re.escape(project) + r"-\d+")
+
+        self.parser = JiraParser(project, jira_server=jira_server, issue_cache_size=issue_cache_size)
+        self.link_graph = LinkGraph(project)
+        self.github_fetcher = None
+        if github_repository:
+            from github_fetcher import GitHubFetcher
+            self.github_fetcher = GitHubFetcher(project, github_repository.replace("https://github.com/", ""),
+                                                github_credentials, github_api)
+            print("{}: indexing commits and pull requests".format(project))
+            self.github_fetcher.load_index()
+        self.fragment_cache = FragmentCache(os.path.join("Projects", project, "Fragments"), fragment_cache_size)
+
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.builds: Dict[str, dict] = dict()  # Last build of each issue
+        self.futures: Dict[str, Future] = dict()  # Builds which are queued or running
+        self.coalesced = 0  # Requests which joined a running build
+        self.started = time.time()
+
+    @staticmethod
+    def pdf_path(issue_key: str) -> str:
+        return os.path.join("Reports", issue_key + ".pdf")
+
+    def request(self, issue_key: str) -> Tuple[dict, Future]:
+        """
+        Generate the report of the issue, unless it is already being generated, in which case the running build is
+        joined.
+        :param issue_key: Key of the issue
+        :return: Tuple of the status of the build and its future
+        """
+        with self.lock:
+            future = self.futures.get(issue_key)
+            if future is not None:
+                build = self.builds[issue_key]
+                build["coalesced"] += 1
+                self.coalesced += 1
+                instrumentation.count("service.coalesced_requests")
+                return dict(build), future
+            build = {"issue_key": issue_key, "status": "queued", "requested": time.time(), "seconds": None,
+                     "error": None, "coalesced": 0}
+            self.builds[issue_key] = build
+            future = self.executor.submit(self.__build, build)
+            self.futures[issue_key] = future
+            return dict(build), future
+
+    def status(self, issue_key: str) -> Optional[dict]:
+        """
+        Status of the last build of the report of the issue. A report generated before the service started is
+        reported as done.
+        :param issue_key: Key of the issue
+        :return: Dictionary describing the build or None if the report was never generated
+        """
+        with self.lock:
+            build = self.builds.get(issue_key)
+            if build is not None:
+                return dict(build)
+        if os.path.isfile(self.pdf_path(issue_key)):
+            return {"issue_key": issue_key, "status": "done"}
+        return None
+
+    def stats(self) -> dict:
+        with self.lock:
+            statuses = [build["status"] for build in self.builds.values()]
+            coalesced = self.coalesced
+        return {
+            "project": self.project,
+            "uptime_seconds": time.time() - self.started,
+            "workers": self.workers,
+            "builds": {status: statuses.count(status) for status in ["queued", "running", "done", "failed"]},
+            "coalesced_requests": coalesced,
+            "fragment_cache": {"hits": self.fragment_cache.hits, "misses": self.fragment_cache.misses}
+        }
+
+    def __build(self, build: dict) -> dict:
+        from jira.exceptions import JIRAError
+        issue_key = build["issue_key"]
+        with self.lock:
+            build["status"] = "running"
+        print("{}: generating report".format(issue_key))
+        start = time.perf_counter()
+        status, error = "done", None
+        try:
+            with instrumentation.span("report.total", issue_key):
+                with self.link_graph.lock:
+                    # Issues parsed by other processes since the last report
+                    self.link_graph.refresh()
+                generator = self.genreport.ReportGenerator(self.project, issue_key, self.github_repository,
+                                                           self.credentials, self.bots, self.exclude,
+                                                           self.jira_server, self.github_api, self.depth,
+                                                           self.fragment_cache, self.parser, self.link_graph,
+                                                           self.github_fetcher)
+                generator.generate_report()
+        except JIRAError as jira_error:
+            status = "failed"
+            if jira_error.status_code == 404:
+                error = "Issue does not exist"
+            else:
+                error = "Jira error {}: {}".format(jira_error.status_code, jira_error.text)
+        except (Exception, SystemExit) as exception:
+            traceback.print_exc()
+            status = "failed"
+            error = "".join(traceback.format_exception_only(type(exception), exception)).strip()
+        with self.lock:
+            build["status"], build["error"] = status, error
+            build["seconds"] = time.perf_counter() - start
+            del self.futures[issue_key]
+            return dict(build)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+        with self.link_graph.lock:
+            self.link_graph.save()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the service:
+        GET  /status               Statistics of the service
+        GET  /reports/<key>        Status of the last build of the report of the issue
+        GET  /reports/<key>.pdf    Report of the issue
+        POST /reports/<key>        Generate the report of the issue; with "?wait=1", respond once it is generated
+    """
+    service: ReportService = None
+
+    def __send_json(self, status: int, obj: dict) -> None:
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __issue_key(self, path: str) -> Optional[str]:
+        issue_key = path[len("/reports/"):] if path.startswith("/reports/") else None
+        if issue_key is None or not self.service.key_pattern.fullmatch(issue_key):
+            self.__send_json(404, {"error": "Unknown path {}".format(path)})
+            return None
+        return issue_key
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/status":
+            self.__send_json(200, self.service.stats())
+            return
+        if path.endswith(".pdf"):
+            issue_key = self.__issue_key(path[:-len(".pdf")])
+            if issue_key is None:
+                return
+            pdf_path = ReportService.pdf_path(issue_key)
+            if not os.path.isfile(pdf_path):
+                self.__send_json(404, {"error": "The report of {} is not generated".format(issue_key)})
+                return
+            with open(pdf_path, "rb") as file:
+                body = file.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        issue_key = self.__issue_key(path)
+        if issue_key is None:
+            return
+        build = self.service.status(issue_key)
+        if build is None:
+            self.__send_json(404, {"error": "The report of {} was never requested".format(issue_key)})
+        else:
+            self.__send_json(200, build)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        issue_key = self.__issue_key(url.path)
+        if issue_key is None:
+            return
+        build, future = self.service.request(issue_key)
+        if parse_qs(url.query).get("wait", ["0"])[0] in ["0", "false"]:
+            self.__send_json(202, build)
+            return
+        build = future.result()
+        self.__send_json(200 if build["status"] == "done" else 500, build)
+
+
+if __name__ == "__main__":
+    args = __parse_arguments()
+    github_credentials, bots, exclude = None, None, None
+    if args.depth < 1 or args.workers < 1 or args.issue_cache_size < 0 or args.fragment_cache_size < 1:
+        print("The depth, the number of workers and the sizes of the caches should be positive numbers. Aborting...")
+        exit(-1)
+    if args.github:
+        if args.credentials is None:
+            print("You should specify GitHub credentials as well. For example:\n"
+                  "--credentials \"github_username,personal access token\"\n"
+                  "-c \"github_username, personal access token\"")
+            exit(-1)
+        github_credentials = utils.define_github_credentials(args.credentials)
+    if args.bots:
+        bots = utils.split_and_strip(args.bots, ',')
+    if args.exclude:
+        exclude = utils.split_and_strip(args.exclude, ',')
+        invalid_sections = utils.validate_exclude_list(exclude)
+        if invalid_sections:
+            print("Invalid sections to exclude: {}. Aborting...".format(", ".join(invalid_sections)))
+            exit(-1)
+    if args.metrics or args.metrics_output:
+        instrumentation.enable(args.metrics, args.metrics_output)
+
+    service = ReportService(args.project, args.github, github_credentials, bots, exclude, args.depth,
+                            args.jira_server, args.github_api, args.workers, args.issue_cache_size,
+                            args.fragment_cache_size * 2 ** 20)
+    _Handler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    server.daemon_threads = True
+    print("{}: serving reports on http://{}:{}".format(args.project, args.host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
@@ -0,0 +1,34 @@
+import pytest
+
+from benchmarks.fake_server import FakeServer, FakeData
+from benchmarks.synthetic import SyntheticCorpus
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # The pipeline keeps its data in Projects/ and Reports/ relative to the current directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def corpus():
+    return SyntheticCorpus("TEST", issues=120, seed=1, comments=2)
+
+
+@pytest.fixture
+def serve(corpus):
+    """
+    Start fake Jira and GitHub servers serving the corpus with the given FakeServer options. They are stopped at the
+    end of the test.
+    """
+    servers = []
+
+    def start(**options) -> FakeServer:
+        server = FakeServer(FakeData.from_corpus(corpus), **options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
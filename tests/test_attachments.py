@@ -0,0 +1,74 @@
+import hashlib
+import os
+import re
+
+from benchmarks.fake_server import attachment_content
+from jira_parser import JiraParser
+from jira_parser import attachments
+from jira_parser.attachments import AttachmentMirror
+
+
+def fetch_parsed_issues(corpus, server):
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+    return list(parser.iter_parse_issues(parser.iter_fetch_issues_raw()))
+
+
+def expected_content(url):
+    attachment_id, filename = re.search(r"/secure/attachment/(\d+)/([^/]+)$", url).groups()
+    return attachment_content(int(attachment_id), filename)
+
+
+def attachment_urls(issues):
+    return {attachment["content"] for issue in issues for attachment in issue["attachments"]}
+
+
+def test_mirror_downloads_the_attachments_of_fetched_issues(workdir, corpus, serve):
+    server = serve()
+    issues = fetch_parsed_issues(corpus, server)
+    urls = attachment_urls(issues)
+    assert urls and all(url.startswith(server.jira_url) for url in urls)
+
+    mirror = AttachmentMirror(corpus.project)
+    assert mirror.mirror(issues) == 0
+
+    assert (mirror.downloaded, mirror.failed) == (len(urls), 0)
+    for url in urls:
+        with open(mirror.local_path(url), "rb") as file:
+            assert file.read() == expected_content(url)
+
+    # A new mirror reads the index and downloads nothing
+    requests = server.stats["endpoints"]["jira:attachment"]
+    assert AttachmentMirror(corpus.project).mirror(issues) == len(urls)
+    assert server.stats["endpoints"]["jira:attachment"] == requests
+
+
+def test_mirror_retries_failed_downloads(workdir, corpus, serve, monkeypatch):
+    monkeypatch.setattr(attachments, "RETRIES", 8)
+    monkeypatch.setattr(attachments, "BACKOFF_SECONDS", 0.001)
+    server = serve()
+    issues = fetch_parsed_issues(corpus, server)
+    server.error_rate = 0.3
+
+    mirror = AttachmentMirror(corpus.project, concurrency=4)
+    mirror.mirror(issues)
+
+    assert server.stats["errors"] > 0
+    assert (mirror.downloaded, mirror.failed) == (len(attachment_urls(issues)), 0)
+
+
+def test_mirror_continues_partial_downloads(workdir, corpus, serve):
+    server = serve()
+    issues = fetch_parsed_issues(corpus, server)
+    url = sorted(attachment_urls(issues))[0]
+    content = expected_content(url)
+    mirror = AttachmentMirror(corpus.project)
+    os.makedirs(mirror.partial_dir)
+    with open(os.path.join(mirror.partial_dir, hashlib.sha256(url.encode()).hexdigest()), "wb") as file:
+        file.write(content[:100])
+
+    mirror.mirror(issues)
+
+    assert server.stats["endpoints"]["jira:attachment_range"] == 1
+    with open(mirror.local_path(url), "rb") as file:
+        assert file.read() == content
+    assert os.listdir(mirror.partial_dir) == []
@@ -0,0 +1,57 @@
+import os
+
+import utils
+from github_fetcher import GitHubFetcher
+
+
+def create_fetcher(corpus, server):
+    return GitHubFetcher(corpus.project, server.github_repository, ("user", "token"), server.github_url)
+
+
+def test_fetch_commits_pages_through_all_commits(workdir, corpus, serve):
+    server = serve(max_page_size=7)
+    fetcher = create_fetcher(corpus, server)
+
+    commits = fetcher.fetch_commits()
+
+    assert commits == corpus.commits()
+    assert server.stats["endpoints"]["github:commits"] == (len(commits) + 6) // 7
+    assert os.path.isfile(os.path.join("Projects", corpus.project, "Commits", "all.json"))
+
+
+def test_fetch_commits_of_an_issue(workdir, corpus, serve):
+    fetcher = create_fetcher(corpus, serve())
+    issue_key = corpus.commits()[0]["message"].split(":")[0]
+
+    commits = fetcher.fetch_commits(issue_key)
+
+    assert commits == [commit for commit in corpus.commits() if commit["message"].startswith(issue_key + ":")]
+    assert os.path.isfile(os.path.join("Projects", corpus.project, "Commits", issue_key + ".json"))
+
+
+def test_fetch_pull_requests_with_their_comments(workdir, corpus, serve):
+    server = serve(max_page_size=5)
+    fetcher = create_fetcher(corpus, server)
+
+    pull_requests = fetcher.fetch_pull_requests()
+
+    assert pull_requests == corpus.pull_requests()
+    assert server.stats["endpoints"]["github:pulls"] == (len(pull_requests) + 4) // 5
+
+
+def test_lookups_read_the_fetched_commits_and_pull_requests(workdir, corpus, serve):
+    server = serve()
+    fetcher = create_fetcher(corpus, server)
+    fetcher.fetch_commits()
+    fetcher.fetch_pull_requests()
+    requests = server.stats["requests"]
+    pull_request = corpus.pull_requests()[0]
+    issue_key = pull_request["title"].split(":")[0]
+
+    assert fetcher.get_pull_requests(issue_key) == [
+        pr for pr in corpus.pull_requests()
+        if issue_key in utils.extract_issues(pr["title"], corpus.project) | utils.extract_issues(pr["body"],
+                                                                                                 corpus.project)]
+    assert fetcher.get_commits(issue_key) == [commit for commit in corpus.commits()
+                                              if commit["message"].startswith(issue_key + ":")]
+    assert server.stats["requests"] == requests
@@ -0,0 +1,112 @@
+import itertools
+import os
+
+import pytest
+
+import utils
+from jira_parser import FETCH_ENGINES, JiraParser
+from jira_parser import async_fetch
+
+
+def all_keys(corpus):
+    return sorted("{}-{}".format(corpus.project, issue_id) for issue_id in range(1, corpus.issues + 1))
+
+
+def fetch_keys(parser, **options):
+    return [issue["key"] for issue in parser.iter_fetch_issues_raw(**options)]
+
+
+def load_manifest(parser):
+    return utils.load_json(os.path.join(parser.project_dir, "fetch_manifest.json"))
+
+
+@pytest.mark.parametrize("engine", FETCH_ENGINES)
+def test_fetch_pages_through_all_issues(workdir, corpus, serve, engine):
+    # The server returns fewer issues per page than the 100 requested
+    server = serve(max_page_size=25)
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+
+    keys = fetch_keys(parser, engine=engine)
+
+    assert sorted(keys) == all_keys(corpus)
+    assert len(os.listdir(parser.issues_raw_dir)) == corpus.issues
+    manifest = load_manifest(parser)
+    assert manifest["finished"]
+    assert manifest["page_size"] == 25
+    assert manifest["completed_pages"] == list(range(0, corpus.issues, 25))
+    assert manifest["failed_remote_links"] == []
+    issue = parser.load_issue_raw("TEST-7")
+    assert issue["fields"]["summary"] == corpus.raw_issue(7)["fields"]["summary"]
+    assert issue["remotelinks"] == corpus.raw_issue(7)["remotelinks"]
+
+
+def test_engines_fetch_the_same_issues(workdir, corpus, serve):
+    server = serve(max_page_size=50)
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+
+    fetched = [{issue["key"]: issue for issue in parser.iter_fetch_issues_raw(save=False, engine=engine)}
+               for engine in FETCH_ENGINES]
+
+    assert fetched[0] == fetched[1]
+
+
+@pytest.mark.parametrize("engine,resume_engine", list(itertools.product(FETCH_ENGINES, repeat=2)))
+def test_interrupted_fetch_resumes_with_the_missing_pages(workdir, corpus, serve, engine, resume_engine):
+    server = serve(max_page_size=20)
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+    issues = parser.iter_fetch_issues_raw(engine=engine)
+    next(issues)
+    issues.close()
+    manifest = load_manifest(parser)
+    assert not manifest["finished"]
+    completed = manifest["completed_pages"]
+    assert 1 <= len(completed) < corpus.issues // 20
+
+    resumed_keys = fetch_keys(parser, engine=resume_engine, resume=True)
+
+    # Only the pages missing from the manifest are fetched again
+    assert len(resumed_keys) == corpus.issues - 20 * len(completed)
+    assert sorted(os.path.splitext(name)[0] for name in os.listdir(parser.issues_raw_dir)) == all_keys(corpus)
+    assert load_manifest(parser)["finished"]
+    assert fetch_keys(parser, engine=resume_engine, resume=True) == []
+
+
+def test_resume_with_another_page_size_fetches_from_scratch(workdir, corpus, serve):
+    server = serve(max_page_size=20)
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+    issues = parser.iter_fetch_issues_raw()
+    next(issues)
+    issues.close()
+
+    # Pages of 30 issues do not line up with the recorded pages of 20 issues
+    server = serve(max_page_size=30)
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+    keys = fetch_keys(parser, engine="async", resume=True)
+
+    assert sorted(keys) == all_keys(corpus)
+    assert load_manifest(parser)["page_size"] == 30
+
+
+def test_async_engine_waits_for_rate_limits(workdir, corpus, serve, monkeypatch):
+    monkeypatch.setattr(async_fetch, "RETRIES", 8)
+    server = serve(rate_limit=60, rate_window=1.0)
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+
+    keys = fetch_keys(parser, engine="async")
+
+    assert server.stats["rate_limited"] > 0
+    assert sorted(keys) == all_keys(corpus)
+    assert load_manifest(parser)["failed_remote_links"] == []
+
+
+def test_async_engine_retries_server_errors(workdir, corpus, serve, monkeypatch):
+    monkeypatch.setattr(async_fetch, "RETRIES", 8)
+    monkeypatch.setattr(async_fetch, "BACKOFF_SECONDS", 0.001)
+    server = serve(error_rate=0.2, seed=3)
+    parser = JiraParser(corpus.project, jira_server=server.jira_url)
+
+    keys = fetch_keys(parser, engine="async")
+
+    assert server.stats["errors"] > 0
+    assert sorted(keys) == all_keys(corpus)
+    assert load_manifest(parser)["failed_remote_links"] == []
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Command line entry points and the packages they import before parsing their arguments
+ENTRY_POINTS = ["analyzer", "report_generator", "report_service", "batch_analyzer", "mirror_attachments",
+                "convert_store", "benchmark", "genreport"]
+HEAVY_MODULES = ["matplotlib", "github", "pylatex", "numpy", "jira", "aiohttp"]
+
+
+@pytest.mark.parametrize("entry_point", ENTRY_POINTS)
+def test_entry_point_defers_heavy_imports(entry_point):
+    # A fresh interpreter, since the modules imported by other tests stay in sys.modules
+    code = "import sys, {}; print(' '.join(sorted(set(m.split('.')[0] for m in sys.modules))))".format(entry_point)
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPOSITORY_DIR, stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    imported = set(result.stdout.split())
+    assert not imported.intersection(HEAVY_MODULES), "{} imports {} at start-up".format(
+        entry_point, ", ".join(sorted(imported.intersection(HEAVY_MODULES))))
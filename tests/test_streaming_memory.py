@@ -0,0 +1,26 @@
+import tracemalloc
+
+import benchmarks
+from benchmarks.synthetic import SyntheticCorpus
+
+
+def stream_peak(corpus) -> int:
+    stopwatch = benchmarks.Stopwatch(trace_memory=True)
+    tracemalloc.start()
+    try:
+        benchmarks.bench_stream_issues(corpus, stopwatch, {"latency": 0.0})
+    finally:
+        tracemalloc.stop()
+    return stopwatch.peak_memory
+
+
+def test_streaming_memory_does_not_grow_with_the_number_of_issues(workdir):
+    # Imports and caches of the first run would otherwise be accounted to the small project
+    stream_peak(SyntheticCorpus("WARMUP", issues=20, seed=1))
+
+    small = stream_peak(SyntheticCorpus("SMALL", issues=150, seed=1))
+    large = stream_peak(SyntheticCorpus("LARGE", issues=600, seed=1))
+
+    # Fetching the large project in one piece takes nearly three times the peak of the small one
+    assert large < small * 1.5, "peak memory grows from {:.1f} MiB to {:.1f} MiB".format(small / 2 ** 20,
+                                                                                       large / 2 ** 20)
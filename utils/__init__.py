@@ -1,22 +1,50 @@
 import errno
 import json
 import os
+import threading
+from typing import Iterator
 
 from .ref_regex import *
 from .latex_transform import *
+from . import codec
 
 
 def save_as_json(obj: object, path: str) -> None:
-    with open(path, "w") as file:
-        json.dump(obj, file, indent=2)
+    """
+    Save the object with the codec of its directory (JSON by default, see utils.codec) atomically: it is written to
+    a temporary file first, which then replaces the target, so that an interrupted write never leaves a partially
+    written file behind.
+    :param obj: Object to save
+    :param path: Path to the file
+    :return: None
+    """
+    data = codec.encode(obj, *codec.store_codec(os.path.dirname(path)))
+    temp_path = "{}.{}-{}.tmp".format(path, os.getpid(), threading.get_ident())
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
 
 def load_json(path: str) -> dict:
-    with open(path, "r") as file:
-        loaded = json.load(file)
+    with open(path, "rb") as file:
+        loaded = codec.decode(file.read())
     return loaded
 
 
+def iter_json_array(path: str) -> Iterator[dict]:
+    """
+    Load the elements of an array saved with save_as_json one at a time.
+    :param path: Path to the file
+    :return: Generator of the elements
+    """
+    return codec.iter_array(path)
+
+
 def create_dir_if_necessary(dir_path: str) -> None:
     if not os.path.exists(dir_path):
         try:
@@ -38,6 +66,19 @@ def split_and_strip(string: str, split_by: str) -> List[str]:
     return [word.strip() for word in string.split(split_by)]
 
 
+# Sections of a report which can be excluded from it
+EXCLUDE_SECTIONS = {"summary", "description", "attachments", "commits", "pull_requests", "comments", "other_issues"}
+
+
+def validate_exclude_list(exclude_list: List[str]) -> List[str]:
+    """
+    Returns the list of invalid sections to exclude.
+    :param exclude_list: List of sections to check for being valid
+    :return: List of invalid sections
+    """
+    return [exclude for exclude in exclude_list if exclude not in EXCLUDE_SECTIONS]
+
+
 def construct_svn_revision_url(revision: str) -> str:
     """
     Extracts a revision ID and constructs a URL to SVN Apache.
@@ -0,0 +1,191 @@
+import gzip
+import io
+import json
+import os
+import threading
+from typing import Dict, IO, Iterator, Tuple
+
+# Codecs encoding objects to bytes. "json" is the original human-readable format and stays the default, "compact"
+# is JSON without whitespace and "msgpack" is a binary encoding (requires msgpack).
+CODECS = ["json", "compact", "msgpack"]
+# Compressions applied on top of a codec; "zstd" requires zstandard.
+COMPRESSIONS = ["none", "gzip", "zstd"]
+# File inside a store (a directory like Projects/<project>/Issues_raw) that selects the codec of the files written
+# to it. Files keep the .json extension whatever the codec is, since the format is recognized when they are loaded.
+CODEC_FILE = ".codec"
+STREAM_CHUNK_SIZE = 1 << 16
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# First bytes of a JSON document; MessagePack never starts with any of them
+JSON_START = frozenset(b'{["-0123456789tfn \t\r\n')
+
+_store_codecs: Dict[str, Tuple[str, str]] = {}
+_lock = threading.Lock()
+# Zstandard contexts are costly to create and not thread-safe, so each thread reuses its own
+_zstd = threading.local()
+
+
+def store_codec(directory: str) -> Tuple[str, str]:
+    """
+    Codec and compression of the files written to the directory, as configured in its ".codec" file.
+    :param directory: Directory of the store
+    :return: Tuple of the codec and compression names
+    """
+    directory = os.path.abspath(directory)
+    with _lock:
+        if directory not in _store_codecs:
+            path = os.path.join(directory, CODEC_FILE)
+            config = {}
+            if os.path.isfile(path):
+                with open(path, "r") as file:
+                    config = json.load(file)
+            _store_codecs[directory] = (config.get("codec", "json"), config.get("compression", "none"))
+        return _store_codecs[directory]
+
+
+def set_store_codec(directory: str, codec: str, compression: str = "none") -> None:
+    """
+    Select the codec and compression of the files written to the directory from now on. Existing files stay readable
+    but are not converted.
+    :param directory: Directory of the store
+    :param codec: One of CODECS
+    :param compression: One of COMPRESSIONS
+    :return: None
+    """
+    if codec not in CODECS:
+        raise ValueError("Unknown codec {}. Codecs are: {}".format(codec, ", ".join(CODECS)))
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression {}. Compressions are: {}".format(compression, ", ".join(COMPRESSIONS)))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, CODEC_FILE), "w") as file:
+        json.dump({"codec": codec, "compression": compression}, file)
+    with _lock:
+        _store_codecs[os.path.abspath(directory)] = (codec, compression)
+
+
+def __zstd_context(kind: str):
+    context = getattr(_zstd, kind, None)
+    if context is None:
+        import zstandard
+        context = zstandard.ZstdCompressor(level=3) if kind == "compressor" else zstandard.ZstdDecompressor()
+        setattr(_zstd, kind, context)
+    return context
+
+
+def encode(obj: object, codec: str = "json", compression: str = "none") -> bytes:
+    if codec == "json":
+        data = json.dumps(obj, indent=2).encode()
+    elif codec == "compact":
+        data = json.dumps(obj, separators=(",", ":")).encode()
+    elif codec == "msgpack":
+        import msgpack
+        data = msgpack.packb(obj, use_bin_type=True)
+    else:
+        raise ValueError("Unknown codec {}".format(codec))
+
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return __zstd_context("compressor").compress(data)
+    return data
+
+
+def decode(data: bytes) -> object:
+    """
+    Decode bytes produced by any of the codecs and compressions, recognizing them by their first bytes.
+    :param data: Encoded object
+    :return: Decoded object
+    """
+    if data.startswith(GZIP_MAGIC):
+        data = gzip.decompress(data)
+    elif data.startswith(ZSTD_MAGIC):
+        data = __zstd_context("decompressor").decompress(data, max_output_size=0)
+    if not data or data[0] in JSON_START:
+        return json.loads(data)
+    import msgpack
+    return msgpack.unpackb(data, raw=False)
+
+
+def __open_decompressed(path: str) -> IO[bytes]:
+    file = open(path, "rb")
+    magic = file.peek(4)[:4]
+    if magic.startswith(GZIP_MAGIC):
+        # GzipFile does not close a file object it is given, so the file is opened again by gzip itself
+        file.close()
+        return gzip.open(path, "rb")
+    if magic.startswith(ZSTD_MAGIC):
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(file, closefd=True)
+    return file
+
+
+def __iter_json(stream: IO[bytes]) -> Iterator[object]:
+    text = io.TextIOWrapper(stream, encoding="utf-8")
+    decoder = json.JSONDecoder()
+    buffer = text.read(STREAM_CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("The file does not contain a JSON array")
+    position = 1
+    eof = False
+    while True:
+        # Skip whitespace and separators between the elements
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+            # An element at the very end of the buffer (like a number) may continue in the next chunk
+            if end < len(buffer) or eof:
+                yield element
+                position = end
+                continue
+        except json.JSONDecodeError:
+            if eof:
+                raise
+        chunk = text.read(STREAM_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+class _Prepend(io.RawIOBase):
+    """
+    Stream returning the bytes already read from another stream before the rest of it.
+    """
+    def __init__(self, head: bytes, stream: IO[bytes]):
+        self.head = head
+        self.stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.head:
+            size = min(len(buffer), len(self.head))
+            buffer[:size] = self.head[:size]
+            self.head = self.head[size:]
+            return size
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_array(path: str) -> Iterator[object]:
+    """
+    Decode a file containing an array (like Projects/<project>/Commits/all.json) one element at a time, without
+    loading the whole array into memory.
+    :param path: Path to the file
+    :return: Generator of the elements of the array
+    """
+    with __open_decompressed(path) as stream:
+        first = stream.read(1)
+        stream = io.BufferedReader(_Prepend(first, stream)) if first else stream
+        if not first or first[0] in JSON_START:
+            yield from __iter_json(stream)
+        else:
+            import msgpack
+            unpacker = msgpack.Unpacker(stream, raw=False)
+            for _ in range(unpacker.read_array_header()):
+                yield unpacker.unpack()
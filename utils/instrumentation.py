@@ -0,0 +1,226 @@
+import atexit
+import heapq
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+SLOWEST_ITEMS = 10
+
+
+# Instrumentation is disabled by default, in which case span() returns this shared no-op context manager and count()
+# returns immediately, so instrumented code pays next to nothing.
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "item", "start")
+
+    def __init__(self, recorder: "Recorder", name: str, item: Optional[str]):
+        self.recorder = recorder
+        self.name = name
+        self.item = item
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.recorder.add_span(self.name, time.perf_counter() - self.start, self.item)
+        return False
+
+
+class _SpanStats:
+    __slots__ = ("count", "total", "minimum", "maximum", "slowest")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+        self.slowest: List[Tuple[float, str]] = []  # min-heap of the slowest items
+
+    def add(self, seconds: float, item: Optional[str]) -> None:
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+        if item is not None:
+            if len(self.slowest) < SLOWEST_ITEMS:
+                heapq.heappush(self.slowest, (seconds, item))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, item))
+
+
+class Recorder:
+    def __init__(self):
+        """
+        Thread-safe storage of span statistics and counters.
+        """
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.spans: Dict[str, _SpanStats] = {}
+        self.counters: Dict[str, float] = {}
+
+    def add_span(self, name: str, seconds: float, item: Optional[str] = None) -> None:
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = _SpanStats()
+            stats.add(seconds, item)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "wall_seconds": time.time() - self.started,
+                "spans": {
+                    name: {
+                        "count": stats.count,
+                        "total_seconds": stats.total,
+                        "min_seconds": stats.minimum,
+                        "max_seconds": stats.maximum,
+                        "slowest": [[item, seconds] for seconds, item in sorted(stats.slowest, reverse=True)]
+                    }
+                    for name, stats in sorted(self.spans.items())
+                },
+                "counters": dict(sorted(self.counters.items()))
+            }
+
+
+_recorder: Optional[Recorder] = None
+
+
+def enable(summary_at_exit: bool = False, output: str = None) -> Recorder:
+    """
+    Start recording spans and counters.
+    :param summary_at_exit: Whether to print a summary when the program exits
+    :param output: File to export the measurements to when the program exits. Files ending with ".prom" or ".txt"
+    are written in the Prometheus text format, others in JSON
+    :return: Recorder collecting the measurements
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+        if summary_at_exit:
+            atexit.register(lambda: print(summary()))
+        if output:
+            atexit.register(export, output)
+    return _recorder
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def span(name: str, item: str = None):
+    """
+    Measure the time spent inside a with-block.
+    :param name: Name of the stage, e.g. "jira.fetch_page"
+    :param item: Item processed inside the block (e.g. issue key), used to report the slowest items of a stage
+    :return: Context manager
+    """
+    if _recorder is None:
+        return _NULL_SPAN
+    return _Span(_recorder, name, item)
+
+
+def count(name: str, value: float = 1) -> None:
+    """
+    Increase a counter, e.g. "jira.http_requests".
+    :param name: Name of the counter
+    :param value: Value to add
+    :return: None
+    """
+    if _recorder is not None:
+        _recorder.count(name, value)
+
+
+def instrument_session(session, prefix: str) -> None:
+    """
+    Count HTTP requests and bytes received by a requests session as "<prefix>.http_requests" and
+    "<prefix>.http_bytes". Does nothing if instrumentation is disabled.
+    :param session: requests.Session to instrument
+    :param prefix: Prefix of the counters
+    :return: None
+    """
+    if _recorder is None:
+        return
+
+    def on_response(response, *args, **kwargs):
+        count(prefix + ".http_requests")
+        count(prefix + ".http_bytes", len(response.content or b""))
+        if response.status_code >= 400:
+            count(prefix + ".http_errors")
+
+    session.hooks.setdefault("response", []).append(on_response)
+
+
+def to_dict() -> dict:
+    return _recorder.to_dict() if _recorder else {"wall_seconds": 0, "spans": {}, "counters": {}}
+
+
+def to_prometheus(prefix: str = "genreport") -> str:
+    """
+    Render the measurements in the Prometheus text exposition format.
+    :param prefix: Prefix of the metric names
+    :return: Measurements in the Prometheus text format
+    """
+    data = to_dict()
+    lines = ["# TYPE {}_span_seconds summary".format(prefix)]
+    for name, stats in data["spans"].items():
+        lines.append('{}_span_seconds_count{{span="{}"}} {}'.format(prefix, name, stats["count"]))
+        lines.append('{}_span_seconds_sum{{span="{}"}} {:.6f}'.format(prefix, name, stats["total_seconds"]))
+    for name, value in data["counters"].items():
+        metric = "{}_{}_total".format(prefix, re.sub(r"[^a-zA-Z0-9_]", "_", name))
+        lines.append("# TYPE {} counter".format(metric))
+        lines.append("{} {}".format(metric, value))
+    return "\n".join(lines) + "\n"
+
+
+def export(path: str) -> None:
+    """
+    Export the measurements to a file: in the Prometheus text format if the file ends with ".prom" or ".txt",
+    in JSON otherwise.
+    :param path: Path to the file
+    :return: None
+    """
+    with open(path, "w") as file:
+        if path.endswith((".prom", ".txt")):
+            file.write(to_prometheus())
+        else:
+            json.dump(to_dict(), file, indent=2)
+
+
+def summary() -> str:
+    """
+    Render the measurements as a human-readable table.
+    :return: Summary of the measurements
+    """
+    data = to_dict()
+    lines = ["Run summary ({:.2f}s):".format(data["wall_seconds"])]
+    if data["spans"]:
+        lines.append("  {:<36}{:>8}{:>12}{:>12}{:>12}".format("stage", "count", "total, s", "mean, s", "max, s"))
+        for name, stats in data["spans"].items():
+            lines.append("  {:<36}{:>8}{:>12.3f}{:>12.4f}{:>12.4f}".format(
+                name, stats["count"], stats["total_seconds"], stats["total_seconds"] / stats["count"],
+                stats["max_seconds"]))
+            if stats["slowest"] and stats["count"] > 1:
+                lines.append("    slowest: " + ", ".join("{} ({:.3f}s)".format(item, seconds)
+                                                         for item, seconds in stats["slowest"][:3]))
+    for name, value in data["counters"].items():
+        lines.append("  {:<36}{:>12.0f}".format(name, value))
+    return "\n".join(lines)
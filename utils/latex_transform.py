@@ -1,15 +1,142 @@
+import itertools
 import re
-from typing import List, Tuple
-from pylatex.utils import escape_latex, NoEscape
+from typing import Callable, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from pylatex.utils import NoEscape
 
-def escape_noformat(string: str, to_latex: bool = True) -> Tuple[str, List[Tuple[str, str]]]:
+# LaTeX throws an error "Dimension too large" on very long lines of code listings, so they are wrapped after this many
+# characters
+MAX_LINE_LENGTH = 400
+# Where the whole of a truncated text is referred to: the issue in Jira or a text file next to the reports
+OVERFLOW_MODES = ["link", "appendix"]
+__CODE_TAG = re.compile(r"{code(:[^}]*)?}")
+
+
+class RenderPolicy:
+    def __init__(self, max_text_length: int = 100000, max_block_length: int = 20000, chunk_lines: int = 200,
+                 max_line_length: int = MAX_LINE_LENGTH, overflow: str = "link"):
+        """
+        Limits on the size of the texts rendered into reports, so that the time and the memory pdflatex takes stay
+        bounded whatever the size of comments and descriptions, e.g. with megabytes of pasted logs. Longer texts and
+        code listings or noformat blocks are cut at a line break, noting how much was omitted, and the whole text is
+        referred to as defined by overflow. Blocks are split into environments of at most chunk_lines lines, and
+        their lines are wrapped.
+        :param max_text_length: Maximum number of characters of a text
+        :param max_block_length: Maximum number of characters of a code listing or a noformat block
+        :param chunk_lines: Maximum number of lines of a LaTeX environment a block is rendered as
+        :param max_line_length: Maximum number of characters of a line of a block
+        :param overflow: Where the whole of a truncated text is referred to (see OVERFLOW_MODES)
+        """
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError("Truncated texts can be referred to in one of the modes: {}".format(
+                ", ".join(OVERFLOW_MODES)))
+        if min(max_text_length, max_block_length, chunk_lines, max_line_length) < 1:
+            raise ValueError("Limits of the size of texts should be positive numbers")
+        self.max_text_length = max_text_length
+        self.max_block_length = max_block_length
+        self.chunk_lines = chunk_lines
+        self.max_line_length = max_line_length
+        self.overflow = overflow
+
+    def key(self) -> list:
+        """
+        :return: Everything the rendering of a text depends on, e.g. to be a part of the key of a cached fragment
+        """
+        return [self.max_text_length, self.max_block_length, self.chunk_lines, self.max_line_length, self.overflow]
+
+
+def __cut(string: str, length: int) -> str:
+    """
+    Cut the string to at most length characters, at the last line break if there is one.
+    """
+    if len(string) <= length:
+        return string
+    cut = string.rfind('\n', 0, length)
+    return string[:cut if cut > 0 else length]
+
+
+def __wrap(lines: Iterator[str], length: int) -> Iterator[str]:
+    for line in lines:
+        if len(line) <= length:
+            yield line
+        else:
+            yield from (line[i:i + length] for i in range(0, len(line), length))
+
+
+def __render_block(body: str, environment: str, options: List[str], ending: str, policy: Optional[RenderPolicy],
+                   omitted: Optional[List[int]]) -> str:
+    """
+    Render the body of a code listing or a noformat block as LaTeX environments. Without a policy, a single
+    environment is produced and only the lines of code listings are wrapped.
+    :param body: Content of the block, starting with the rest of the line of its opening tag
+    :param environment: Name of the LaTeX environment, i.e. "lstlisting" or "spverbatim"
+    :param options: Options of the environment, e.g. the language of a code listing
+    :param ending: What follows the end of the last environment
+    :param policy: Limits on the size of the rendered block
+    :param omitted: List to append the number of characters omitted from the block to, if it is truncated
+    :return: LaTeX code of the block
+    """
+    listing = environment == "lstlisting"
+    if policy is None:
+        if listing:
+            body = '\n'.join(__wrap(iter(body.split('\n')), MAX_LINE_LENGTH))
+        return __begin(environment, options) + body + r"\end{" + environment + "}" + ending
+
+    truncated = __cut(body, policy.max_block_length)
+    omitted_length = len(body) - len(truncated)
+    # The first line is the rest of the line of the opening tag, which LaTeX ignores
+    first_line, _, body = truncated.partition('\n')
+    body = body[:-1] if body.endswith('\n') else body
+    lines = __wrap(iter(body.split('\n')), policy.max_line_length) if body else iter(())
+    chunks = []
+    line_number = 1
+    while True:
+        chunk = list(itertools.islice(lines, policy.chunk_lines))
+        if not chunk and chunks:
+            break
+        # Line numbers go on from the previous chunk
+        chunk_options = options + (["firstnumber={}".format(line_number)] if listing and chunks else [])
+        chunks.append(__begin(environment, chunk_options) + (first_line if not chunks else "") + '\n' +
+                      "".join(line + '\n' for line in chunk) + r"\end{" + environment + "}")
+        line_number += len(chunk)
+    rendered = '\n'.join(chunks) + ending
+    if omitted_length:
+        if omitted is not None:
+            omitted.append(omitted_length)
+        rendered += r"\textit{[" + "{} characters omitted".format(omitted_length) + "]} "
+    return rendered
+
+
+def __begin(environment: str, options: List[str]) -> str:
+    return r"\begin{" + environment + "}" + ("[" + ",".join(options) + "]" if options else "")
+
+
+def __truncate_text(string: str, length: int) -> Tuple[str, int]:
+    """
+    Cut the text to at most length characters, closing a code listing or a noformat block which is cut in its middle,
+    so that the rest of it is still rendered as a block.
+    :return: Tuple of the truncated text and the number of omitted characters
+    """
+    truncated = __cut(string, length)
+    omitted_length = len(string) - len(truncated)
+    if len(__CODE_TAG.findall(truncated)) % 2:
+        truncated += "{code}"
+    if truncated.count("{noformat}") % 2:
+        truncated += "{noformat}"
+    return truncated, omitted_length
+
+
+def escape_noformat(string: str, to_latex: bool = True, policy: RenderPolicy = None,
+                    omitted: List[int] = None) -> Tuple[str, List[Tuple[str, str]]]:
     """
     Given a string with Atlassian noformat blocks, replaces them with flags and returns a tuple of a string with flags
     and a list of noformats with corresponding flags. This is primarily used to avoid escaping LaTeX characters
     inside noformats.
     :param string: String to replace noformat at
     :param to_latex: Whether to convert listings to LaTeX format
+    :param policy: Limits on the size of the blocks converted to LaTeX format
+    :param omitted: List to append the number of characters omitted from each truncated block to
     :return: Tuple containing two values:
     1. String with all code listings replaced with flags of the form <<!PDFGENNOFORMAT123!>>,
     where 123 is the serial number of a noformat block
@@ -19,32 +146,37 @@ def escape_noformat(string: str, to_latex: bool = True) -> Tuple[str, List[Tuple
     """
     noformats = []
     noformat_index = 1
-    pattern = re.compile(r"{noformat}((?s).*?){noformat}")
+    pattern = re.compile(r"{noformat}((?s:.*?)){noformat}")
+    position = 0
 
     while True:
-        noformat = pattern.search(string)
+        noformat = pattern.search(string, position)
         if not noformat:
             break
         content = noformat.group(0)
         key = "<<!PDFGENNOFORMAT{}!>>".format(noformat_index)
         noformat_index += 1
-        string = string.replace(content, key)
+        # Only the block found is replaced, since the same block may occur several times
+        string = string[:noformat.start()] + key + string[noformat.end():]
+        position = noformat.start() + len(key)
 
         if to_latex:
-            content = content.replace(r"{noformat}", r"\begin{spverbatim}", 1)
-            content = content.replace(r"{noformat}", r"\end{spverbatim}\ ", 1)
+            content = __render_block(noformat.group(1), "spverbatim", [], r"\ ", policy, omitted)
 
         noformats.append((key, content))
     return string, noformats
 
 
-def escape_listings(string: str, to_latex: bool = True) -> Tuple[str, List[Tuple[str, str]]]:
+def escape_listings(string: str, to_latex: bool = True, policy: RenderPolicy = None,
+                    omitted: List[int] = None) -> Tuple[str, List[Tuple[str, str]]]:
     """
     Given a string with Atlassian code listings, replaces them with flags and returns a tuple of a string with flags
     and a list of code listings with corresponding flags. This is primarily used to avoid escaping LaTeX characters
     inside listings.
     :param string: String with Atlassian code listings
     :param to_latex: Whether to convert listings to LaTeX format
+    :param policy: Limits on the size of the listings converted to LaTeX format
+    :param omitted: List to append the number of characters omitted from each truncated listing to
     :return: Tuple containing two values:
     1. String with all code listings replaced with flags of the form <<!PDFGENCODE123!>>,
     where 123 is the serial number of a listing
@@ -54,21 +186,24 @@ def escape_listings(string: str, to_latex: bool = True) -> Tuple[str, List[Tuple
     """
     listings = []
     listing_index = 1
-    pattern = re.compile(r"(({code:((?s).*?)})|({code}))((?s).*?){code}")
+    pattern = re.compile(r"(({code:((?s:.*?))})|({code}))((?s:.*?)){code}")
     # This regex is written with intent to capture the programming language of the code block.
     # The code block starts with either {code:language} or with just {code}.
     # Since each code block ends with {code}, we first have to extract all code blocks that start with a language
     # defined, and only then - blocks without a language, otherwise, we can accidentally extract a text between the end
     # of one block and the start of another block.
+    position = 0
 
     while True:
-        listing = pattern.search(string)
+        listing = pattern.search(string, position)
         if not listing:
             break
         content = listing.group(0)
         key = "<<!PDFGENCODE{}!>>".format(listing_index)
         listing_index += 1
-        string = string.replace(content, key)
+        # Only the listing found is replaced, since the same listing may occur several times
+        string = string[:listing.start()] + key + string[listing.end():]
+        position = listing.start() + len(key)
         if to_latex:
             # If this value is true, then all code blocks starting with:
             #   {code:lang} are replaced by "\begin{lstlisting}[language=lang]"
@@ -76,46 +211,43 @@ def escape_listings(string: str, to_latex: bool = True) -> Tuple[str, List[Tuple
             # All endings are replaced by "\end{lstlisting}\ ". That extra whitespace is intentional, since in the
             # original text, there is a newline character, and PyLaTeX escapes it with a "\newline" command.
             # It is forbidden to include it after environments which are not fit right into the text.
-            language = re.search(r"{code:((?s).*?)}", content)
-
-            if language:
-                section = language.group(0)
-
-                language = language.group(1)
-                lang_spec = r"[language=" + language + r"]" if language.isalpha() else ""
-                content = content.replace(section, r"\begin{lstlisting}" + lang_spec, 1)
-            else:
-                content = content.replace(r"{code}", r"\begin{lstlisting}", 1)
-            content = content.replace(r"{code}", r"\end{lstlisting} \ ", 1)
-
-        if len(content) > 500:
-            lines = content.split(' \n') #This needs to be fixed. If can't be made generic, let's accept org name from genreport. 
-
-            for line in lines:
-                if len(line) > 400:
-                    # If the string length is too big, LaTeX throws an error "Dimension too large".
-                    # Unfortunately, I couldn't find what is the max dimension, so let's say that typical
-                    # line never exceeds 400 characters, and so, after each 400 characters in a line,
-                    # a newline character is inserted.
-                    content = '\n'.join(line[i:i + 400] for i in range(0, len(line), 400))
-            '\n'.join(lines)
+            language = listing.group(3)
+            options = ["language=" + language] if language and language.isalpha() else []
+            content = __render_block(listing.group(5), "lstlisting", options, r" \ ", policy, omitted)
         listings.append((key, content))
     return string, listings
 
 
-def escape_with_listings(string: str) -> NoEscape:
+def escape_with_listings(string: str, policy: RenderPolicy = None,
+                         overflow: Callable[[str], str] = None) -> "NoEscape":
     """
     Escape LaTeX characters except code listings. All Atlassian code listings and noformat blocks are converted
     to the corresponding LaTeX ones.
     :param string: String containing text without escaping and with Atlassian code listings
+    :param policy: Limits on the size of the rendered text. By default, the text is rendered whole
+    :param overflow: Function given the whole text if the policy truncates it, returning LaTeX code referring to it,
+    e.g. a link
     :return: Formatted string
     """
+    # PyLaTeX is only needed when a report is rendered, so it is imported here to keep the command line tools fast
+    # to start.
+    from pylatex.utils import escape_latex, NoEscape
+
     string = string.replace('\r\n', '\n').replace(' \n', '')
-    string, extracted_listing_blocks = escape_listings(string)
-    string, extracted_noformat_blocks = escape_noformat(string)
+    text, omitted, text_omitted = string, [], 0
+    if policy is not None and len(string) > policy.max_text_length:
+        # The text is cut before anything else, so that the time spent on it does not depend on its size
+        string, text_omitted = __truncate_text(string, policy.max_text_length)
+        omitted.append(text_omitted)
+    string, extracted_listing_blocks = escape_listings(string, policy=policy, omitted=omitted)
+    string, extracted_noformat_blocks = escape_noformat(string, policy=policy, omitted=omitted)
 
     string = escape_latex(string)
     for block in extracted_listing_blocks + extracted_noformat_blocks:
         key, content = block
         string = string.replace(key, content, 1)
+    if text_omitted:
+        string += r" \textit{[" + "Text truncated: {} characters omitted".format(text_omitted) + "]}"
+    if omitted and overflow is not None:
+        string += " " + overflow(text)
     return NoEscape(string)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Set, Tuple
+
+import utils
+
+# Version of the extraction of references. It is part of the key of every entry, so increasing it invalidates the
+# references extracted by older code.
+REFERENCES_VERSION = 1
+DEFAULT_MAX_ENTRIES = 200000
+# Number of entries also kept in memory, so that texts repeated within a run skip the database as well
+MEMORY_ENTRIES = 10000
+
+References = Tuple[Set[str], Set[str], Set[str], Set[str], Set[str], Set[str]]
+
+
+class ReferenceCache:
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Persistent cache of the references extracted from texts by utils.extract_references, keyed by a hash of the
+        project and the text, so that texts which occur again and again (quoted replies, comments of bots, stack
+        traces) are only searched for references once. Entries are stored in an SQLite database and the least
+        recently used ones are evicted by save() once there are more than max_entries.
+        The cache may be shared by threads.
+        :param path: Path to the database, e.g. "Projects/<project_name>/reference_cache.sqlite"
+        :param max_entries: Maximum number of cached texts
+        """
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS refs (key BLOB PRIMARY KEY, refs TEXT NOT NULL, "
+                                "used INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS refs_by_use ON refs (used)")
+        self.connection.commit()
+        self.__clock = self.connection.execute("SELECT COALESCE(MAX(used), 0) FROM refs").fetchone()[0]
+        self.__memory: "OrderedDict[bytes, Tuple[FrozenSet[str], ...]]" = OrderedDict()
+        self.__used: Dict[bytes, int] = dict()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def extract(self, text: str, project: str) -> References:
+        """
+        Extract the references from the text, the same way utils.extract_references does.
+        :param text: Text to extract references from
+        :param project: Name of the project
+        :return: Tuple of new sets of URLs, revisions, mailing lists, PDF documents, archives and other issues
+        """
+        key = hashlib.sha1("{}\0{}\0{}".format(REFERENCES_VERSION, project, text).encode()).digest()
+        with self.lock:
+            self.__clock += 1
+            references = self.__memory.get(key)
+            if references is not None:
+                self.__memory.move_to_end(key)
+            else:
+                row = self.connection.execute("SELECT refs FROM refs WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    references = tuple(frozenset(values) for values in json.loads(row[0]))
+                    self.__remember(key, references)
+            if references is not None:
+                self.hits += 1
+                self.__used[key] = self.__clock
+                # Callers are free to modify the sets they get
+                return tuple(set(values) for values in references)
+            self.misses += 1
+
+        extracted = utils.extract_references(text, project)
+        with self.lock:
+            self.__remember(key, tuple(frozenset(values) for values in extracted))
+            self.__used.pop(key, None)
+            self.connection.execute("INSERT OR REPLACE INTO refs (key, refs, used) VALUES (?, ?, ?)",
+                                    (key, json.dumps([sorted(values) for values in extracted]), self.__clock))
+        return extracted
+
+    def save(self) -> None:
+        """
+        Write the new entries and the last use of the others, evicting the least recently used entries down to 3/4
+        of max_entries if the cache is full, so that eviction does not run on every save once the cache is full.
+        :return: None
+        """
+        with self.lock:
+            self.connection.executemany("UPDATE refs SET used = ? WHERE key = ?",
+                                        [(used, key) for key, used in self.__used.items()])
+            self.__used.clear()
+            entries = self.connection.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+            if entries > self.max_entries:
+                self.connection.execute("DELETE FROM refs WHERE key IN (SELECT key FROM refs ORDER BY used LIMIT ?)",
+                                        (entries - self.max_entries * 3 // 4,))
+            self.connection.commit()
+
+    def close(self) -> None:
+        self.save()
+        with self.lock:
+            self.connection.close()
+
+    def __remember(self, key: bytes, references: Tuple[FrozenSet[str], ...]) -> None:
+        self.__memory[key] = references
+        if len(self.__memory) > MEMORY_ENTRIES:
+            self.__memory.popitem(last=False)